@@ -0,0 +1,263 @@
+"""
+End-to-end latency and throughput benchmark, fully offline.
+
+Starts local fakes for setlist.fm, Spotify and the LLM (`benchmarks/fakes.py`),
+points the app at them, serves `src.server.app` with uvicorn on localhost and
+drives one or more scenarios at a given concurrency. For each scenario it
+reports p50/p95/p99 latency, throughput and the outbound calls made per
+request to each upstream:
+
+    python -m benchmarks.e2e --scenario setlist playlist agent --requests 200 --concurrency 16
+
+Caches start empty (use `--warmup` to measure a warm cache) and the setlist.fm
+limiter keeps its production rate unless `--setlistfm-rate` is given.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+from .fakes import FakeLLM, FakeSetlistFM, FakeSpotify
+
+SCENARIOS = ("setlist", "predicted", "playlist", "agent", "lineup")
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def configure_app(fakes: dict, args, workdir: Path) -> None:
+    """Point the app's settings at the fakes. Must run before `src` is imported."""
+    config_path = workdir / "config.toml"
+    config_path.write_text(
+        '[spotipy]\nclient_id = "bench"\nclient_secret = "bench"\n'
+        'redirect_uri = "http://127.0.0.1/callback"\nscope = "playlist-modify-public"\n'
+    )
+    os.environ.update({
+        "SETLISTIFY_CONFIG": str(config_path),
+        "SETLISTIFY_CACHE_DIR": str(workdir / "cache"),
+        "SETLISTIFY_DATA_DIR": str(workdir / "data"),
+        "SETLISTFM_API_URL": fakes["setlistfm"].url,
+        "SETLISTFM_API_KEY": "bench",
+        "SETLISTFM_RATE_PER_SECOND": str(args.setlistfm_rate),
+        "SETLISTFM_DAILY_QUOTA": str(10 ** 9),
+        "SPOTIFY_API_URL": f"{fakes['spotify'].url}/v1",
+        "LLM_API_BASE": f"{fakes['llm'].url}/v1",
+        "TOGETHER_API_KEY": "bench",
+    })
+    for key in ("LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY"):
+        os.environ.pop(key, None)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_app(port: int):
+    import uvicorn
+
+    from src.server import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, name="bench-uvicorn", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("The server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def create_session() -> str:
+    from src.server import get_session_manager
+
+    return get_session_manager().create({
+        "access_token": "bench",
+        "refresh_token": "bench",
+        "token_type": "Bearer",
+        "scope": "playlist-modify-public",
+        "expires_in": 86400,
+        "expires_at": int(time.time()) + 86400,
+    })
+
+
+def build_request(scenario: str, index: int, args) -> tuple[str, str, dict]:
+    """Return `(method, path, kwargs)` for the `index`-th request of a scenario."""
+    artist = f"Bench Artist {index % args.artists}"
+    if scenario == "setlist":
+        return "GET", "/api/setlist", {"params": {"artistName": artist}}
+    if scenario == "predicted":
+        return "GET", "/api/setlist", {"params": {"artistName": artist, "mode": "predicted"}}
+    if scenario == "playlist":
+        return "POST", "/api/playlist", {"json": {"artist_name": artist}}
+    if scenario == "agent":
+        return "GET", "/api/agent/setlist", {"params": {"artistName": artist}}
+    if scenario == "lineup":
+        lineup = [f"Bench Artist {(index * args.lineup_size + n) % args.artists}" for n in range(args.lineup_size)]
+        return "POST", "/api/lineup", {"json": {"artists": lineup, "combined": True}}
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def _failed(payload) -> bool:
+    return isinstance(payload, dict) and bool(payload.get("error"))
+
+
+async def send(client: httpx.AsyncClient, method: str, path: str, kwargs: dict) -> bool:
+    """
+    Send one request; streamed responses are read to the end. Returns whether
+    it succeeded: a non-error status, and no `error` in the JSON result, the
+    final streamed result or any playlist the agent wrote.
+    """
+    async with client.stream(method, path, **kwargs) as response:
+        if response.status_code >= 400:
+            await response.aread()
+            return False
+        if not response.headers.get("content-type", "").startswith("text/event-stream"):
+            await response.aread()
+            return not _failed(response.json())
+        completed = False
+        async for line in response.aiter_lines():
+            if line.startswith("data: "):
+                event = json.loads(line[len("data: "):])
+                if event.get("type") == "error":
+                    return False
+                if event.get("kind") == "tool_end" and event.get("tool", "").startswith("create_playlist") \
+                        and event.get("error"):
+                    return False
+                if event.get("type") == "complete":
+                    if _failed(event.get("data")):
+                        return False
+                    completed = True
+        return completed
+
+
+async def run_scenario(base_url: str, session_id: str, scenario: str, requests: int, concurrency: int, args) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async with httpx.AsyncClient(base_url=base_url, cookies={"session": session_id}, timeout=args.timeout) as client:
+        async def one(index: int) -> None:
+            nonlocal errors
+            method, path, kwargs = build_request(scenario, index, args)
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    ok = await send(client, method, path, kwargs)
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - start)
+                errors += not ok
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def outbound_per_request(before: dict, after: dict, requests: int) -> dict:
+    report = {}
+    for name in after:
+        delta = after[name] - before[name]
+        report[name] = {
+            "total": sum(delta.values()),
+            "per_request": round(sum(delta.values()) / requests, 2) if requests else 0.0,
+            "by_route": dict(delta),
+        }
+    return report
+
+
+def print_report(results: dict) -> None:
+    header = f"{'scenario':<10} {'reqs':>6} {'errs':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}   outbound calls/request"
+    print(header)
+    print("-" * len(header))
+    for scenario, result in results.items():
+        outbound = ", ".join(f"{name} {calls['per_request']}" for name, calls in result["outbound"].items())
+        print(
+            f"{scenario:<10} {result['requests']:>6} {result['errors']:>5} {result['throughput_rps']:>8} "
+            f"{result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9}   {outbound}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", nargs="+", choices=SCENARIOS, default=["setlist", "playlist", "agent"])
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--artists", type=int, default=20, help="distinct artists the requests cycle through")
+    parser.add_argument("--lineup-size", type=int, default=10, help="artists per lineup request")
+    parser.add_argument("--warmup", type=int, default=0, help="untimed requests per scenario before measuring")
+    parser.add_argument("--setlistfm-latency", type=float, default=80, help="ms added to each setlist.fm response")
+    parser.add_argument("--setlistfm-429-rate", type=float, default=0.0, help="share of setlist.fm calls answered with 429")
+    parser.add_argument("--setlistfm-rate", type=float, default=2.0, help="setlist.fm requests/second the app allows itself")
+    parser.add_argument("--spotify-latency", type=float, default=40, help="ms added to each Spotify response")
+    parser.add_argument("--spotify-429-rate", type=float, default=0.0, help="share of Spotify calls answered with 429")
+    parser.add_argument("--llm-latency", type=float, default=400, help="ms added to each chat completion")
+    parser.add_argument("--timeout", type=float, default=300, help="per-request timeout in seconds")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own output (agent steps, prints)")
+    args = parser.parse_args()
+
+    fakes = {
+        "setlistfm": FakeSetlistFM(latency=args.setlistfm_latency / 1000, error_rate=args.setlistfm_429_rate).start(),
+        "spotify": FakeSpotify(latency=args.spotify_latency / 1000, error_rate=args.spotify_429_rate).start(),
+        "llm": FakeLLM(latency=args.llm_latency / 1000).start(),
+    }
+    workdir = Path(tempfile.mkdtemp(prefix="setlistify-bench-"))
+    configure_app(fakes, args, workdir)
+
+    results = {}
+    with open(os.devnull, "w") as devnull, (contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)):
+        port = free_port()
+        server, thread = serve_app(port)
+        session_id = create_session()
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            for scenario in args.scenario:
+                if args.warmup:
+                    asyncio.run(run_scenario(base_url, session_id, scenario, args.warmup, args.concurrency, args))
+                before = {name: fake.snapshot() for name, fake in fakes.items()}
+                result = asyncio.run(run_scenario(base_url, session_id, scenario, args.requests, args.concurrency, args))
+                after = {name: fake.snapshot() for name, fake in fakes.items()}
+                result["outbound"] = outbound_per_request(before, after, args.requests)
+                results[scenario] = result
+        finally:
+            server.should_exit = True
+            thread.join(10)
+            for fake in fakes.values():
+                fake.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+    return 1 if any(result["errors"] for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,403 @@
+"""
+Local stand-ins for setlist.fm, the Spotify Web API and an OpenAI-compatible
+LLM, for running the server end to end without a network.
+
+Each fake is a threaded HTTP server on a free localhost port that serves
+deterministic data, can add latency (and, for the APIs, random 429s), and
+counts the calls it receives per route. The LLM replays the tool calls the
+real model makes for "create a playlist for <artist>".
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+SONGS_PER_ARTIST = 30
+SONGS_PER_SHOW = 18
+SHOWS_PER_ARTIST = 60
+SETLISTS_PER_PAGE = 20
+
+
+def artist_mbid(name: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"setlistify-bench:{name}"))
+
+
+def song_title(artist: str, number: int) -> str:
+    return f"{artist} Song {number}"
+
+
+def show_songs(artist: str, show: int) -> list[str]:
+    """Songs played at `artist`'s `show`-th most recent show: 12 staples plus a rotation."""
+    staples = [song_title(artist, n) for n in range(1, 13)]
+    rotation = [song_title(artist, 13 + (show + n) % (SONGS_PER_ARTIST - 12)) for n in range(SONGS_PER_SHOW - 12)]
+    return staples[:6] + rotation + staples[6:]
+
+
+def show_date(show: int) -> date:
+    return date(2025, 7, 1) - timedelta(days=4 * show)
+
+
+def raw_setlist(artist: str, show: int) -> dict:
+    return {
+        "id": f"{artist_mbid(artist)[:8]}-{show}",
+        "eventDate": show_date(show).strftime("%d-%m-%Y"),
+        "artist": {"mbid": artist_mbid(artist), "name": artist},
+        "venue": {"name": f"Arena {show}", "city": {"name": "Springfield", "country": {"name": "USA"}}},
+        "url": f"https://www.setlist.fm/setlist/bench/{show}",
+        "sets": {"set": [{"song": [{"name": name} for name in show_songs(artist, show)]}]},
+    }
+
+
+class FakeService:
+    """Base class: a JSON HTTP server that counts calls per route."""
+
+    name = "service"
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls: Counter = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"fake-{self.name}", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeService":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def snapshot(self) -> Counter:
+        with self._lock:
+            return Counter(self.calls)
+
+    def count(self, route: str) -> None:
+        with self._lock:
+            self.calls[route] += 1
+
+    def should_throttle(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def handle(self, method: str, path: str, query: dict, body) -> tuple[int, object]:
+        raise NotImplementedError
+
+    def _handler_class(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self, method: str):
+                parts = urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                body = json.loads(raw) if raw else None
+                query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+                if service.latency:
+                    time.sleep(service.latency)
+                status, payload = service.handle(method, unquote(parts.path).rstrip("/") or "/", query, body)
+                if callable(payload):
+                    # Streamed response (server-sent events); the connection is closed after it.
+                    self.send_response(status)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Connection", "close")
+                    self.end_headers()
+                    for chunk in payload():
+                        self.wfile.write(chunk.encode())
+                        self.wfile.flush()
+                    self.close_connection = True
+                    return
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PUT(self):
+                self._dispatch("PUT")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+        return Handler
+
+
+class FakeSetlistFM(FakeService):
+    """`/search/artists` and `/artist/{mbid}/setlists`, with `SHOWS_PER_ARTIST` shows per artist."""
+
+    name = "setlistfm"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._artists: dict[str, str] = {}
+
+    def handle(self, method, path, query, body):
+        if self.should_throttle():
+            self.count("429")
+            return 429, {"code": 429, "message": "Too Many Requests"}
+
+        if path == "/search/artists":
+            self.count("search_artists")
+            name = query.get("artistName", "")
+            self._artists[artist_mbid(name)] = name
+            return 200, {"artist": [{"mbid": artist_mbid(name), "name": name, "disambiguation": ""}], "total": 1}
+
+        match = re.fullmatch(r"/artist/([^/]+)/setlists", path)
+        if match:
+            self.count("artist_setlists")
+            artist = self._artists.get(match.group(1), f"Artist {match.group(1)[:8]}")
+            page = int(query.get("p", 1))
+            first = (page - 1) * SETLISTS_PER_PAGE
+            shows = range(first, min(first + SETLISTS_PER_PAGE, SHOWS_PER_ARTIST))
+            return 200, {
+                "type": "setlists",
+                "itemsPerPage": SETLISTS_PER_PAGE,
+                "page": page,
+                "total": SHOWS_PER_ARTIST,
+                "setlist": [raw_setlist(artist, show) for show in shows],
+            }
+
+        self.count("not_found")
+        return 404, {"code": 404, "message": "Not Found"}
+
+
+class FakeSpotify(FakeService):
+    """
+    The slice of the Spotify Web API the app uses: `/me`, track and artist
+    search, an artist's albums (two, holding every song), and playlists
+    (create, read, follow check, add, remove, replace and reorder tracks).
+    """
+
+    name = "spotify"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._artists: dict[str, str] = {}
+        self._playlists: dict[str, list[str]] = {}
+
+    @staticmethod
+    def _id(text: str) -> str:
+        # Hex digits only, so "x" can separate an artist id from an album number
+        # and every id stays base-62, as spotipy requires.
+        return hashlib.sha1(text.encode()).hexdigest()[:22]
+
+    def _track(self, artist: str, title: str) -> dict:
+        return {
+            "id": self._id(f"{artist}|{title}"),
+            "uri": f"spotify:track:{self._id(f'{artist}|{title}')}",
+            "name": title,
+            "artists": [{"id": self._id(artist), "name": artist}],
+        }
+
+    def _album(self, artist: str, half: int) -> dict:
+        numbers = range(1, SONGS_PER_ARTIST // 2 + 1) if half == 0 else range(SONGS_PER_ARTIST // 2 + 1, SONGS_PER_ARTIST + 1)
+        return {
+            "id": f"{self._id(artist)}x{half}",
+            "name": f"{artist} Album {half + 1}",
+            "tracks": {"items": [self._track(artist, song_title(artist, n)) for n in numbers], "next": None},
+        }
+
+    def _playlist_tracks(self, method: str, playlist_id: str, query: dict, body: dict) -> tuple[int, object]:
+        if method == "GET":
+            self.count("playlist_items")
+            offset, limit = int(query.get("offset", 0)), int(query.get("limit", 100))
+            with self._lock:
+                uris = self._playlists[playlist_id][offset:offset + limit + 1]
+            following = f"{self.url}/v1/playlists/{playlist_id}/tracks?offset={offset + limit}&limit={limit}"
+            return 200, {"items": [{"track": {"uri": uri}} for uri in uris[:limit]],
+                         "next": following if len(uris) > limit else None}
+        if method == "POST":
+            route = "add_tracks"
+        elif method == "DELETE":
+            route = "remove_tracks"
+        else:
+            route = "replace_tracks" if "uris" in body else "reorder_tracks"
+        self.count(route)
+        with self._lock:
+            uris = self._playlists[playlist_id]
+            if route == "add_tracks":
+                # spotipy posts a bare list of uris; the async client posts {"uris": [...]}.
+                uris.extend(body if isinstance(body, list) else body.get("uris", []))
+            elif route == "remove_tracks":
+                gone = {track["uri"] for track in body.get("tracks", [])}
+                uris[:] = [uri for uri in uris if uri not in gone]
+            elif route == "replace_tracks":
+                uris[:] = body["uris"]
+            else:
+                uris.insert(body["insert_before"], uris.pop(body["range_start"]))
+        return 200 if method == "PUT" else 201, {"snapshot_id": "bench"}
+
+    def handle(self, method, path, query, body):
+        path = path.removeprefix("/v1")
+        if self.should_throttle():
+            self.count("429")
+            return 429, {"error": {"status": 429, "message": "API rate limit exceeded"}}
+
+        if path == "/me":
+            self.count("me")
+            return 200, {"id": "bench-user", "display_name": "Benchmark User"}
+
+        if path == "/search":
+            q = query.get("q", "")
+            artist = re.search(r"artist:(.*?)(?: track:|$)", q)
+            artist = artist.group(1).strip() if artist else "Unknown Artist"
+            if query.get("type") == "artist":
+                self.count("search_artist")
+                self._artists[self._id(artist)] = artist
+                return 200, {"artists": {"items": [{"id": self._id(artist), "name": artist}], "next": None}}
+            self.count("search_track")
+            title = re.search(r"track:(.*)$", q)
+            items = [self._track(artist, title.group(1).strip())] if title else []
+            return 200, {"tracks": {"items": items, "next": None}}
+
+        match = re.fullmatch(r"/artists/([^/]+)/albums", path)
+        if match:
+            self.count("artist_albums")
+            artist_id = match.group(1)
+            return 200, {"items": [{"id": f"{artist_id}x0"}, {"id": f"{artist_id}x1"}], "next": None}
+
+        if path == "/albums":
+            self.count("albums")
+            albums = []
+            for album_id in query.get("ids", "").split(","):
+                artist_id, _, half = album_id.rpartition("x")
+                albums.append(self._album(self._artists.get(artist_id, artist_id), int(half or 0)))
+            return 200, {"albums": albums}
+
+        if method == "POST" and re.fullmatch(r"/users/[^/]+/playlists", path):
+            self.count("create_playlist")
+            with self._lock:
+                playlist_id = f"bench{len(self._playlists) + 1}"
+                self._playlists[playlist_id] = []
+            return 201, {"id": playlist_id, "name": (body or {}).get("name"),
+                         "external_urls": {"spotify": f"https://open.spotify.com/playlist/{playlist_id}"}}
+
+        match = re.fullmatch(r"/playlists/([^/]+)/followers/contains", path)
+        if match:
+            self.count("playlist_following")
+            return 200, [match.group(1) in self._playlists]
+
+        match = re.fullmatch(r"/playlists/([^/]+)/tracks", path)
+        if match and match.group(1) in self._playlists:
+            return self._playlist_tracks(method, match.group(1), query, body or {})
+
+
+        self.count("not_found")
+        return 404, {"error": {"status": 404, "message": "Not Found"}}
+
+
+_HANDLE = re.compile(r"""["']handle["']:\s*["']((shows|setlist):\d+)""")
+
+
+class FakeLLM(FakeService):
+    """
+    An OpenAI-compatible `/v1/chat/completions` that replays the tool calls a
+    model makes for "create a playlist for <artist>": `get_latest_show`,
+    `extract_setlist`, `create_playlist_for_user`, then `final_answer`. The
+    arguments are built from the same data `FakeSetlistFM` serves, or are the
+    handles the tools returned when results are compacted. Usage reports
+    about four characters per prompt token unless `prompt_tokens` is given.
+    """
+
+    name = "llm"
+
+    def __init__(self, *args, prompt_tokens: int | None = None, completion_tokens: int = 120, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    @staticmethod
+    def _text(message: dict) -> str:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        return content
+
+    def _next_call(self, messages: list) -> tuple[str, dict]:
+        texts = [self._text(message) for message in messages]
+        steps_done = sum(text.count("Calling tools:") for text in texts)
+        tasks = re.findall(r"New task:\s*.*?playlist for ([^\n]+)", "\n".join(texts))
+        artist = tasks[-1].strip() if tasks else "Unknown Artist"
+
+        # The latest handle of each kind the tools returned (src/handles.py), if any.
+        handles = {kind: handle for handle, kind in _HANDLE.findall("\n".join(texts))}
+
+        latest = raw_setlist(artist, 0)
+        show = {
+            "artist": artist,
+            "event_date": latest["eventDate"],
+            "venue": latest["venue"]["name"],
+            "setlist": show_songs(artist, 0),
+        }
+        script = [
+            ("get_latest_show", {"artist_name": artist}),
+            ("extract_setlist", {"shows": handles.get("shows", [show])}),
+            ("create_playlist_for_user", {
+                "artist_name": artist,
+                "songs": handles.get("setlist", show["setlist"]),
+                "event_date": show_date(0).isoformat(),
+                "venue_name": show["venue"],
+            }),
+            ("final_answer", {"answer": f"Created a playlist for {artist}."}),
+        ]
+        return script[min(steps_done, len(script) - 1)]
+
+    def handle(self, method, path, query, body):
+        if path.removeprefix("/v1") != "/chat/completions":
+            self.count("not_found")
+            return 404, {"error": {"message": "Not Found"}}
+        self.count("chat_completions")
+
+        name, arguments = self._next_call(body.get("messages", []))
+        call = {"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments)}}
+        prompt_tokens = self.prompt_tokens or len(json.dumps(body.get("messages", []))) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": self.completion_tokens,
+                 "total_tokens": prompt_tokens + self.completion_tokens}
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get("model")}
+
+        if not body.get("stream"):
+            return 200, {**base, "object": "chat.completion", "usage": usage, "choices": [{
+                "index": 0, "finish_reason": "tool_calls",
+                "message": {"role": "assistant", "content": None, "tool_calls": [call]},
+            }]}
+
+        def events():
+            chunk = {**base, "object": "chat.completion.chunk"}
+            yield "data: " + json.dumps({**chunk, "choices": [{"index": 0, "finish_reason": None, "delta": {
+                "role": "assistant", "content": None, "tool_calls": [{"index": 0, **call}],
+            }}]}) + "\n\n"
+            yield "data: " + json.dumps({**chunk, "choices": [{"index": 0, "finish_reason": "tool_calls", "delta": {}}]}) + "\n\n"
+            yield "data: " + json.dumps({**chunk, "choices": [], "usage": usage}) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return 200, events
@@ -0,0 +1,71 @@
+"""
+Import-time budget for server startup.
+
+Runs `python -X importtime -c "import src.server"` in a fresh interpreter and
+reports the total import time plus the most expensive modules, both by their
+own (self) cost and cumulatively. Pass `--budget` to fail when the total
+exceeds a number of milliseconds, e.g. in CI:
+
+    python -m benchmarks.startup --budget 2500
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def measure_imports(module: str) -> tuple[list[tuple[str, int, int]], float]:
+    """Return `[(module, self_us, cumulative_us), ...]` and the wall time in ms."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows, wall_ms
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="src.server", help="Module to import (default: src.server)")
+    parser.add_argument("--top", type=int, default=15, help="How many modules to list")
+    parser.add_argument("--budget", type=float, help="Fail if total import time exceeds this many ms")
+    args = parser.parse_args()
+
+    rows, wall_ms = measure_imports(args.module)
+    by_name = {name: cumulative for name, _, cumulative in rows}
+    total_ms = by_name.get(args.module, 0) / 1000
+
+    print(f"import {args.module}: {total_ms:.1f} ms (interpreter wall time {wall_ms:.1f} ms)\n")
+    print(f"Top {args.top} by self time:")
+    for name, self_us, _ in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+    print(f"\nTop {args.top} project/top-level packages by cumulative time:")
+    top_level = [r for r in rows if "." not in r[0] or r[0].startswith("src.")]
+    for name, _, cumulative_us in sorted(top_level, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if args.budget is not None and total_ms > args.budget:
+        print(f"\nFAIL: {total_ms:.1f} ms exceeds the {args.budget:.1f} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,7 +25,7 @@ export default function CreatePlaylist({ artistName, songs, onComplete, onReset
 
     try {
       const response = await axios.post(
-        `${process.env.NEXT_PUBLIC_API_URL}/api/agent/create-playlist`,
+        `${process.env.NEXT_PUBLIC_API_URL}/api/playlist`,
         {
           artist_name: artistName,
           songs: songs,
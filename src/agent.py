@@ -1,104 +1,171 @@
 # src/agent.py
-import os
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
 from pathlib import Path
-import base64
-from opentelemetry import trace
-from smolagents import ToolCallingAgent, OpenAIServerModel, tool
+from smolagents import ToolCallingAgent, tool
+from spotipy import Spotify
+
+from .handles import UnknownHandle, handle_scope, resolve
+from .llm import get_model
+from .metrics import timed_tool
+from .telemetry import init_telemetry, shutdown_telemetry
+from .tools.setlist_tools import extract_setlist, get_latest_show, predict_setlist
+from .tools.spotify_tools import create_playlist, resolve_tracks, write_playlist
+
+logger = logging.getLogger(__name__)
 
-import logging
-import sys
-
-from .config import (
-    LANGFUSE_PUBLIC_KEY,
-    LANGFUSE_SECRET_KEY,
-    TOGETHER_API_KEY,
-)
-from .tools.setlist_tools import extract_setlist, get_latest_show, search_artist
-from .tools.spotify_tools import create_playlist
-from opentelemetry.sdk.trace import TracerProvider
-from openinference.instrumentation.smolagents import SmolagentsInstrumentor
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-
-# Configure OpenTelemetry to send traces to LangFuse
-trace_provider = TracerProvider()
-# Base64 encode credentials
-credentials = f"{LANGFUSE_PUBLIC_KEY}:{LANGFUSE_SECRET_KEY}"
-encoded_credentials = base64.b64encode(credentials.encode()).decode()
-
-otlp_exporter = OTLPSpanExporter(
-    headers={
-        "Authorization": f"Basic {encoded_credentials}"
-    }
-)
-trace_provider.add_span_processor(BatchSpanProcessor(otlp_exporter))
-
-# Set the global tracer provider
-trace.set_tracer_provider(trace_provider)
-
-# Instrument smolagents
-SmolagentsInstrumentor().instrument(tracer_provider=trace_provider)
-
-
-# Read the system prompt from the file
 SYSTEM_PROMPT_PATH = Path(__file__).parent / "prompts" / "system.md"
-SYSTEM = SYSTEM_PROMPT_PATH.read_text()
-
-model = OpenAIServerModel(
-    model_id="deepseek-ai/DeepSeek-R1",
-    api_base="https://api.together.xyz/v1",
-    api_key=TOGETHER_API_KEY,
-    timeout=60,
-)
-
-tools = [get_latest_show, extract_setlist, create_playlist]
-
-# This is the main, unauthenticated agent instance.
-agent = ToolCallingAgent(
-    tools=tools,
-    model=model,
-    instructions=SYSTEM,
-    name="Setlistify",
-    stream_outputs=True,
-)
 
-from spotipy import Spotify
 
-def build_agent_for_spotify_client(spotify_client: Spotify) -> ToolCallingAgent:
-    """
-    Return a ToolCallingAgent whose `create_playlist` tool is already
-    authenticated with a Spotify client.
+@lru_cache(maxsize=1)
+def get_system_prompt() -> str:
+    """Read the system prompt from the file on first use."""
+    return SYSTEM_PROMPT_PATH.read_text()
+
+
+tools = [get_latest_show, extract_setlist, predict_setlist, create_playlist]
+
+
+@lru_cache(maxsize=1)
+def get_agent() -> ToolCallingAgent:
+    """The main, unauthenticated agent instance, built on first use."""
+    return ToolCallingAgent(
+        tools=tools,
+        model=get_model(),
+        instructions=get_system_prompt(),
+        name="Setlistify",
+        stream_outputs=True,
+    )
+
+# The Spotify client for the current request. Binding it through a context
+# variable lets a single, module-level tool serve every user without the
+# client (or its token) ever being visible to the LLM.
+_spotify_client: ContextVar[Spotify | None] = ContextVar("spotify_client", default=None)
+
+
+@contextmanager
+def bind_spotify_client(spotify_client: Spotify):
+    """Make `spotify_client` the one `create_playlist_for_user` uses in this context."""
+    token = _spotify_client.set(spotify_client)
+    try:
+        yield spotify_client
+    finally:
+        _spotify_client.reset(token)
+
+
+# Filled in by `create_playlist_for_user` with what the run resolved, so the
+# caller can reuse it for later requests about the same show.
+_run_result: ContextVar[dict | None] = ContextVar("run_result", default=None)
+
+
+@contextmanager
+def record_run_result():
+    """Collect the show, songs and resolved tracks of a run into the yielded dict."""
+    result: dict = {}
+    token = _run_result.set(result)
+    try:
+        yield result
+    finally:
+        _run_result.reset(token)
+
+
+@tool
+def create_playlist_for_user(artist_name: str, songs: list[str] | str, event_date: str, venue_name: str) -> dict:
     """
+    Creates a Spotify playlist for a given artist and set of songs.
 
-    @tool
-    def create_playlist_for_user(artist_name: str, songs: list[str], event_date: str, venue_name: str) -> dict:
-        """
-        Creates a Spotify playlist for a given artist and set of songs.
-
-        Args:
-            artist_name: The name of the artist.
-            songs: A list of song titles to add to the playlist.
-            event_date: The date of the event (e.g., 'YYYY-MM-DD').
-            venue_name: The name of the venue where the event took place.
-        """
-        return create_playlist(
-            spotify_client=spotify_client,
+    Args:
+        artist_name: The name of the artist.
+        songs: A list of song titles to add to the playlist, or the setlist `handle` another tool returned.
+        event_date: The date of the event (e.g., 'YYYY-MM-DD').
+        venue_name: The name of the venue where the event took place.
+    """
+    spotify_client = _spotify_client.get()
+    if spotify_client is None:
+        return {"error": "No Spotify account is connected for this request."}
+    try:
+        songs = resolve(songs, "setlist")
+    except UnknownHandle as e:
+        return {"error": str(e)}
+    try:
+        tracks = resolve_tracks(spotify_client, artist_name, songs)
+    except Exception:
+        logger.exception("Track resolution for %s failed", artist_name)
+        return {"error": "An unexpected error occurred while finding the songs on Spotify."}
+
+    playlist = write_playlist(spotify_client, artist_name, tracks, event_date, venue_name)
+    recorded = _run_result.get()
+    if recorded is not None and "error" not in playlist:
+        recorded.update(
             artist_name=artist_name,
-            songs=songs,
             event_date=event_date,
             venue_name=venue_name,
+            songs=list(songs),
+            tracks=tracks,
         )
+    return playlist
+
+
+timed_tool(create_playlist_for_user)
 
-    authed_tools = [get_latest_show, extract_setlist, create_playlist_for_user]
+authed_tools = [get_latest_show, extract_setlist, predict_setlist, create_playlist_for_user]
 
+
+def _build_authed_agent() -> ToolCallingAgent:
     return ToolCallingAgent(
         tools=authed_tools,
-        model=model,
-        instructions=SYSTEM,
+        model=get_model(),
+        instructions=get_system_prompt(),
         name="Setlistify",
         stream_outputs=True,
     )
 
+
+class AgentPool:
+    """
+    A pool of reusable agents built from one template (tools, model and
+    system prompt are prepared once at import). A smolagents agent keeps
+    per-run memory, so each checked-out agent is used by one run at a time and
+    its memory is cleared before it goes back into the pool.
+    """
+
+    def __init__(self, factory, max_idle: int = 8):
+        self._factory = factory
+        self._max_idle = max_idle
+        self._idle: list[ToolCallingAgent] = []
+        self._lock = threading.Lock()
+
+    def warm(self, count: int = 1) -> None:
+        """Build up to `count` idle agents ahead of the first request."""
+        with self._lock:
+            missing = min(count, self._max_idle) - len(self._idle)
+        for _ in range(missing):
+            self._release(self._factory())
+
+    def _release(self, pooled_agent: ToolCallingAgent) -> None:
+        pooled_agent.memory.reset()
+        pooled_agent.monitor.reset()
+        with self._lock:
+            if len(self._idle) < self._max_idle:
+                self._idle.append(pooled_agent)
+
+    @contextmanager
+    def checkout(self):
+        with self._lock:
+            pooled_agent = self._idle.pop() if self._idle else None
+        if pooled_agent is None:
+            pooled_agent = self._factory()
+        try:
+            yield pooled_agent
+        finally:
+            self._release(pooled_agent)
+
+
+agent_pool = AgentPool(_build_authed_agent)
+
 # ---- Optional CLI entry point --------------------------------
 if __name__ == "__main__":
     import argparse
@@ -107,16 +174,15 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--artist", required=True, help="The name of the artist")
     args = parser.parse_args()
+    init_telemetry()
 
     try:
         # The agent now handles authentication internally using the refresh token.
         # We just need to invoke it with the artist's name.
-        final_answer = agent(f"Create a playlist for {args.artist}")
+        with handle_scope():
+            final_answer = get_agent()(f"Create a playlist for {args.artist}")
         print(f"Agent call complete. Response:\n{json.dumps(final_answer, indent=2)}")
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
-        print("\nFlushing and shutting down OpenTelemetry tracer provider...")
-        trace_provider.force_flush()
-        trace_provider.shutdown()
-        print("Tracer provider shut down.")
+        shutdown_telemetry()
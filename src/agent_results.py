@@ -0,0 +1,101 @@
+import logging
+from contextlib import contextmanager
+
+from opentelemetry import trace
+
+from .agent import agent_pool, bind_spotify_client, record_run_result
+from .cache import get_cache
+from .config import AGENT_RESULT_MAX_ENTRIES, AGENT_RESULT_TTL
+from .handles import handle_scope
+from .plans import plan_events
+from .tools.setlist_tools import latest_show_id, latest_show_id_async, search_artist, search_artist_async
+from .tools.spotify_tools import write_playlist
+
+logger = logging.getLogger(__name__)
+
+# What an agent run for "the latest show" produced: the chosen show, the
+# extracted setlist and the Spotify tracks it resolved to. None of it depends
+# on who asked, so the next user who asks about the same show only needs the
+# playlist written to their own account.
+
+
+def _cache():
+    return get_cache("agent_results", max_entries=AGENT_RESULT_MAX_ENTRIES)
+
+
+def _mbid(artists: list) -> str | None:
+    if not artists or "error" in artists[0]:
+        return None
+    return artists[0].get("mbid")
+
+
+def _result_key(mbid: str, show_id: str | None) -> str | None:
+    return f"latest:{mbid}:{show_id}" if show_id else None
+
+
+def latest_show_key(artist_name: str) -> str | None:
+    """
+    Key for the artist's latest show, as `get_latest_show` sees it, or None
+    if it cannot be determined.
+    """
+    mbid = _mbid(search_artist(artist_name))
+    if mbid is None:
+        return None
+    try:
+        return _result_key(mbid, latest_show_id(mbid))
+    except Exception as e:
+        logger.warning("Show lookup for %s failed: %s", artist_name, e)
+        return None
+
+
+async def latest_show_key_async(artist_name: str) -> str | None:
+    """Async `latest_show_key`."""
+    mbid = _mbid(await search_artist_async(artist_name))
+    if mbid is None:
+        return None
+    try:
+        return _result_key(mbid, await latest_show_id_async(mbid))
+    except Exception as e:
+        logger.warning("Show lookup for %s failed: %s", artist_name, e)
+        return None
+
+
+def get_run_result(key: str) -> dict | None:
+    return _cache().get(key)
+
+
+def store_run_result(key: str, result: dict) -> None:
+    _cache().set(key, result, ttl=AGENT_RESULT_TTL)
+
+
+def _reuse_events(spotify_client, cached: dict):
+    message = f"♻️ Reusing the setlist from {cached['venue_name']} ({cached['event_date']})"
+    yield {"type": "progress", "kind": "step", "message": message, "step": 1}
+    playlist = write_playlist(
+        spotify_client, cached["artist_name"], cached["tracks"], cached["event_date"], cached["venue_name"]
+    )
+    yield {"type": "complete", "data": playlist}
+
+
+@contextmanager
+def agent_task(spotify_client, task: str, result_key: str | None = None):
+    """
+    Set up an agent run of `task` for `spotify_client` and yield its progress
+    events (a synchronous iterator).
+
+    When `result_key` names a stored run result, the events only write that
+    playlist to the user's account. Otherwise the agent runs, and its result
+    is stored under `result_key` once the events have been consumed. The
+    run's context (Spotify client, handles, checked-out agent) is held by the
+    `with` block, so the events may be stepped on other threads.
+    """
+    cached = get_run_result(result_key) if result_key else None
+    trace.get_current_span().set_attribute("setlistify.result_cache", "hit" if cached else "miss")
+    if cached:
+        yield _reuse_events(spotify_client, cached)
+        return
+    with bind_spotify_client(spotify_client), record_run_result() as run_result, handle_scope(), \
+            agent_pool.checkout() as agent:
+        yield plan_events(agent, task)
+    if result_key and run_result:
+        store_run_result(result_key, run_result)
@@ -0,0 +1,152 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+
+from ..config import DATA_DIR, SESSION_MAX_ENTRIES, SESSION_STORE, SESSION_TTL
+
+
+class SessionStore(ABC):
+    """
+    Server-side session storage, keyed by the opaque id in the `session`
+    cookie. Sessions expire `ttl` seconds after they were last used.
+    """
+
+    @abstractmethod
+    def get(self, session_id: str | None) -> dict | None:
+        ...
+
+    @abstractmethod
+    def set(self, session_id: str, data: dict) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str | None) -> None:
+        ...
+
+    def __contains__(self, session_id: str | None) -> bool:
+        return self.get(session_id) is not None
+
+
+class MemorySessionStore(SessionStore):
+    """A per-process LRU store with sliding TTL expiry. Suitable for a single worker."""
+
+    def __init__(self, ttl: float = SESSION_TTL, max_entries: int = SESSION_MAX_ENTRIES, clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._data: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        if not session_id:
+            return None
+        now = self._clock()
+        with self._lock:
+            entry = self._data.get(session_id)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at <= now:
+                del self._data[session_id]
+                return None
+            self._data[session_id] = (now + self.ttl, data)
+            self._data.move_to_end(session_id)
+            return data
+
+    def set(self, session_id, data):
+        with self._lock:
+            self._data[session_id] = (self._clock() + self.ttl, data)
+            self._data.move_to_end(session_id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._data.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    A store shared by every worker process on the host, backed by a SQLite
+    database in WAL mode. Reads are a single primary-key lookup; the expiry is
+    only rewritten once half the TTL has elapsed, so most reads don't write.
+    """
+
+    # Purge expired rows every this many writes.
+    PURGE_EVERY = 256
+
+    def __init__(self, path: str | Path, ttl: float = SESSION_TTL, max_entries: int = SESSION_MAX_ENTRIES, clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._writes = 0
+        self._lock = threading.Lock()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+
+    def get(self, session_id):
+        if not session_id:
+            return None
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute("SELECT data, expires_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None or row[1] <= now:
+                return None
+            if row[1] - now < self.ttl / 2:
+                self._conn.execute("UPDATE sessions SET expires_at = ? WHERE id = ?", (now + self.ttl, session_id))
+        return json.loads(row[0])
+
+    def set(self, session_id, data):
+        now = self._clock()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data), now + self.ttl),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._purge(now)
+
+    def _purge(self, now: float) -> None:
+        # Caller holds self._lock.
+        self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+        self._conn.execute(
+            "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def delete(self, session_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+_store: SessionStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Return the configured session store (`SESSION_STORE`=memory|sqlite), created on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if SESSION_STORE == "sqlite":
+                _store = SQLiteSessionStore(Path(DATA_DIR) / "sessions.sqlite3")
+            elif SESSION_STORE == "memory":
+                _store = MemorySessionStore()
+            else:
+                raise ValueError(f"Unknown SESSION_STORE '{SESSION_STORE}', expected 'memory' or 'sqlite'.")
+        return _store
@@ -0,0 +1,116 @@
+import logging
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from spotipy.cache_handler import CacheHandler
+from spotipy.oauth2 import SpotifyOAuth
+
+from ..config import SPOTIFY_TOKEN_REFRESH_MARGIN
+from .sessions import SessionStore
+
+logger = logging.getLogger(__name__)
+
+
+class NullCacheHandler(CacheHandler):
+    """
+    Lets one `SpotifyOAuth` be shared by every request: tokens live in the
+    session store, never inside the auth manager.
+    """
+
+    def get_cached_token(self):
+        return None
+
+    def save_token_to_cache(self, token_info):
+        pass
+
+
+class SpotifySessionManager:
+    """
+    Owns the Spotify side of server-side sessions. A session is stored as
+    `{"token_info": ..., "profile": ...}` under a stable id.
+
+    Tokens that are close to expiry (within `refresh_margin` seconds) are
+    refreshed on a background thread while the request carries on with the
+    still-valid token; only a token that has already expired is refreshed
+    inline. The user's profile is cached in the session after the first fetch.
+    """
+
+    def __init__(self, store: SessionStore, auth_manager: SpotifyOAuth,
+                 refresh_margin: float = SPOTIFY_TOKEN_REFRESH_MARGIN, clock=time.time):
+        self.store = store
+        self.auth_manager = auth_manager
+        self.refresh_margin = refresh_margin
+        self._clock = clock
+        self._refreshing: set[str] = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="token-refresh")
+
+    def create(self, token_info: dict) -> str:
+        """Start a new session for a freshly issued token and return its id."""
+        session_id = secrets.token_urlsafe(64)
+        self.store.set(session_id, {"token_info": token_info, "profile": None})
+        return session_id
+
+    def peek(self, session_id: str | None) -> dict | None:
+        """Return the stored session without refreshing anything."""
+        session = self.store.get(session_id)
+        if not session or "token_info" not in session:
+            return None
+        return session
+
+    def is_expired(self, session: dict) -> bool:
+        return session["token_info"]["expires_at"] <= self._clock()
+
+    def ensure_fresh(self, session_id: str, session: dict) -> dict | None:
+        """
+        Return a session whose token is usable now. Expired tokens are
+        refreshed inline (returning None if that fails); tokens close to expiry
+        are refreshed in the background.
+        """
+        remaining = session["token_info"]["expires_at"] - self._clock()
+        if remaining <= 0:
+            return self._refresh(session_id, session)
+        if remaining < self.refresh_margin:
+            self._refresh_in_background(session_id, session)
+        return session
+
+    def load(self, session_id: str | None) -> dict | None:
+        """`peek` followed by `ensure_fresh`; may block on a refresh if the token has expired."""
+        session = self.peek(session_id)
+        if session is None:
+            return None
+        return self.ensure_fresh(session_id, session)
+
+    def _refresh(self, session_id: str, session: dict) -> dict | None:
+        try:
+            token_info = self.auth_manager.refresh_access_token(session["token_info"]["refresh_token"])
+        except Exception as e:
+            logger.warning("Spotify token refresh failed: %s", e)
+            return None
+        # Re-read so a profile cached meanwhile isn't lost.
+        latest = self.store.get(session_id) or session
+        updated = {**latest, "token_info": token_info}
+        self.store.set(session_id, updated)
+        return updated
+
+    def _refresh_in_background(self, session_id: str, session: dict) -> None:
+        with self._lock:
+            if session_id in self._refreshing:
+                return
+            self._refreshing.add(session_id)
+
+        def refresh():
+            try:
+                self._refresh(session_id, session)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(session_id)
+
+        self._executor.submit(refresh)
+
+    def save_profile(self, session_id: str, profile: dict) -> None:
+        session = self.store.get(session_id)
+        if session is not None:
+            self.store.set(session_id, {**session, "profile": profile})
@@ -0,0 +1,263 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .config import CACHE_DIR
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class SQLiteCache:
+    """
+    A persistent key/value cache backed by SQLite.
+
+    Each entry is fresh until `ttl` seconds after it was written and may then be
+    served stale for another `stale_ttl` seconds while it is refreshed in the
+    background. The table is bounded to `max_entries`, evicting the least
+    recently used rows first. Values must be JSON-serialisable.
+
+    Concurrent misses for the same key share a single `fetch()`.
+    """
+
+    def __init__(self, path: str | Path, max_entries: int = 10_000, clock=time.time):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._refreshing: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._executor: ThreadPoolExecutor | None = None
+        self._flights = SingleFlight()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                fresh_until REAL NOT NULL,
+                stale_until REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+
+    def _lookup(self, key: str):
+        """Return `(value, is_fresh)`, or `(_MISSING, False)` if absent or fully expired."""
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, fresh_until, stale_until FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[2] <= now:
+                return _MISSING, False
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]), row[1] > now
+
+    def get(self, key: str, default=None):
+        """Return the cached value (fresh or stale) for `key`, or `default`."""
+        value, _ = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key: str, value, ttl: float, stale_ttl: float = 0.0) -> None:
+        now = self._clock()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, fresh_until, stale_until, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now + ttl + stale_ttl, now),
+            )
+            self._evict()
+
+    def items(self, prefix: str = "") -> list[tuple[str, object]]:
+        """Every unexpired `(key, value)` whose key starts with `prefix`; listing does not count as an access."""
+        now = self._clock()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM cache WHERE substr(key, 1, ?) = ? AND stale_until > ?",
+                (len(prefix), prefix, now),
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def _evict(self) -> None:
+        # Caller holds self._lock.
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def get_or_fetch(self, key: str, fetch, ttl: float, stale_ttl: float = 0.0, negative_ttl: float | None = None):
+        """
+        Return the value for `key`, calling `fetch()` on a miss.
+
+        Stale entries are returned immediately and refreshed in the background.
+        Exceptions from `fetch()` on a miss propagate to the caller and nothing
+        is cached. If `negative_ttl` is given, empty (falsy) results are cached
+        for that long instead of `ttl`.
+        """
+        value, fresh = self._lookup(key)
+        if value is not _MISSING:
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self._refresh_in_background(key, fetch, ttl, stale_ttl, negative_ttl)
+            return value
+
+        self.misses += 1
+        return self._flights.do(key, lambda: self._fetch_and_store(key, fetch, ttl, stale_ttl, negative_ttl))
+
+    async def aget_or_fetch(self, key: str, fetch, ttl: float, stale_ttl: float = 0.0, negative_ttl: float | None = None):
+        """
+        Async counterpart of `get_or_fetch`, where `fetch` is a coroutine
+        function. Stale entries are refreshed in a background task.
+        """
+        value, fresh = self._lookup(key)
+        if value is not _MISSING:
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self._refresh_task(key, fetch, ttl, stale_ttl, negative_ttl)
+            return value
+
+        self.misses += 1
+        return await self._flights.ado(key, lambda: self._afetch_and_store(key, fetch, ttl, stale_ttl, negative_ttl))
+
+    def _store(self, key: str, value, ttl: float, stale_ttl: float, negative_ttl: float | None) -> None:
+        if not value and negative_ttl is not None:
+            self.set(key, value, negative_ttl)
+        else:
+            self.set(key, value, ttl, stale_ttl)
+
+    def _fetch_and_store(self, key: str, fetch, ttl: float, stale_ttl: float, negative_ttl: float | None):
+        # A flight for this key may have finished between our miss and now.
+        value, _ = self._lookup(key)
+        if value is _MISSING:
+            value = fetch()
+            self._store(key, value, ttl, stale_ttl, negative_ttl)
+        return value
+
+    async def _afetch_and_store(self, key: str, fetch, ttl: float, stale_ttl: float, negative_ttl: float | None):
+        value, _ = self._lookup(key)
+        if value is _MISSING:
+            value = await fetch()
+            self._store(key, value, ttl, stale_ttl, negative_ttl)
+        return value
+
+    def _refresh_task(self, key: str, fetch, ttl: float, stale_ttl: float, negative_ttl: float | None) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        async def refresh():
+            try:
+                self._store(key, await fetch(), ttl, stale_ttl, negative_ttl)
+            except Exception as e:
+                logger.warning("Background refresh of %s failed: %s", key, e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _refresh_in_background(self, key: str, fetch, ttl: float, stale_ttl: float, negative_ttl: float | None) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh")
+
+        def refresh():
+            try:
+                self._store(key, fetch(), ttl, stale_ttl, negative_ttl)
+            except Exception as e:
+                logger.warning("Background refresh of %s failed: %s", key, e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(refresh)
+
+    def stats(self) -> dict:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self._flights.coalesced,
+            "size": size,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self._conn.close()
+
+
+DEFAULT_MAX_ENTRIES = 10_000
+
+_caches: dict[str, SQLiteCache] = {}
+_sized: set[str] = set()  # caches whose bound a caller has named
+_caches_lock = threading.Lock()
+
+
+def get_cache(name: str, max_entries: int | None = None) -> SQLiteCache:
+    """
+    Return the process-wide cache called `name`, stored under `CACHE_DIR`.
+
+    The first caller to name `max_entries` sets the bound (until then it is
+    `DEFAULT_MAX_ENTRIES`); naming a different one later raises ValueError
+    rather than being silently ignored.
+    """
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = SQLiteCache(Path(CACHE_DIR) / f"{name}.sqlite3", max_entries=max_entries or DEFAULT_MAX_ENTRIES)
+            _caches[name] = cache
+        elif max_entries is not None and name in _sized and max_entries != cache.max_entries:
+            raise ValueError(f"Cache {name!r} is bounded to {cache.max_entries} entries, not {max_entries}.")
+        elif max_entries is not None:
+            cache.max_entries = max_entries
+        if max_entries is not None:
+            _sized.add(name)
+        return cache
+
+
+def all_caches() -> dict[str, SQLiteCache]:
+    """Return every cache opened so far in this process, by name."""
+    with _caches_lock:
+        return dict(_caches)
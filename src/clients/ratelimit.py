@@ -0,0 +1,120 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class QuotaExceeded(Exception):
+    """Raised when the daily request budget has been used up."""
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. Callers
+    either `reserve` a token (possibly going into debt and being told how long
+    to wait) or `try_acquire` one without waiting.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Take `tokens` and return how many seconds the caller must wait before using them."""
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take `tokens` only if they are available right now."""
+        with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return max(0.0, self._tokens)
+
+
+class RateLimiter:
+    """
+    Combines a per-second bucket (callers wait their turn) with a daily bucket
+    (callers are refused once the day's budget is spent).
+    """
+
+    def __init__(self, per_second: float, per_day: float, clock=time.monotonic, sleep=time.sleep):
+        self.per_second = TokenBucket(per_second, max(1.0, per_second), clock=clock)
+        self.daily = TokenBucket(per_day / SECONDS_PER_DAY, per_day, clock=clock)
+        self._sleep = sleep
+
+    def acquire(self) -> float:
+        """Block until a request may be sent. Returns the time spent waiting."""
+        if not self.daily.try_acquire():
+            raise QuotaExceeded("Daily request quota exhausted.")
+        wait = self.per_second.reserve()
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """Like `acquire`, but waits without blocking the event loop."""
+        if not self.daily.try_acquire():
+            raise QuotaExceeded("Daily request quota exhausted.")
+        wait = self.per_second.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    @property
+    def remaining_today(self) -> int:
+        return int(self.daily.available)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a `Retry-After` header given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0, retry_after: float | None = None) -> float:
+    """
+    Exponential backoff with full jitter. A server-supplied `Retry-After` is
+    treated as a lower bound.
+    """
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        return retry_after + delay * 0.1
+    return delay
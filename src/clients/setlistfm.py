@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..config import SETLISTFM_API_KEY, SETLISTFM_API_URL, SETLISTFM_DAILY_QUOTA, SETLISTFM_RATE_PER_SECOND
+from ..metrics import LIMITER_WAIT, UPSTREAM_RATE_LIMITED
+from .ratelimit import RateLimiter, backoff_delay, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = SETLISTFM_API_URL
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_rate_limited = UPSTREAM_RATE_LIMITED.labels("setlistfm")
+
+
+class SetlistFMClient:
+    """
+    A setlist.fm API client with a keep-alive connection pool. Every request
+    goes through a shared `RateLimiter` and transient failures are retried
+    with jittered exponential backoff, honouring `Retry-After`.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None,
+        limiter: RateLimiter,
+        session: requests.Session | None = None,
+        max_retries: int = 3,
+        timeout: float = 10.0,
+        pool_size: int = 10,
+        sleep=time.sleep,
+    ):
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._sleep = sleep
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+        session.headers.update({"x-api-key": api_key or "", "Accept": "application/json"})
+        self.session = session
+
+    def get(self, path: str, params: dict | None = None) -> dict:
+        """
+        GET `path` (relative to the API root) and return the decoded JSON body.
+
+        Raises `requests.HTTPError` for non-retryable statuses or when retries
+        are exhausted, and `QuotaExceeded` when the daily budget is spent.
+        """
+        url = f"{BASE_URL}{path}"
+        for attempt in range(self.max_retries + 1):
+            LIMITER_WAIT.observe(self.limiter.acquire())
+            try:
+                resp = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning("setlist.fm request to %s failed (%s), retrying in %.2fs", path, e, delay)
+                self._sleep(delay)
+                continue
+
+            if resp.status_code == 429:
+                _rate_limited.inc()
+            if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = backoff_delay(attempt, retry_after=parse_retry_after(resp.headers.get("Retry-After")))
+                logger.warning("setlist.fm returned %s for %s, retrying in %.2fs", resp.status_code, path, delay)
+                self._sleep(delay)
+                continue
+
+            resp.raise_for_status()
+            return resp.json()
+
+
+class AsyncSetlistFMClient:
+    """
+    The asyncio counterpart of `SetlistFMClient`, built on a pooled
+    `httpx.AsyncClient`. It shares the same `RateLimiter`, so sync and async
+    callers draw from one quota. Errors are raised as `requests` exceptions
+    so callers handle both clients the same way.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None,
+        limiter: RateLimiter,
+        http: httpx.AsyncClient | None = None,
+        max_retries: int = 3,
+        timeout: float = 10.0,
+        pool_size: int = 20,
+    ):
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.http = http or httpx.AsyncClient(
+            base_url=BASE_URL,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+        self.http.headers.update({"x-api-key": api_key or "", "Accept": "application/json"})
+
+    async def get(self, path: str, params: dict | None = None) -> dict:
+        """Async `SetlistFMClient.get`."""
+        for attempt in range(self.max_retries + 1):
+            LIMITER_WAIT.observe(await self.limiter.acquire_async())
+            try:
+                resp = await self.http.get(path, params=params)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise requests.ConnectionError(str(e)) from e
+                delay = backoff_delay(attempt)
+                logger.warning("setlist.fm request to %s failed (%s), retrying in %.2fs", path, e, delay)
+                await asyncio.sleep(delay)
+                continue
+
+            if resp.status_code == 429:
+                _rate_limited.inc()
+            if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = backoff_delay(attempt, retry_after=parse_retry_after(resp.headers.get("Retry-After")))
+                logger.warning("setlist.fm returned %s for %s, retrying in %.2fs", resp.status_code, path, delay)
+                await asyncio.sleep(delay)
+                continue
+
+            if resp.is_error:
+                error_resp = requests.Response()
+                error_resp.status_code = resp.status_code
+                error_resp._content = resp.content
+                raise requests.HTTPError(f"{resp.status_code} Error for url: {resp.url}", response=error_resp)
+            return resp.json()
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+
+_limiter: RateLimiter | None = None
+_client: SetlistFMClient | None = None
+_client_lock = threading.Lock()
+# httpx connection pools belong to the event loop they were opened on.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncSetlistFMClient]" = weakref.WeakKeyDictionary()
+
+
+def get_limiter() -> RateLimiter:
+    """Return the process-wide setlist.fm rate limiter shared by all clients."""
+    global _limiter
+    with _client_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(SETLISTFM_RATE_PER_SECOND, SETLISTFM_DAILY_QUOTA)
+        return _limiter
+
+
+def get_client() -> SetlistFMClient:
+    """Return the process-wide setlist.fm client, creating it on first use."""
+    global _client
+    if _client is None:
+        limiter = get_limiter()
+        with _client_lock:
+            if _client is None:
+                _client = SetlistFMClient(SETLISTFM_API_KEY, limiter)
+    return _client
+
+
+def get_async_client() -> AsyncSetlistFMClient:
+    """Return the async setlist.fm client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncSetlistFMClient(SETLISTFM_API_KEY, get_limiter())
+        _async_clients[loop] = client
+    return client
+
+
+async def close_async_client() -> None:
+    """Close the running loop's async client, if one was opened."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,218 @@
+import asyncio
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+import spotipy
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ..config import SPOTIFY_API_URL, SPOTIFY_MAX_RETRIES
+from ..metrics import UPSTREAM_RATE_LIMITED
+from .ratelimit import backoff_delay, parse_retry_after
+
+API_BASE = SPOTIFY_API_URL
+
+_rate_limited = UPSTREAM_RATE_LIMITED.labels("spotify")
+
+# 5xx responses are retried (a few times) only for methods that are safe to repeat.
+SERVER_ERRORS = (500, 502, 503, 504)
+SERVER_ERROR_RETRIES = 3
+IDEMPOTENT_METHODS = Retry.DEFAULT_ALLOWED_METHODS
+
+
+def call_with_backoff(fn, *args, **kwargs):
+    """
+    Call a spotipy method, backing off and retrying when Spotify answers 429.
+    Other errors, and a 429 on the final attempt, propagate to the caller.
+    """
+    for attempt in range(SPOTIFY_MAX_RETRIES + 1):
+        try:
+            return fn(*args, **kwargs)
+        except spotipy.SpotifyException as e:
+            if e.http_status == 429:
+                _rate_limited.inc()
+            if e.http_status != 429 or attempt == SPOTIFY_MAX_RETRIES:
+                raise
+            retry_after = parse_retry_after((e.headers or {}).get("Retry-After"))
+            time.sleep(backoff_delay(attempt, retry_after=retry_after))
+
+
+class ProfileCachingSpotify(spotipy.Spotify):
+    """
+    A `spotipy.Spotify` that answers `me()`/`current_user()` from a profile
+    cached in the user's session, fetching it (and reporting it through
+    `on_profile`) only the first time.
+    """
+
+    def __init__(self, *args, profile: dict | None = None, on_profile=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prefix = f"{API_BASE}/"
+        self._profile = profile
+        self._on_profile = on_profile
+
+    def me(self):
+        if self._profile is None:
+            self._profile = super().me()
+            if self._on_profile is not None:
+                self._on_profile(self._profile)
+        return self._profile
+
+
+_requests_session: requests.Session | None = None
+_requests_session_lock = threading.Lock()
+
+
+def get_requests_session() -> requests.Session:
+    """
+    A keep-alive session shared by every per-request `spotipy.Spotify`.
+
+    Passing a session makes spotipy skip building its own, so this one carries
+    the retries spotipy would otherwise mount: 5xx responses to idempotent
+    methods are retried. A 5xx to a POST may already have been applied, so
+    creates and appends are not repeated, and 429s are left to
+    `call_with_backoff`, which every tool call goes through.
+    """
+    global _requests_session
+    with _requests_session_lock:
+        if _requests_session is None:
+            _requests_session = requests.Session()
+            retry = Retry(total=SERVER_ERROR_RETRIES, status_forcelist=SERVER_ERRORS, backoff_factor=0.3)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=retry)
+            _requests_session.mount("https://", adapter)
+            _requests_session.mount("http://", adapter)
+        return _requests_session
+
+
+# httpx connection pools belong to the event loop they were opened on.
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _get_pool() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = httpx.AsyncClient(
+            base_url=API_BASE,
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+        _pools[loop] = pool
+    return pool
+
+
+async def close_pool() -> None:
+    """Close the running loop's Spotify connection pool, if one was opened."""
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.aclose()
+
+
+class AsyncSpotify:
+    """
+    A small asyncio Spotify Web API client for one user's access token.
+
+    It implements the subset of `spotipy.Spotify` the tools use, with the same
+    method names and return values, over a shared pooled `httpx.AsyncClient`.
+    429 responses are retried with backoff, and 5xx responses to idempotent
+    methods a few times, as on the sync path; other failures raise
+    `spotipy.SpotifyException` just like spotipy does.
+    """
+
+    def __init__(self, access_token: str, http: httpx.AsyncClient | None = None,
+                 profile: dict | None = None, on_profile=None):
+        self._headers = {"Authorization": f"Bearer {access_token}"}
+        self._http = http
+        self._profile = profile
+        self._on_profile = on_profile
+
+    async def _request(self, method: str, url: str, params: dict | None = None, json: dict | None = None) -> dict:
+        http = self._http or _get_pool()
+        for attempt in range(SPOTIFY_MAX_RETRIES + 1):
+            try:
+                resp = await http.request(method, url, params=params, json=json, headers=self._headers)
+            except httpx.TransportError as e:
+                raise spotipy.SpotifyException(599, -1, f"{url}:\n {e}", reason=str(e)) from e
+            if resp.status_code == 429:
+                _rate_limited.inc()
+            if resp.status_code == 429 and attempt < SPOTIFY_MAX_RETRIES:
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                await asyncio.sleep(backoff_delay(attempt, retry_after=retry_after))
+                continue
+            if resp.status_code in SERVER_ERRORS and method in IDEMPOTENT_METHODS \
+                    and attempt < min(SERVER_ERROR_RETRIES, SPOTIFY_MAX_RETRIES):
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            if resp.is_error:
+                try:
+                    msg = resp.json().get("error", {}).get("message", resp.text)
+                except ValueError:
+                    msg = resp.text
+                raise spotipy.SpotifyException(
+                    resp.status_code, -1, f"{resp.url}:\n {msg}", reason=msg, headers=dict(resp.headers)
+                )
+            return resp.json() if resp.content else {}
+
+    async def current_user(self) -> dict:
+        if self._profile is None:
+            self._profile = await self._request("GET", "/me")
+            if self._on_profile is not None:
+                self._on_profile(self._profile)
+        return self._profile
+
+    me = current_user
+
+    async def search(self, q: str, type: str = "track", limit: int = 10) -> dict:
+        return await self._request("GET", "/search", params={"q": q, "type": type, "limit": limit})
+
+    async def artist_albums(self, artist_id: str, include_groups: str | None = None, limit: int = 20) -> dict:
+        params = {"limit": limit}
+        if include_groups:
+            params["include_groups"] = include_groups
+        return await self._request("GET", f"/artists/{artist_id}/albums", params=params)
+
+    async def albums(self, albums: list[str]) -> dict:
+        return await self._request("GET", "/albums", params={"ids": ",".join(albums)})
+
+    async def next(self, result: dict) -> dict | None:
+        if not result.get("next"):
+            return None
+        return await self._request("GET", result["next"])
+
+    async def user_playlist_create(self, user: str, name: str, public: bool = True, description: str = "") -> dict:
+        return await self._request(
+            "POST", f"/users/{user}/playlists", json={"name": name, "public": public, "description": description}
+        )
+
+    async def playlist_add_items(self, playlist_id: str, items: list[str]) -> dict:
+        return await self._request("POST", f"/playlists/{playlist_id}/tracks", json={"uris": items})
+
+    async def playlist_is_following(self, playlist_id: str, user_ids: list[str]) -> list[bool]:
+        return await self._request(
+            "GET", f"/playlists/{playlist_id}/followers/contains", params={"ids": ",".join(user_ids)}
+        )
+
+    async def playlist_items(self, playlist_id: str, fields: str | None = None, limit: int = 100, offset: int = 0,
+                             additional_types: tuple = ("track", "episode")) -> dict:
+        params = {"limit": limit, "offset": offset, "additional_types": ",".join(additional_types)}
+        if fields:
+            params["fields"] = fields
+        return await self._request("GET", f"/playlists/{playlist_id}/tracks", params=params)
+
+    async def playlist_replace_items(self, playlist_id: str, items: list[str]) -> dict:
+        return await self._request("PUT", f"/playlists/{playlist_id}/tracks", json={"uris": items})
+
+    async def playlist_remove_all_occurrences_of_items(self, playlist_id: str, items: list[str]) -> dict:
+        return await self._request(
+            "DELETE", f"/playlists/{playlist_id}/tracks", json={"tracks": [{"uri": uri} for uri in items]}
+        )
+
+    async def playlist_reorder_items(self, playlist_id: str, range_start: int, insert_before: int,
+                                     range_length: int = 1) -> dict:
+        return await self._request(
+            "PUT",
+            f"/playlists/{playlist_id}/tracks",
+            json={"range_start": range_start, "insert_before": insert_before, "range_length": range_length},
+        )
@@ -3,8 +3,109 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Path of the toml file holding the Spotify OAuth settings.
+CONFIG_PATH = os.getenv("SETLISTIFY_CONFIG", "./config.toml")
+
 TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
+# Any OpenAI-compatible endpoint and model; defaults to DeepSeek-R1 on Together.
+LLM_API_BASE = os.getenv("LLM_API_BASE", "https://api.together.xyz/v1")
+LLM_MODEL_ID = os.getenv("LLM_MODEL_ID", "deepseek-ai/DeepSeek-R1")
+SETLISTFM_API_URL = os.getenv("SETLISTFM_API_URL", "https://api.setlist.fm/rest/1.0")
 SETLISTFM_API_KEY = os.getenv("SETLISTFM_API_KEY") # Rate limit max. 2.0/second and max. 1440/DAY. (can request upgrade)
+SETLISTFM_RATE_PER_SECOND = float(os.getenv("SETLISTFM_RATE_PER_SECOND", "2.0"))
+SETLISTFM_DAILY_QUOTA = int(os.getenv("SETLISTFM_DAILY_QUOTA", "1440"))
+
+# On-disk caches (seconds). Artist name -> mbid mappings rarely change; setlists change after every show.
+CACHE_DIR = os.getenv("SETLISTIFY_CACHE_DIR", ".cache")
+SETLISTFM_CACHE_MAX_ENTRIES = int(os.getenv("SETLISTFM_CACHE_MAX_ENTRIES", "10000"))
+SETLISTFM_ARTIST_TTL = float(os.getenv("SETLISTFM_ARTIST_TTL", str(30 * 24 * 3600)))
+SETLISTFM_ARTIST_STALE_TTL = float(os.getenv("SETLISTFM_ARTIST_STALE_TTL", str(30 * 24 * 3600)))
+SETLISTFM_SETLIST_TTL = float(os.getenv("SETLISTFM_SETLIST_TTL", str(15 * 60)))
+SETLISTFM_SETLIST_STALE_TTL = float(os.getenv("SETLISTFM_SETLIST_STALE_TTL", str(24 * 3600)))
+# Local setlist.fm dataset (src/setlist_store.py) in DATA_DIR/setlists.sqlite3: bulk-ingested exports plus
+# every page the tools fetch. An artist's latest shows are served from it for MAX_AGE after their last sync
+# (as fresh as the cached page), and stored artist searches are reused for SEARCH_MAX_AGE.
+SETLIST_STORE = os.getenv("SETLIST_STORE", "1") != "0"
+SETLIST_STORE_MAX_AGE = float(os.getenv("SETLIST_STORE_MAX_AGE", str(SETLISTFM_SETLIST_TTL)))
+SETLIST_STORE_SEARCH_MAX_AGE = float(os.getenv("SETLIST_STORE_SEARCH_MAX_AGE", str(SETLISTFM_ARTIST_TTL)))
+# Background prefetcher (src/prefetch.py): refreshes the latest setlists of the most requested artists before
+# their cached page (SETLISTFM_SETLIST_TTL) expires, spending at most BUDGET_SHARE of SETLISTFM_DAILY_QUOTA.
+# Popularity decays with HALF_LIFE seconds; at most TOP_ARTISTS are considered each INTERVAL.
+PREFETCH = os.getenv("PREFETCH", "1") != "0"
+PREFETCH_BUDGET_SHARE = float(os.getenv("PREFETCH_BUDGET_SHARE", "0.25"))
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "60"))
+PREFETCH_REFRESH_AGE = float(os.getenv("PREFETCH_REFRESH_AGE", str(12 * 60)))
+PREFETCH_TOP_ARTISTS = int(os.getenv("PREFETCH_TOP_ARTISTS", "20"))
+PREFETCH_HALF_LIFE = float(os.getenv("PREFETCH_HALF_LIFE", str(24 * 3600)))
+PREFETCH_MAX_ARTISTS = int(os.getenv("PREFETCH_MAX_ARTISTS", "10000"))
+# Predicted setlists: sample up to N played shows within a window of the newest, reading at most MAX_PAGES pages.
+PREDICTION_SHOWS = int(os.getenv("PREDICTION_SHOWS", "10"))
+PREDICTION_WINDOW_DAYS = int(os.getenv("PREDICTION_WINDOW_DAYS", "365"))
+PREDICTION_MAX_PAGES = int(os.getenv("PREDICTION_MAX_PAGES", "5"))
+PREDICTION_HALF_LIFE_DAYS = float(os.getenv("PREDICTION_HALF_LIFE_DAYS", "90"))
+# Lineups (POST /api/lineup): artists processed at once, and the most accepted in one request.
+LINEUP_CONCURRENCY = int(os.getenv("LINEUP_CONCURRENCY", "4"))
+LINEUP_MAX_ARTISTS = int(os.getenv("LINEUP_MAX_ARTISTS", "100"))
+
+# Durable local state (sessions, jobs), as opposed to caches that can be thrown away.
+DATA_DIR = os.getenv("SETLISTIFY_DATA_DIR", ".data")
+
+# Sessions. Use "sqlite" to share sessions between several uvicorn workers on one host.
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(14 * 24 * 3600)))
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "50000"))
+
+# Background jobs (src/jobs.py), persisted in DATA_DIR/jobs.sqlite3.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "1000"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", str(7 * 24 * 3600)))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+# Running jobs hold a lease renewed every HEARTBEAT_INTERVAL; one not renewed for LEASE_TIMEOUT belongs to a
+# worker process that died and is requeued by whichever worker notices first.
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "10"))
+JOB_LEASE_TIMEOUT = float(os.getenv("JOB_LEASE_TIMEOUT", "60"))
+
+# Spotify
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1")
+# Tokens with less than this many seconds left are refreshed in the background.
+SPOTIFY_TOKEN_REFRESH_MARGIN = float(os.getenv("SPOTIFY_TOKEN_REFRESH_MARGIN", "300"))
+SPOTIFY_SEARCH_CONCURRENCY = int(os.getenv("SPOTIFY_SEARCH_CONCURRENCY", "8"))
+SPOTIFY_MAX_RETRIES = int(os.getenv("SPOTIFY_MAX_RETRIES", "4"))
+# Shared (artist, song) -> track resolutions. Misses are cached briefly so new releases show up.
+SPOTIFY_TRACK_CACHE_MAX_ENTRIES = int(os.getenv("SPOTIFY_TRACK_CACHE_MAX_ENTRIES", "100000"))
+SPOTIFY_TRACK_TTL = float(os.getenv("SPOTIFY_TRACK_TTL", str(30 * 24 * 3600)))
+SPOTIFY_TRACK_NEGATIVE_TTL = float(os.getenv("SPOTIFY_TRACK_NEGATIVE_TTL", str(24 * 3600)))
+# "catalog" matches songs against the artist's whole catalog, fetched once; "search" searches per song.
+SPOTIFY_RESOLVE_MODE = os.getenv("SPOTIFY_RESOLVE_MODE", "catalog")
+SPOTIFY_CATALOG_TTL = float(os.getenv("SPOTIFY_CATALOG_TTL", str(7 * 24 * 3600)))
+SPOTIFY_CATALOG_STALE_TTL = float(os.getenv("SPOTIFY_CATALOG_STALE_TTL", str(30 * 24 * 3600)))
+# Matching indexes built from cached catalogs, kept in memory per artist (LRU) and rebuilt after INDEX_TTL.
+SPOTIFY_CATALOG_INDEX_MAX_ENTRIES = int(os.getenv("SPOTIFY_CATALOG_INDEX_MAX_ENTRIES", "64"))
+SPOTIFY_CATALOG_INDEX_TTL = float(os.getenv("SPOTIFY_CATALOG_INDEX_TTL", "3600"))
+# Playlists written for each user, keyed on the user and playlist name, so a re-run updates the
+# existing playlist instead of creating a duplicate.
+SPOTIFY_PLAYLIST_CACHE_MAX_ENTRIES = int(os.getenv("SPOTIFY_PLAYLIST_CACHE_MAX_ENTRIES", "100000"))
+SPOTIFY_PLAYLIST_TTL = float(os.getenv("SPOTIFY_PLAYLIST_TTL", str(365 * 24 * 3600)))
+# Agent run results, keyed on the artist and their latest setlist id; a new show changes the key.
+AGENT_RESULT_TTL = float(os.getenv("AGENT_RESULT_TTL", str(30 * 24 * 3600)))
+AGENT_RESULT_MAX_ENTRIES = int(os.getenv("AGENT_RESULT_MAX_ENTRIES", "10000"))
+# During agent runs, tools return a short handle and summary for shows and setlists instead of the full data.
+AGENT_COMPACT_RESULTS = os.getenv("AGENT_COMPACT_RESULTS", "1") != "0"
+# Tool-call plans learned from successful agent runs and replayed for matching tasks without the LLM.
+AGENT_PLAN_CACHE = os.getenv("AGENT_PLAN_CACHE", "1") != "0"
+AGENT_PLAN_TTL = float(os.getenv("AGENT_PLAN_TTL", str(30 * 24 * 3600)))
+AGENT_PLAN_MAX_TEMPLATES = int(os.getenv("AGENT_PLAN_MAX_TEMPLATES", "100"))
+# A plan that fails this many replays in a row is dropped and relearned from the next agent run.
+AGENT_PLAN_MAX_FAILURES = int(os.getenv("AGENT_PLAN_MAX_FAILURES", "3"))
+
+# Logging (src/log.py). LOG_LEVELS overrides logging.ini per logger, e.g. "src.tools=DEBUG,httpx=WARNING".
+LOG_CONFIG = os.getenv("SETLISTIFY_LOG_CONFIG", "./logging.ini")
+LOG_LEVELS = os.getenv("SETLISTIFY_LOG_LEVELS", "")
+LOG_QUEUE_SIZE = int(os.getenv("SETLISTIFY_LOG_QUEUE_SIZE", "10000"))
+# Below WARNING, at most BURST records per logger and message template every INTERVAL seconds (0 disables).
+LOG_SAMPLE_BURST = int(os.getenv("SETLISTIFY_LOG_SAMPLE_BURST", "20"))
+LOG_SAMPLE_INTERVAL = float(os.getenv("SETLISTIFY_LOG_SAMPLE_INTERVAL", "60"))
 
 # Langfuse
 LANGFUSE_PUBLIC_KEY = os.getenv("LANGFUSE_PUBLIC_KEY")
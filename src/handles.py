@@ -0,0 +1,81 @@
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .config import AGENT_COMPACT_RESULTS
+
+_HANDLE = re.compile(r"^([a-z_]+):(\d+)$")
+
+
+class UnknownHandle(ValueError):
+    """Raised when a tool is given a handle that this run never issued."""
+
+
+class HandleStore:
+    """
+    Large tool results from one agent run, kept out of the LLM prompt. The
+    model sees a short handle such as `"setlist:1"` plus a summary, and passes
+    the handle to the next tool, which resolves it here.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: dict[str, object] = {}
+
+    def put(self, kind: str, value) -> str:
+        with self._lock:
+            handle = f"{kind}:{sum(key.startswith(kind + ':') for key in self._values) + 1}"
+            self._values[handle] = value
+        return handle
+
+    def get(self, handle: str, kind: str):
+        match = _HANDLE.match(handle.strip())
+        with self._lock:
+            value = self._values.get(handle.strip())
+        if match is None or match.group(1) != kind or value is None:
+            raise UnknownHandle(f"{handle!r} is not a {kind} handle from this run.")
+        return value
+
+
+_store: ContextVar[HandleStore | None] = ContextVar("handle_store", default=None)
+
+
+@contextmanager
+def handle_scope(enabled: bool = AGENT_COMPACT_RESULTS):
+    """
+    Give the tools called in this context a fresh `HandleStore`, so they
+    return handles instead of full results. Bind it around an agent run,
+    next to `bind_spotify_client`; with `enabled=False` this does nothing.
+    """
+    token = _store.set(HandleStore() if enabled else None)
+    try:
+        yield
+    finally:
+        _store.reset(token)
+
+
+def compacting() -> bool:
+    """Whether tools called here should return handles (i.e. inside an enabled `handle_scope`)."""
+    return _store.get() is not None
+
+
+def compact(kind: str, value, summarize):
+    """
+    Inside a `handle_scope`, store `value` and return `{"handle": ..., **summarize(value)}`.
+    Elsewhere (the direct pipeline, tests) return `value` unchanged.
+    """
+    store = _store.get()
+    if store is None:
+        return value
+    return {"handle": store.put(kind, value), **summarize(value)}
+
+
+def resolve(value, kind: str):
+    """Return the value behind a handle string; anything else is returned as is."""
+    if not isinstance(value, str):
+        return value
+    store = _store.get()
+    if store is None:
+        raise UnknownHandle(f"{value!r} is not a {kind} list, and handles are only valid during an agent run.")
+    return store.get(value, kind)
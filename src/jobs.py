@@ -0,0 +1,336 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from opentelemetry import trace
+
+from .agent_results import agent_task, latest_show_key
+from .config import (
+    JOB_HEARTBEAT_INTERVAL,
+    JOB_LEASE_TIMEOUT,
+    JOB_MAX_ATTEMPTS,
+    JOB_MAX_QUEUED,
+    JOB_RETENTION,
+    JOB_WORKERS,
+)
+from .log import log_context
+from .pipeline import create_playlist_for_artist
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer("setlistify.jobs")
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+
+class QueueFull(Exception):
+    """Raised by `submit` when `max_queued` jobs are already waiting."""
+
+
+class JobStore:
+    """
+    Jobs and their progress events in a SQLite database, so queued work
+    survives a restart. Higher `priority` runs first, then oldest first.
+
+    Several worker processes may share the database. A claimed job is leased
+    to the claiming store's `worker_id` and kept alive with `heartbeat`; only
+    jobs whose lease has lapsed are taken back by `recover`.
+    """
+
+    def __init__(self, path: str | Path, clock=time.time, worker_id: str | None = None):
+        self._clock = clock
+        self.worker_id = worker_id or uuid.uuid4().hex
+        self._lock = threading.Lock()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                owner TEXT,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                worker_id TEXT,
+                heartbeat_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created_at);
+            CREATE TABLE IF NOT EXISTS job_events (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                event TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            );
+            """
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("worker_id", "TEXT"), ("heartbeat_at", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def submit(self, kind: str, payload: dict, owner: str | None = None, priority: int = 0, max_queued: int | None = None) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            if max_queued is not None and self._queued_count() >= max_queued:
+                raise QueueFull(f"{max_queued} jobs are already queued")
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, priority, status, payload, owner, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, priority, QUEUED, json.dumps(payload), owner, self._clock()),
+            )
+        return job_id
+
+    def _queued_count(self) -> int:
+        # Caller holds self._lock.
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()
+        return count
+
+    def claim(self) -> dict | None:
+        """Lease the next queued job to this worker and return it, or None if the queue is empty."""
+        with self._lock:
+            now = self._clock()
+            row = self._conn.execute(
+                """
+                UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1, worker_id = ?, heartbeat_at = ?
+                WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY priority DESC, created_at LIMIT 1)
+                RETURNING *
+                """,
+                (RUNNING, now, self.worker_id, now, QUEUED),
+            ).fetchone()
+        return self._job(row)
+
+    def heartbeat(self) -> int:
+        """Renew the leases of the jobs this worker is running. Returns how many there are."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND worker_id = ?",
+                (self._clock(), RUNNING, self.worker_id),
+            ).rowcount
+
+    def add_event(self, job_id: str, event: dict) -> int:
+        with self._lock:
+            (seq,) = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT INTO job_events (job_id, seq, event) VALUES (?, ?, ?)",
+                (job_id, seq, json.dumps(event, default=str)),
+            )
+        return seq
+
+    def events(self, job_id: str, after: int = 0) -> list[tuple[int, dict]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, event FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after)
+            ).fetchall()
+        return [(row["seq"], json.loads(row["event"])) for row in rows]
+
+    def finish(self, job_id: str, result=None, error: str | None = None) -> bool:
+        """
+        Record the outcome of a job this worker is running. Returns False (and
+        changes nothing) if its lease lapsed and the job was taken back.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = ?",
+                (FAILED if error else SUCCEEDED, json.dumps(result, default=str), error, self._clock(),
+                 job_id, self.worker_id, RUNNING),
+            ).rowcount == 1
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row)
+
+    def recover(self, max_attempts: int = JOB_MAX_ATTEMPTS, lease_timeout: float = JOB_LEASE_TIMEOUT) -> int:
+        """
+        Requeue running jobs whose lease has not been renewed for
+        `lease_timeout` seconds: their worker process is gone. Jobs that have
+        already been tried `max_attempts` times are failed instead. Returns the
+        number requeued.
+        """
+        with self._lock:
+            now = self._clock()
+            stale = "status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)"
+            self._conn.execute(
+                f"UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE {stale} AND attempts >= ?",
+                (FAILED, "Gave up after repeated interruptions.", now, RUNNING, now - lease_timeout, max_attempts),
+            )
+            return self._conn.execute(
+                f"UPDATE jobs SET status = ?, worker_id = NULL WHERE {stale}", (QUEUED, RUNNING, now - lease_timeout)
+            ).rowcount
+
+    def purge(self, older_than: float = JOB_RETENTION) -> None:
+        """Delete finished jobs (and their events) older than `older_than` seconds."""
+        cutoff = self._clock() - older_than
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM job_events WHERE job_id IN (SELECT id FROM jobs WHERE status IN (?, ?) AND finished_at < ?)",
+                (*FINISHED, cutoff),
+            )
+            self._conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (*FINISHED, cutoff))
+
+    def close(self) -> None:
+        self._conn.close()
+
+    @staticmethod
+    def _job(row) -> dict | None:
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+
+class JobQueue:
+    """
+    Runs jobs from a `JobStore` on a fixed number of worker threads, so the
+    web tier only submits and reads status.
+
+    `runners` maps a job kind to `runner(spotify_client, payload, emit)`, which
+    reports progress through `emit(event)` and returns the job's result.
+    `client_factory(owner)` rebuilds the owner's Spotify client when the job
+    starts (or returns None if their session is gone).
+    """
+
+    def __init__(self, store: JobStore, runners: dict, client_factory, workers: int = JOB_WORKERS,
+                 max_queued: int = JOB_MAX_QUEUED, poll_interval: float = 1.0,
+                 heartbeat_interval: float = JOB_HEARTBEAT_INTERVAL):
+        self.store = store
+        self._runners = runners
+        self._client_factory = client_factory
+        self._workers = workers
+        self._max_queued = max_queued
+        self._poll_interval = poll_interval
+        self._heartbeat_interval = heartbeat_interval
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        self._recover()
+        self.store.purge()
+        self._stopping.clear()
+        for index in range(self._workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._keep_leases, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Stop taking new jobs. Jobs still running when this returns stop being
+        renewed, and are requeued once their lease lapses.
+        """
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def submit(self, kind: str, payload: dict, owner: str | None = None, priority: int = 0) -> str:
+        if kind not in self._runners:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = self.store.submit(kind, payload, owner=owner, priority=priority, max_queued=self._max_queued)
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def _recover(self) -> None:
+        requeued = self.store.recover()
+        if requeued:
+            logger.info("Requeued %d interrupted job(s)", requeued)
+
+    def _keep_leases(self) -> None:
+        # Renew this worker's leases, and take back jobs from workers that stopped renewing theirs.
+        while not self._stopping.wait(self._heartbeat_interval):
+            try:
+                self.store.heartbeat()
+                self._recover()
+            except sqlite3.Error as e:
+                logger.warning("Job heartbeat failed: %s", e)
+
+    def _work(self) -> None:
+        while not self._stopping.is_set():
+            job = self.store.claim()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self._poll_interval)
+                continue
+            self.run(job)
+
+    def run(self, job: dict) -> None:
+        job_id = job["id"]
+
+        def emit(event: dict) -> None:
+            self.store.add_event(job_id, event)
+
+        with log_context(job_id=job_id), tracer.start_as_current_span(f"job.{job['kind']}") as span:
+            span.set_attribute("job.id", job_id)
+            span.set_attribute("job.attempt", job["attempts"])
+            try:
+                spotify_client = self._client_factory(job["owner"])
+                if spotify_client is None:
+                    raise RuntimeError("The Spotify session for this job has expired; please log in again.")
+                result = self._runners[job["kind"]](spotify_client, job["payload"], emit)
+            except Exception as e:
+                logger.exception("Job %s failed", job_id)
+                emit({"type": "error", "message": str(e)})
+                if not self.store.finish(job_id, error=str(e)):
+                    logger.warning("Job %s was taken over by another worker; dropping its failure", job_id)
+                return
+
+            error = result.get("error") if isinstance(result, dict) else None
+            if error:
+                emit({"type": "error", "message": error})
+            if not self.store.finish(job_id, result=result, error=error):
+                logger.warning("Job %s was taken over by another worker; dropping its result", job_id)
+
+
+def run_agent_job(spotify_client, payload: dict, emit) -> object:
+    """Run the agent for `payload["artist_name"]` (and optional `prompt`), like `/api/agent/setlist`."""
+    artist_name = payload["artist_name"]
+    prompt = payload.get("prompt")
+    emit({"type": "progress", "kind": "start", "message": f"🎵 Starting on {artist_name}...", "step": 0})
+
+    result_key = None if prompt else latest_show_key(artist_name)
+    completed = []
+    with agent_task(spotify_client, prompt or f"create a playlist for {artist_name}", result_key) as events:
+        for event in events:
+            emit(event)
+            if event["type"] == "complete":
+                completed.append(event["data"])
+    if not completed:
+        raise RuntimeError("The agent stopped without producing a result.")
+    return completed[-1]
+
+
+def run_playlist_job(spotify_client, payload: dict, emit) -> dict:
+    """Run the direct pipeline, like `POST /api/playlist`."""
+    emit({"type": "progress", "kind": "start", "message": f"🎵 Starting on {payload['artist_name']}...", "step": 0})
+    result = create_playlist_for_artist(spotify_client, **payload)
+    if "error" not in result:
+        emit({"type": "complete", "data": result})
+    return result
+
+
+RUNNERS = {"agent": run_agent_job, "playlist": run_playlist_job}
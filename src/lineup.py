@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import logging
+
+from .config import LINEUP_CONCURRENCY
+from .normalize import normalize_key
+from .pipeline import preview_artist_async
+from .tools.setlist_tools import is_mbid, search_artist_async
+from .tools.spotify_tools import resolve_tracks_async, write_playlist_async
+
+logger = logging.getLogger(__name__)
+
+
+def _lineup_name(artists: list[str]) -> str:
+    shown = ", ".join(artists[:3])
+    return f"Lineup: {shown} + {len(artists) - 3} more" if len(artists) > 3 else f"Lineup: {shown}"
+
+
+def _lineup_key(playlist_name: str, artists: list[str]) -> str:
+    # The name only shows the first artists, so the combined playlist is identified by the whole lineup.
+    digest = hashlib.sha1("\n".join(normalize_key(artist) for artist in artists).encode()).hexdigest()[:16]
+    return f"{playlist_name}|lineup:{digest}"
+
+
+async def _find_artist(entry: str) -> dict | None:
+    if is_mbid(entry):
+        return {"name": None, "mbid": entry.strip()}
+    artists = await search_artist_async(entry)
+    if not artists or "error" in artists[0]:
+        return None
+    return artists[0]
+
+
+async def _process_artist(spotify_client, entry: str, combined: bool, count: int | None, mode: str) -> tuple[dict, list]:
+    """Look up one lineup entry and resolve its tracks; returns `(outcome, tracks)`."""
+    artist = await _find_artist(entry)
+    if artist is None:
+        return {"artist": entry, "error": f"No artist found matching '{entry}'."}, []
+    preview = await preview_artist_async(artist, count=count, mode=mode)
+    if "error" in preview:
+        return {"artist": artist.get("name") or entry, "error": preview["error"]}, []
+
+    artist_name = preview["artist"] or entry
+    tracks = [track for track in await resolve_tracks_async(spotify_client, artist_name, preview["songs"]) if track]
+    outcome = {
+        "artist": artist_name,
+        "event_date": preview["event_date"],
+        "venue_name": preview["venue_name"],
+        "songs": len(preview["songs"]),
+        "songs_found": len(tracks),
+    }
+    if not combined:
+        playlist = await write_playlist_async(spotify_client, artist_name, tracks, preview["event_date"], preview["venue_name"])
+        outcome.update(playlist)
+    return outcome, tracks
+
+
+async def lineup_events(
+    spotify_client,
+    artists: list[str],
+    combined: bool = False,
+    playlist_name: str | None = None,
+    count: int | None = None,
+    mode: str = "latest",
+    concurrency: int = LINEUP_CONCURRENCY,
+):
+    """
+    Build playlists for a lineup of artist names or MusicBrainz ids, without the LLM.
+
+    Up to `concurrency` artists are processed at once; their setlist.fm and
+    Spotify calls share the process-wide rate limits and caches. Yields an
+    `{"type": "artist", "index": ...}` event as each artist finishes (with its
+    playlist unless `combined`), then a `complete` event. With `combined`, one
+    playlist holding every artist's songs in lineup order is written at the
+    end.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process(index: int, entry: str):
+        async with semaphore:
+            try:
+                outcome, tracks = await _process_artist(spotify_client, entry, combined, count, mode)
+                return index, outcome, tracks
+            except Exception as e:
+                logger.warning("Lineup entry %r failed: %s", entry, e)
+                return index, {"artist": entry, "error": f"Failed to build a setlist: {e}"}, []
+
+    tasks = [asyncio.create_task(process(index, entry)) for index, entry in enumerate(artists)]
+    outcomes: list[dict | None] = [None] * len(artists)
+    tracks_by_artist: list[list] = [[] for _ in artists]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, outcome, tracks = await next_done
+            outcomes[index] = outcome
+            tracks_by_artist[index] = tracks
+            yield {"type": "artist", "index": index, **outcome}
+    finally:
+        # Stop outstanding work if the client goes away mid-stream.
+        for task in tasks:
+            task.cancel()
+
+    summary = {
+        "artists": len(artists),
+        "succeeded": sum(1 for outcome in outcomes if "error" not in outcome),
+        "failed": [outcome["artist"] for outcome in outcomes if "error" in outcome],
+    }
+    if combined and not summary["succeeded"]:
+        summary["playlist"] = {"error": "No setlists were found for this lineup."}
+    elif combined:
+        seen = set()
+        tracks = []
+        for track in (track for artist_tracks in tracks_by_artist for track in artist_tracks):
+            if track["uri"] not in seen:
+                seen.add(track["uri"])
+                tracks.append(track)
+        names = [outcome["artist"] for outcome in outcomes if "error" not in outcome]
+        name = playlist_name or _lineup_name(names)
+        summary["playlist"] = await write_playlist_async(
+            spotify_client, "", tracks, "", "", playlist_name=name, playlist_key=_lineup_key(name, names)
+        )
+    yield {"type": "complete", "data": summary}
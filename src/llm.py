@@ -1,9 +1,16 @@
-import os
+from functools import lru_cache
+
 from smolagents import OpenAIServerModel        # ← correct import for Together
 
-model = OpenAIServerModel(
-    model_id="deepseek-ai/DeepSeek-R1",         # any Together-hosted slug
-    api_base="https://api.together.xyz/v1",     # Together’s OpenAI-compatible URL
-    api_key=os.getenv("TOGETHER_API_KEY"),
-    timeout=60,                                 # optional
-)
+from .config import LLM_API_BASE, LLM_MODEL_ID, TOGETHER_API_KEY
+
+
+@lru_cache(maxsize=1)
+def get_model() -> OpenAIServerModel:
+    """The shared model client (DeepSeek-R1 on Together by default), created on first use."""
+    return OpenAIServerModel(
+        model_id=LLM_MODEL_ID,                      # a Together-hosted slug by default
+        api_base=LLM_API_BASE,                      # Together’s OpenAI-compatible URL by default
+        api_key=TOGETHER_API_KEY,
+        timeout=60,                                 # optional
+    )
@@ -0,0 +1,237 @@
+import atexit
+import json
+import logging
+import logging.config
+import logging.handlers
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from .config import (
+    LANGFUSE_SECRET_KEY,
+    LOG_CONFIG,
+    LOG_LEVELS,
+    LOG_QUEUE_SIZE,
+    LOG_SAMPLE_BURST,
+    LOG_SAMPLE_INTERVAL,
+    SETLISTFM_API_KEY,
+    TOGETHER_API_KEY,
+)
+from .metrics import REGISTRY
+
+_context: ContextVar[dict] = ContextVar("log_context", default={})
+
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    "setlistify_log_records_dropped_total", "Log records dropped before output.", ("reason",)
+)
+_sampled_out = LOG_RECORDS_DROPPED.labels("sampled")
+_queue_full = LOG_RECORDS_DROPPED.labels("queue_full")
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach `fields` (e.g. `request_id`, `job_id`) to every record logged inside the block."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+# ---- Redaction --------------------------------
+
+_SECRET_PATTERNS = [
+    re.compile(r"(?i)(bearer\s+)[A-Za-z0-9._~+/=-]+"),
+    re.compile(
+        r"""(?ix)
+        (["']?\b(?:x-api-key|api[_-]?key|authorization|access_token|refresh_token|client_secret|secret[_-]?key)["']?
+        \s*[:=]\s*["']?)
+        [^"'\s,&}]+
+        """
+    ),
+    re.compile(r"([?&](?:code|token|key)=)[^&\s\"']+"),
+]
+# Replaced, never mutated, so the listener thread can iterate it without a lock.
+_secrets: frozenset[str] = frozenset(value for value in (SETLISTFM_API_KEY, TOGETHER_API_KEY, LANGFUSE_SECRET_KEY) if value)
+
+
+def register_secret(value: str | None) -> None:
+    """Mask `value` wherever it appears in log output (e.g. secrets read from config.toml)."""
+    global _secrets
+    if value and len(value) >= 4:
+        _secrets = _secrets | {value}
+
+
+def redact(text: str) -> str:
+    for secret in _secrets:
+        if secret in text:
+            text = text.replace(secret, "***")
+    for pattern in _SECRET_PATTERNS:
+        text = pattern.sub(r"\1***", text)
+    return text
+
+
+class _RedactingFormatter(logging.Formatter):
+    """Wraps the configured formatter and masks secrets in its output."""
+
+    def __init__(self, inner: logging.Formatter):
+        super().__init__()
+        self._inner = inner
+
+    def format(self, record: logging.LogRecord) -> str:
+        return redact(self._inner.format(record))
+
+
+# ---- Formatting --------------------------------
+
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the log context and any `extra=` fields as keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RESERVED)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class ContextFormatter(logging.Formatter):
+    """A text formatter that appends the log context and `extra=` fields as `key=value`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = " ".join(f"{key}={value}" for key, value in vars(record).items() if key not in _RESERVED)
+        if not fields:
+            return text
+        head, newline, tail = text.partition("\n")
+        return f"{head} [{fields}]{newline}{tail}"
+
+
+# ---- Sampling --------------------------------
+
+class SamplingFilter(logging.Filter):
+    """
+    Pass at most `burst` records per logger, level and message template every
+    `interval` seconds. The first record let through after a quiet spell
+    carries `suppressed=N`. Warnings and above are never sampled.
+    """
+
+    def __init__(self, burst: int = LOG_SAMPLE_BURST, interval: float = LOG_SAMPLE_INTERVAL,
+                 clock=time.monotonic, max_keys: int = 10_000):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._clock = clock
+        self._max_keys = max_keys
+        self._lock = threading.Lock()
+        self._windows: dict[tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.burst <= 0 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = self._clock()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                if len(self._windows) >= self._max_keys:
+                    self._windows.clear()
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+        _sampled_out.inc()
+        return False
+
+
+# ---- Background handler --------------------------------
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to `target` on a listener thread, so formatting, redaction
+    and I/O happen off the calling thread. The caller only stamps the log
+    context, applies sampling and enqueues; if the queue is full the record
+    is dropped rather than blocking.
+
+    Use it from `logging.ini`, e.g. `class=src.log.BackgroundHandler` with
+    `args=(StreamHandler(sys.stdout),)`. The handler's formatter is applied
+    by `target`.
+    """
+
+    def __init__(self, target: logging.Handler, maxsize: int = LOG_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize))
+        self.target = target
+        self.target.setFormatter(_RedactingFormatter(logging.Formatter()))
+        self.addFilter(SamplingFilter())
+        self._listener = logging.handlers.QueueListener(self.queue, target, respect_handler_level=True)
+        self._listener.start()
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt: logging.Formatter | None) -> None:
+        self.target.setFormatter(_RedactingFormatter(fmt or logging.Formatter()))
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now (they may be mutated later) but leave
+        # formatting, including tracebacks, to the listener thread.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        record.__dict__.update(_context.get())
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _queue_full.inc()
+
+    def close(self) -> None:
+        if self._listener is not None:
+            listener, self._listener = self._listener, None
+            listener.stop()
+            self.target.close()
+        super().close()
+
+
+# ---- Setup --------------------------------
+
+def parse_levels(spec: str) -> dict[str, str]:
+    """Parse `"src.tools=DEBUG,httpx=WARNING"` into `{logger: level}`."""
+    levels = {}
+    for item in spec.split(","):
+        name, sep, level = item.partition("=")
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(path: str | Path = LOG_CONFIG, levels: str = LOG_LEVELS) -> None:
+    """
+    Load `logging.ini` unless a `BackgroundHandler` is already installed
+    (e.g. by `uvicorn --log-config logging.ini`), then apply the per-logger
+    overrides in `SETLISTIFY_LOG_LEVELS`.
+    """
+    root = logging.getLogger()
+    if not any(isinstance(handler, BackgroundHandler) for handler in root.handlers) and Path(path).exists():
+        logging.config.fileConfig(path, disable_existing_loggers=False)
+    for name, level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(level)
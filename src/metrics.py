@@ -0,0 +1,344 @@
+import bisect
+import inspect
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import wraps
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _CounterChild:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("_lock", "_bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: dict[tuple, object] = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    @abstractmethod
+    def _new_child(self):
+        ...
+
+    def labels(self, *values) -> object:
+        """
+        Return the series for these label values. Resolve it once and keep it
+        where a hot path records the same series repeatedly.
+        """
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _series(self) -> list[tuple[tuple, object]]:
+        with self._lock:
+            return list(self._children.items())
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._series():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: tuple, child) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default.dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def _render_child(self, values: tuple, child) -> list[str]:
+        with child._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Metrics kept in process memory and rendered in the Prometheus text format
+    on scrape. Recording is a dict lookup and a short lock; values that are
+    already tracked elsewhere (cache counters, the daily quota) are read by
+    collectors only when `render()` runs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, fn):
+        """
+        Register `fn()` to run at scrape time. It returns `Gauge`/`Counter`
+        objects built on the spot, which are rendered but not kept.
+        """
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collect in collectors:
+            for metric in collect():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+TOOL_DURATION = REGISTRY.histogram(
+    "setlistify_tool_duration_seconds", "Time spent in each tool call.", ("tool",)
+)
+TOOL_ERRORS = REGISTRY.counter(
+    "setlistify_tool_errors_total", "Tool calls that raised or returned an error.", ("tool",)
+)
+LIMITER_WAIT = REGISTRY.histogram(
+    "setlistify_setlistfm_limiter_wait_seconds",
+    "Time a setlist.fm request waited for the per-second rate limiter.",
+    buckets=(0.0, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+UPSTREAM_RATE_LIMITED = REGISTRY.counter(
+    "setlistify_upstream_rate_limited_total", "Responses with status 429 from an upstream API.", ("service",)
+)
+AGENT_STEPS = REGISTRY.histogram(
+    "setlistify_agent_steps", "Agent steps per run.", buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+)
+LLM_TOKENS = REGISTRY.histogram(
+    "setlistify_llm_tokens",
+    "LLM tokens used per agent run.",
+    ("direction",),
+    buckets=(500, 1000, 2500, 5000, 10000, 25000, 50000, 100000),
+)
+AGENT_PLANS = REGISTRY.counter(
+    "setlistify_agent_plans_total",
+    "Agent tasks by plan cache outcome: replayed, fallback (replay failed), miss, recorded.",
+    ("outcome",),
+)
+SSE_STREAMS = REGISTRY.gauge(
+    "setlistify_sse_streams_active", "Server-sent event streams currently open.", ("route",)
+)
+
+
+@REGISTRY.collector
+def _collect_caches():
+    from .cache import all_caches
+
+    requests = Counter("setlistify_cache_requests_total", "Cache lookups by outcome.", ("cache", "result"))
+    coalesced = Counter("setlistify_cache_coalesced_total", "Misses that shared another caller's fetch.", ("cache",))
+    evictions = Counter("setlistify_cache_evictions_total", "Entries evicted to stay within size bounds.", ("cache",))
+    hit_ratio = Gauge("setlistify_cache_hit_ratio", "Fresh and stale hits over all lookups since start.", ("cache",))
+    size = Gauge("setlistify_cache_entries", "Entries currently stored.", ("cache",))
+    for name, cache in sorted(all_caches().items()):
+        stats = cache.stats()
+        for result, key in (("hit", "hits"), ("stale", "stale_hits"), ("miss", "misses")):
+            requests.labels(name, result).inc(stats[key])
+        coalesced.labels(name).inc(stats["coalesced"])
+        evictions.labels(name).inc(stats["evictions"])
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        hit_ratio.labels(name).set((stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0)
+        size.labels(name).set(stats["size"])
+    return [requests, coalesced, evictions, hit_ratio, size]
+
+
+@REGISTRY.collector
+def _collect_quota():
+    from .clients.setlistfm import get_limiter
+
+    remaining = Gauge("setlistify_setlistfm_quota_remaining", "setlist.fm requests left in today's budget.")
+    remaining.set(get_limiter().remaining_today)
+    return [remaining]
+
+
+def _is_error(result) -> bool:
+    # Imported here: progress records its own metrics from this module.
+    from .progress import tool_error
+
+    return tool_error(result) is not None
+
+
+def timed(name: str):
+    """
+    Record the duration of each call to the decorated function (sync or
+    async) in `setlistify_tool_duration_seconds{tool=name}`.
+    """
+    duration = TOOL_DURATION.labels(name)
+    errors = TOOL_ERRORS.labels(name)
+
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = await fn(*args, **kwargs)
+                except BaseException:
+                    errors.inc()
+                    raise
+                finally:
+                    duration.observe(time.perf_counter() - start)
+                if _is_error(result):
+                    errors.inc()
+                return result
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                errors.inc()
+                raise
+            finally:
+                duration.observe(time.perf_counter() - start)
+            if _is_error(result):
+                errors.inc()
+            return result
+        return wrapper
+
+    return decorate
+
+
+def timed_tool(*tools) -> None:
+    """
+    Time calls to these smolagents tools. Call it after the `@tool`
+    definitions: `@tool` rejects other decorators on the same function.
+    """
+    for tool in tools:
+        tool.forward = timed(tool.name)(tool.forward)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,30 @@
+import re
+import unicodedata
+
+
+def normalize_key(text: str) -> str:
+    """
+    Normalise free text for use as a lookup key: accents are dropped, case is
+    folded, punctuation removed and runs of whitespace collapsed, so that
+    "Don't Stop Me Now" and "dont  stop me now" produce the same key.
+    """
+    decomposed = unicodedata.normalize("NFKD", text).casefold()
+    kept = "".join(ch for ch in decomposed if ch.isalnum() or ch.isspace())
+    return " ".join(kept.split())
+
+
+# Words that mark a recording variant rather than a different song, e.g.
+# "Enter Sandman (Remastered 2021)", "One - Live at Wembley", "Song (feat. X)".
+_VARIANT_WORDS = (
+    r"(?:remaster(?:ed)?|live|version|edit|mix|remix|mono|stereo|demo|acoustic|bonus|single|radio"
+    r"|instrumental|deluxe|anniversary|session|take|feat|ft|featuring|with)"
+)
+_BRACKETED_VARIANT = re.compile(rf"\s*[(\[][^)\]]*\b{_VARIANT_WORDS}\b[^)\]]*[)\]]", re.IGNORECASE)
+_DASH_VARIANT = re.compile(rf"\s+-\s+.*\b{_VARIANT_WORDS}\b.*$", re.IGNORECASE)
+
+
+def normalize_title(title: str) -> str:
+    """Like `normalize_key`, but also strips version suffixes such as "(Live)" or "- Remastered"."""
+    title = _BRACKETED_VARIANT.sub("", title)
+    title = _DASH_VARIANT.sub("", title)
+    return normalize_key(title)
@@ -0,0 +1,144 @@
+from spotipy import Spotify
+
+from .config import PREDICTION_SHOWS
+from .tools.setlist_tools import (
+    extract_setlist,
+    get_latest_show,
+    get_latest_show_async,
+    latest_shows_for_artist_async,
+    predict_for_artist_async,
+    predict_setlist,
+    predict_setlist_async,
+)
+from .tools.spotify_tools import create_playlist, create_playlist_async
+
+
+def _show_meta(show: dict) -> dict:
+    return {
+        "event_date": show.get("event_date"),
+        "venue": show.get("venue"),
+        "city": show.get("city"),
+        "country": show.get("country"),
+        "url": show.get("url"),
+    }
+
+
+def _combine_shows(artist_name: str, shows: list) -> dict:
+    if not shows:
+        return {"error": f"No artist found matching '{artist_name}'."}
+    if "error" in shows[0]:
+        return {"error": shows[0]["error"]}
+
+    latest = shows[0]
+    return {
+        "artist": latest.get("artist"),
+        "event_date": latest.get("event_date"),
+        "venue_name": latest.get("venue"),
+        "songs": extract_setlist(shows),
+        "shows": [_show_meta(show) for show in shows],
+    }
+
+
+def _from_prediction(prediction: dict) -> dict:
+    if "error" in prediction:
+        return prediction
+    return {
+        "artist": prediction["artist"],
+        "event_date": prediction["last_date"],
+        "venue_name": f"Predicted Setlist ({prediction['shows_used']} shows)",
+        "songs": prediction["songs"],
+        "shows": prediction["shows"],
+        "ranking": prediction["ranking"],
+    }
+
+
+def preview_setlist(artist_name: str, count: int | None = None, mode: str = "latest") -> dict:
+    """
+    Fetch the latest `count` shows for an artist and combine their songs.
+
+    With `mode="predicted"` the songs are instead a ranked prediction for the
+    next show, drawn from up to `count` recent shows, and a `ranking` is
+    included.
+
+    Returns a dict with `artist`, `event_date`, `venue_name`, `songs` and
+    per-show `shows` metadata, or a dict with an `error` key.
+    """
+    if mode == "predicted":
+        return _from_prediction(predict_setlist(artist_name, count=count or PREDICTION_SHOWS))
+    return _combine_shows(artist_name, get_latest_show(artist_name, count=count or 1))
+
+
+def create_playlist_for_artist(
+    spotify_client: Spotify,
+    artist_name: str,
+    songs: list[str] | None = None,
+    event_date: str | None = None,
+    venue_name: str | None = None,
+    count: int | None = None,
+    mode: str = "latest",
+) -> dict:
+    """
+    Create a playlist for an artist's latest show(s), or for their predicted
+    next show with `mode="predicted"`.
+
+    If `songs`, `event_date` or `venue_name` are not supplied they are looked
+    up from setlist.fm first. Returns the `create_playlist` result, or a dict
+    with an `error` key.
+    """
+    if songs is None or not event_date or not venue_name:
+        preview = preview_setlist(artist_name, count=count, mode=mode)
+        if "error" in preview:
+            return preview
+        songs = preview["songs"] if songs is None else songs
+        event_date = event_date or preview["event_date"]
+        venue_name = venue_name or preview["venue_name"]
+
+    return create_playlist(
+        spotify_client=spotify_client,
+        artist_name=artist_name,
+        songs=songs,
+        event_date=event_date,
+        venue_name=venue_name,
+    )
+
+
+async def preview_setlist_async(artist_name: str, count: int | None = None, mode: str = "latest") -> dict:
+    """Async `preview_setlist`."""
+    if mode == "predicted":
+        return _from_prediction(await predict_setlist_async(artist_name, count=count or PREDICTION_SHOWS))
+    return _combine_shows(artist_name, await get_latest_show_async(artist_name, count=count or 1))
+
+
+async def preview_artist_async(artist: dict, count: int | None = None, mode: str = "latest") -> dict:
+    """`preview_setlist_async` for an artist already looked up (a dict with `mbid` and, optionally, `name`)."""
+    if mode == "predicted":
+        return _from_prediction(await predict_for_artist_async(artist, count=count or PREDICTION_SHOWS))
+    label = artist.get("name") or artist["mbid"]
+    return _combine_shows(label, await latest_shows_for_artist_async(artist, count=count or 1))
+
+
+async def create_playlist_for_artist_async(
+    spotify_client,
+    artist_name: str,
+    songs: list[str] | None = None,
+    event_date: str | None = None,
+    venue_name: str | None = None,
+    count: int | None = None,
+    mode: str = "latest",
+) -> dict:
+    """Async `create_playlist_for_artist`, for an `AsyncSpotify` client."""
+    if songs is None or not event_date or not venue_name:
+        preview = await preview_setlist_async(artist_name, count=count, mode=mode)
+        if "error" in preview:
+            return preview
+        songs = preview["songs"] if songs is None else songs
+        event_date = event_date or preview["event_date"]
+        venue_name = venue_name or preview["venue_name"]
+
+    return await create_playlist_async(
+        spotify_client,
+        artist_name=artist_name,
+        songs=songs,
+        event_date=event_date,
+        venue_name=venue_name,
+    )
@@ -0,0 +1,397 @@
+import json
+import logging
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Iterator
+
+from opentelemetry import trace
+from opentelemetry.trace import Status, StatusCode
+
+from .cache import get_cache
+from .config import AGENT_PLAN_CACHE, AGENT_PLAN_MAX_FAILURES, AGENT_PLAN_MAX_TEMPLATES, AGENT_PLAN_TTL
+from .metrics import AGENT_PLANS
+from .prediction import parse_event_date
+from .progress import agent_events, summarize_tool_output, tool_error
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer("setlistify.plans")
+
+# A plan is the tool-call trajectory of a successful agent run, with each
+# argument rewritten as where it came from:
+#
+#   {"$task": "artist_name"}                 a slot in the task text
+#   {"$step": 0, "path": [...], "as": ...}   a value in an earlier tool's output
+#   anything else                            a literal from the instructions
+#
+# A task that matches a plan's pattern replays the calls directly against the
+# agent's tools; the LLM only runs if a step fails or no plan matches.
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+class PlanStepFailed(Exception):
+    """A replayed step could not be bound or its tool returned an error."""
+
+
+def _normalize(task: str) -> str:
+    return " ".join(task.split())
+
+
+# ---- Recording --------------------------------
+
+def _find(value, output, path: tuple = ()) -> list | None:
+    """The path to the first place `value` appears in `output`, searching breadth-first."""
+    queue = [(output, path)]
+    while queue:
+        node, at = queue.pop(0)
+        if node == value and type(node) is type(value):
+            return list(at)
+        if isinstance(node, dict):
+            queue.extend((child, at + (key,)) for key, child in node.items())
+        elif isinstance(node, list):
+            queue.extend((child, at + (index,)) for index, child in enumerate(node))
+    return None
+
+
+def _source(value, outputs: list) -> dict | None:
+    """Where in the earlier outputs `value` came from, latest output first."""
+    if not isinstance(value, (str, list, dict)) or len(value) < (2 if isinstance(value, str) else 1):
+        return None
+    # The model reformats setlist.fm's "dd-MM-yyyy" dates as ISO dates for Spotify.
+    if isinstance(value, str) and _ISO_DATE.match(value):
+        year, month, day = value.split("-")
+        for step in reversed(range(len(outputs))):
+            path = _find(f"{day}-{month}-{year}", outputs[step])
+            if path is not None:
+                return {"$step": step, "path": path, "as": "iso_date"}
+    for step in reversed(range(len(outputs))):
+        path = _find(value, outputs[step])
+        if path is not None:
+            return {"$step": step, "path": path}
+    return None
+
+
+class _Recorder:
+    """Rewrites one run's tool arguments as task slots, output references and literals."""
+
+    def __init__(self, task: str, instructions: str):
+        self.task = task
+        self.instructions = instructions
+        self.slots: dict[str, str] = {}  # slot name -> value as written in the task
+
+    def _slot(self, name: str, value: str) -> dict | None:
+        if len(value.strip()) < 2:
+            return None
+        start = self.task.lower().find(value.strip().lower())
+        if start < 0:
+            return None
+        text = self.task[start:start + len(value.strip())]
+        for slot, existing in self.slots.items():
+            if existing.lower() == text.lower():
+                return {"$task": slot}
+        slot = name if name not in self.slots else f"{name}_{len(self.slots)}"
+        self.slots[slot] = text
+        return {"$task": slot}
+
+    def parameterise(self, name: str, value, outputs: list, is_answer: bool = False):
+        """The template for one argument value, or raise ValueError if it has no known source."""
+        if isinstance(value, str):
+            spec = self._slot(name, value) or _source(value, outputs)
+            if spec is not None:
+                return spec
+            if value in self.instructions:
+                return value
+        elif isinstance(value, (list, dict)):
+            spec = _source(value, outputs)
+            if spec is not None:
+                return spec
+        else:
+            return value
+        if is_answer and outputs:
+            # A free-text answer summarises the last result; replay answers with the result itself.
+            return {"$step": len(outputs) - 1, "path": []}
+        raise ValueError(f"{name}={value!r} comes from neither the task nor an earlier tool.")
+
+    def pattern(self) -> tuple[str, str]:
+        """`(regex, readable template)` for the task, with each slot as a named group."""
+        spans = []
+        lowered = self.task.lower()
+        for slot, text in self.slots.items():
+            start = lowered.find(text.lower())
+            spans.append((start, start + len(text), slot))
+        spans.sort()
+        regex, readable, at = "", "", 0
+        for start, end, slot in spans:
+            if start < at:
+                raise ValueError(f"Task slots overlap at {slot!r}.")
+            regex += re.escape(self.task[at:start]) + f"(?P<{slot}>.+?)"
+            readable += self.task[at:start] + "{" + slot + "}"
+            at = end
+        return regex + re.escape(self.task[at:]), readable + self.task[at:]
+
+
+def build_plan(task: str, trajectory: list, instructions: str = "") -> dict:
+    """
+    Turn the `trajectory` of a successful run (see `agent_events`) into a
+    plan. Raises ValueError if the run failed a step or passed a value the
+    plan could not reproduce for another task.
+    """
+    task = _normalize(task)
+    if not trajectory or trajectory[-1].get("tool") != "final_answer":
+        raise ValueError("The run did not end with a final answer.")
+    recorder = _Recorder(task, instructions)
+    steps, outputs = [], []
+    for call in trajectory:
+        if "error" in call:
+            raise ValueError(f"The run had a failed step: {call['error']}")
+        error = tool_error(call["output"])
+        if error:
+            raise ValueError(f"{call['tool']} failed: {error}")
+        arguments = call["arguments"]
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except ValueError:
+                arguments = None
+        if not isinstance(arguments, dict):
+            raise ValueError(f"{call['tool']} was called without keyword arguments.")
+        is_answer = call["tool"] == "final_answer"
+        steps.append({
+            "tool": call["tool"],
+            "arguments": {
+                name: recorder.parameterise(name, value, outputs, is_answer) for name, value in arguments.items()
+            },
+        })
+        outputs.append(call["output"])
+    regex, template = recorder.pattern()
+    return {"pattern": regex, "template": template, "steps": steps}
+
+
+# ---- Storage and matching --------------------------------
+
+class PlanStore:
+    """
+    Plans keyed by task pattern, one `agent_plans` cache entry each, so
+    recording a replay rewrites only that plan. Bounded to `max_templates`,
+    dropping the least recently used.
+    """
+
+    _PREFIX = "plan:"
+
+    def __init__(self, cache=None, max_templates: int = AGENT_PLAN_MAX_TEMPLATES, ttl: float = AGENT_PLAN_TTL,
+                 max_failures: int = AGENT_PLAN_MAX_FAILURES, clock=time.time):
+        self._cache = cache if cache is not None else get_cache("agent_plans", max_entries=max_templates)
+        self.max_templates = max_templates
+        self.ttl = ttl
+        self.max_failures = max_failures
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def _key(self, pattern: str) -> str:
+        return self._PREFIX + pattern
+
+    def _plans(self) -> list[dict]:
+        return [plan for _, plan in self._cache.items(self._PREFIX)]
+
+    def match(self, task: str) -> tuple[dict, dict] | None:
+        """The most specific plan whose pattern matches `task`, with the slot values, or None."""
+        task = _normalize(task)
+        best = None
+        for plan in self._plans():
+            found = re.fullmatch(plan["pattern"], task, re.IGNORECASE | re.DOTALL)
+            if found is None:
+                continue
+            literal = len(task) - sum(len(value) for value in found.groupdict().values())
+            if best is None or literal > best[0]:
+                best = (literal, plan, {name: value.strip() for name, value in found.groupdict().items()})
+        return None if best is None else best[1:]
+
+    def save(self, plan: dict) -> None:
+        now = self._clock()
+        with self._lock:
+            self._cache.set(
+                self._key(plan["pattern"]),
+                {**plan, "replays": 0, "failures": 0, "created_at": now, "used_at": now},
+                ttl=self.ttl,
+            )
+            plans = self._plans()
+            for old in sorted(plans, key=lambda p: p["used_at"])[: max(0, len(plans) - self.max_templates)]:
+                self._cache.delete(self._key(old["pattern"]))
+
+    def record_replay(self, pattern: str, ok: bool) -> None:
+        """Count a replay; drop the plan after `max_failures` failures in a row."""
+        key = self._key(pattern)
+        with self._lock:
+            plan = self._cache.get(key)
+            if plan is None:
+                return
+            plan["used_at"] = self._clock()
+            if ok:
+                plan["replays"] += 1
+                plan["failures"] = 0
+            else:
+                plan["failures"] += 1
+                if plan["failures"] >= self.max_failures:
+                    logger.info("Dropping plan %r after %d failed replays", plan["template"], plan["failures"])
+                    self._cache.delete(key)
+                    return
+            self._cache.set(key, plan, ttl=self.ttl)
+
+
+@lru_cache(maxsize=1)
+def get_plan_store() -> PlanStore:
+    return PlanStore()
+
+
+# ---- Replay --------------------------------
+
+def _bind(spec, params: dict, outputs: list):
+    if not isinstance(spec, dict):
+        return spec
+    if "$task" in spec:
+        return params[spec["$task"]]
+    value = outputs[spec["$step"]]
+    try:
+        for key in spec["path"]:
+            value = value[key]
+    except (KeyError, IndexError, TypeError):
+        raise PlanStepFailed(f"step {spec['$step'] + 1} has no {spec['path']}") from None
+    if spec.get("as") == "iso_date":
+        parsed = parse_event_date(value)
+        if parsed is None:
+            raise PlanStepFailed(f"{value!r} is not a setlist.fm date")
+        value = parsed.isoformat()
+    return value
+
+
+def _progress(kind: str, message: str, step: int, **fields) -> dict:
+    return {"type": "progress", "kind": kind, "message": message, "step": step, **fields}
+
+
+def replay(agent, plan: dict, params: dict) -> Iterator[dict]:
+    """
+    Run `plan`'s tool calls with `params` against `agent`'s tools, yielding the
+    same events as `agent_events`. Raises PlanStepFailed (after the events so
+    far) if a step cannot be bound or returns an error.
+    """
+    total = len(plan["steps"])
+    outputs = []
+    # Started without being made current: the caller steps this generator
+    # from a different thread each time, so a context attached across a
+    # `yield` could not be detached.
+    span = tracer.start_span("agent.plan.replay")
+    span.set_attribute("setlistify.plan.template", plan["template"])
+    span.set_attribute("setlistify.plan.params", json.dumps(params))
+    parent = trace.set_span_in_context(span)
+    try:
+        for index, step in enumerate(plan["steps"], start=1):
+            name = step["tool"]
+            tool = agent.tools.get(name)
+            if tool is None:
+                raise PlanStepFailed(f"{name} is not one of this agent's tools")
+            arguments = {key: _bind(spec, params, outputs) for key, spec in step["arguments"].items()}
+            if name != "final_answer":
+                yield _progress("tool_start", f"Calling {name}...", index, tool=name, arguments=arguments, total=total)
+            started = time.perf_counter()
+            with tracer.start_as_current_span("agent.plan.step", context=parent) as step_span:
+                step_span.set_attribute("setlistify.plan.tool", name)
+                step_span.set_attribute("input.value", json.dumps(arguments, default=str)[:2000])
+                output = tool(**arguments)
+                error = tool_error(output)
+                if error:
+                    raise PlanStepFailed(f"{name} failed: {error}")
+            outputs.append(output)
+            if name == "final_answer":
+                span.set_attribute("setlistify.plan.outcome", "replayed")
+                yield {"type": "complete", "data": output}
+                return
+            duration = round(time.perf_counter() - started, 3)
+            yield _progress("tool_end", summarize_tool_output(name, output), index, tool=name, duration=duration,
+                            total=total)
+            yield _progress("step", f"Step {index} finished.", index, duration=duration, total=total)
+        raise PlanStepFailed("the plan ended without a final answer")
+    except PlanStepFailed as e:
+        span.set_attribute("setlistify.plan.outcome", "fallback")
+        span.set_status(Status(StatusCode.ERROR, str(e)))
+        raise
+    except Exception as e:
+        span.set_attribute("setlistify.plan.outcome", "fallback")
+        span.record_exception(e)
+        span.set_status(Status(StatusCode.ERROR, str(e)))
+        raise PlanStepFailed(str(e)) from e
+    finally:
+        span.end()
+
+
+# ---- Agent runs --------------------------------
+
+def _match(store: PlanStore, task: str) -> tuple[dict, dict] | None:
+    with tracer.start_as_current_span("agent.plan.match") as span:
+        found = store.match(task)
+        span.set_attribute("setlistify.plan.matched", found is not None)
+        if found is not None:
+            span.set_attribute("setlistify.plan.template", found[0]["template"])
+            span.set_attribute("setlistify.plan.params", json.dumps(found[1]))
+        return found
+
+
+def _record(store: PlanStore, task: str, trajectory: list, instructions: str) -> None:
+    with tracer.start_as_current_span("agent.plan.record") as span:
+        try:
+            plan = build_plan(task, trajectory, instructions)
+        except ValueError as e:
+            span.set_attribute("setlistify.plan.recorded", False)
+            span.set_attribute("setlistify.plan.skipped", str(e))
+            logger.debug("Not recording a plan for %r: %s", task, e)
+            return
+        store.save(plan)
+        AGENT_PLANS.labels("recorded").inc()
+        span.set_attribute("setlistify.plan.recorded", True)
+        span.set_attribute("setlistify.plan.template", plan["template"])
+        span.set_attribute("setlistify.plan.steps", len(plan["steps"]))
+        logger.info("Recorded a %d-step plan for %r", len(plan["steps"]), plan["template"])
+
+
+def plan_events(agent, task: str, store: PlanStore | None = None) -> Iterator[dict]:
+    """
+    `agent_events`, but first try to replay a plan learned from an earlier
+    run of a matching task. If no plan matches, or a replayed step fails,
+    the agent runs as usual and a successful run is recorded as a plan.
+    Bind the same context as for `agent_events` (Spotify client, handles).
+    """
+    if store is None:
+        if not AGENT_PLAN_CACHE:
+            yield from agent_events(agent, task)
+            return
+        store = get_plan_store()
+
+    current = trace.get_current_span()
+    found = _match(store, task)
+    if found is not None:
+        plan, params = found
+        try:
+            yield from replay(agent, plan, params)
+        except PlanStepFailed as e:
+            logger.info("Replaying plan %r failed (%s); running the agent", plan["template"], e)
+            store.record_replay(plan["pattern"], ok=False)
+            AGENT_PLANS.labels("fallback").inc()
+            current.set_attribute("setlistify.plan", "fallback")
+            yield _progress("step", "↩️ The usual plan didn't work this time; asking the agent.", 0)
+        else:
+            store.record_replay(plan["pattern"], ok=True)
+            AGENT_PLANS.labels("replayed").inc()
+            current.set_attribute("setlistify.plan", "replayed")
+            return
+    else:
+        AGENT_PLANS.labels("miss").inc()
+        current.set_attribute("setlistify.plan", "miss")
+
+    trajectory = []
+    completed = False
+    for event in agent_events(agent, task, trajectory=trajectory):
+        completed = completed or event["type"] == "complete"
+        yield event
+    if completed:
+        _record(store, task, trajectory, getattr(agent, "instructions", None) or "")
@@ -0,0 +1,91 @@
+from datetime import date, datetime
+
+import numpy as np
+
+from .normalize import normalize_title
+
+# How much each signal contributes to a song's score. Frequency is the share of
+# shows a song was played at, recency the same share weighted towards newer
+# shows, and anchoring rewards songs that open or close the set, which tend to
+# be fixtures.
+FREQUENCY_WEIGHT = 0.5
+RECENCY_WEIGHT = 0.4
+ANCHOR_WEIGHT = 0.1
+
+
+def parse_event_date(event_date: str | None) -> date | None:
+    """Parse a setlist.fm `eventDate` ("dd-MM-yyyy")."""
+    try:
+        return datetime.strptime(event_date or "", "%d-%m-%Y").date()
+    except ValueError:
+        return None
+
+
+def rank_songs(shows: list, half_life_days: float = 90.0) -> list:
+    """
+    Score every song played across `shows` (parsed shows, newest first).
+
+    Variants of a title ("One (Live)", "One") count as the same song. Returns a
+    list of `{song, score, frequency, recency, position}` dicts sorted by score,
+    where `position` is the song's average place in the set from 0 (opener) to
+    1 (closer).
+    """
+    columns: dict[str, int] = {}
+    names: list[str] = []
+    rows, cols, positions = [], [], []
+    for row, show in enumerate(shows):
+        songs = show.get("setlist") or []
+        last = max(len(songs) - 1, 1)
+        seen = set()
+        for index, name in enumerate(songs):
+            key = normalize_title(name) or name
+            if key in seen:
+                continue
+            seen.add(key)
+            if key not in columns:
+                columns[key] = len(names)
+                names.append(name)
+            rows.append(row)
+            cols.append(columns[key])
+            positions.append(index / last)
+    if not names:
+        return []
+
+    presence = np.zeros((len(shows), len(names)))
+    presence[rows, cols] = 1.0
+    position = np.full_like(presence, np.nan)
+    position[rows, cols] = positions
+
+    dates = [parse_event_date(show.get("event_date")) for show in shows]
+    newest = max((d for d in dates if d), default=None)
+    ages = np.array([(newest - d).days if d and newest else 0 for d in dates], dtype=float)
+    weights = 0.5 ** (ages / half_life_days)
+
+    frequency = presence.mean(axis=0)
+    recency = weights @ presence / weights.sum()
+    mean_position = np.nanmean(position, axis=0)
+    anchor = np.nanmean(np.abs(2 * position - 1), axis=0)
+    scores = FREQUENCY_WEIGHT * frequency + RECENCY_WEIGHT * recency + ANCHOR_WEIGHT * anchor
+
+    order = np.argsort(-scores, kind="stable")
+    return [
+        {
+            "song": names[i],
+            "score": round(float(scores[i]), 4),
+            "frequency": round(float(frequency[i]), 4),
+            "recency": round(float(recency[i]), 4),
+            "position": round(float(mean_position[i]), 4),
+        }
+        for i in order
+    ]
+
+
+def predicted_setlist(shows: list, ranking: list) -> list[str]:
+    """
+    Pick a typical-length set from `ranking`, in the order songs are usually
+    played. The length is the median number of songs per show.
+    """
+    lengths = [len(show.get("setlist") or []) for show in shows]
+    length = int(round(float(np.median(lengths)))) if lengths else 0
+    chosen = sorted(ranking[:length], key=lambda entry: entry["position"])
+    return [entry["song"] for entry in chosen]
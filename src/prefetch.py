@@ -0,0 +1,226 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from opentelemetry import trace
+
+from .clients.ratelimit import SECONDS_PER_DAY, QuotaExceeded, TokenBucket
+from .config import (
+    PREFETCH,
+    PREFETCH_BUDGET_SHARE,
+    PREFETCH_HALF_LIFE,
+    PREFETCH_INTERVAL,
+    PREFETCH_MAX_ARTISTS,
+    PREFETCH_REFRESH_AGE,
+    PREFETCH_TOP_ARTISTS,
+    SETLISTFM_DAILY_QUOTA,
+)
+from .metrics import REGISTRY, Gauge
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer("setlistify.prefetch")
+
+PREFETCH_DECISIONS = REGISTRY.counter(
+    "setlistify_prefetch_decisions_total",
+    "Background refresh decisions: refreshed, fresh, yielded (interactive traffic), budget, failed.",
+    ("decision",),
+)
+
+
+class Prefetcher:
+    """
+    Keeps the latest setlists of the most requested artists warm.
+
+    `record` counts each interactive lookup towards the artist's popularity,
+    which decays with a half-life of `half_life` seconds. Every `interval`
+    seconds the `top` most popular artists whose page was last loaded more
+    than `refresh_age` seconds ago are refreshed through `refresh(mbid)`,
+    hottest first, one setlist.fm request each.
+
+    Refreshes draw on their own bucket of `budget_share` of the daily quota,
+    and a cycle stops as soon as an interactive lookup is running or the
+    shared per-second limiter has no token to spare, so background work
+    never makes a user wait.
+    """
+
+    def __init__(
+        self,
+        refresh,
+        limiter,
+        daily_quota: int = SETLISTFM_DAILY_QUOTA,
+        budget_share: float = PREFETCH_BUDGET_SHARE,
+        interval: float = PREFETCH_INTERVAL,
+        refresh_age: float = PREFETCH_REFRESH_AGE,
+        top: int = PREFETCH_TOP_ARTISTS,
+        half_life: float = PREFETCH_HALF_LIFE,
+        max_artists: int = PREFETCH_MAX_ARTISTS,
+        clock=time.monotonic,
+    ):
+        self._refresh = refresh
+        self.limiter = limiter
+        budget = max(0.0, budget_share) * daily_quota
+        self.budget = TokenBucket(budget / SECONDS_PER_DAY, budget, clock=clock)
+        self.interval = interval
+        self.refresh_age = refresh_age
+        self.top = top
+        self.half_life = half_life
+        self.max_artists = max_artists
+        self._clock = clock
+        self._lock = threading.Lock()
+        # mbid -> {"name", "score", "seen" (when the score was last decayed), "loaded" (last refresh)}
+        self._artists: dict[str, dict] = {}
+        self._interactive = 0
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _score(self, entry: dict, now: float) -> float:
+        return entry["score"] * 0.5 ** ((now - entry["seen"]) / self.half_life)
+
+    def record(self, artist: dict) -> None:
+        """Count an interactive lookup of `artist` (a dict with `mbid` and, optionally, `name`)."""
+        now = self._clock()
+        with self._lock:
+            entry = self._artists.get(artist["mbid"])
+            if entry is None:
+                if len(self._artists) >= self.max_artists:
+                    coldest = min(self._artists, key=lambda mbid: self._score(self._artists[mbid], now))
+                    del self._artists[coldest]
+                # The lookup itself is about to load the page, so it counts as a refresh.
+                entry = self._artists[artist["mbid"]] = {"name": artist.get("name"), "score": 0.0, "loaded": now}
+            else:
+                entry["score"] = self._score(entry, now)
+            entry["score"] += 1.0
+            entry["seen"] = now
+
+    @contextmanager
+    def interactive(self):
+        """Mark an interactive lookup as running; refreshes wait until none are."""
+        with self._lock:
+            self._interactive += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._interactive -= 1
+
+    def hottest(self) -> list[dict]:
+        """The `top` artists by current popularity: dicts with `mbid`, `name`, `score` and `age`."""
+        now = self._clock()
+        with self._lock:
+            ranked = [
+                {"mbid": mbid, "name": entry["name"], "score": self._score(entry, now), "age": now - entry["loaded"]}
+                for mbid, entry in self._artists.items()
+            ]
+        ranked.sort(key=lambda artist: artist["score"], reverse=True)
+        return ranked[: self.top]
+
+    def _yield_reason(self) -> str | None:
+        with self._lock:
+            if self._interactive:
+                return "yielded"
+        if self.limiter.per_second.available < 1:
+            return "yielded"
+        if self.budget.available < 1:
+            return "budget"
+        return None
+
+    def run_once(self) -> dict:
+        """Run one refresh cycle and return how many artists each decision applied to."""
+        decisions = {"refreshed": 0, "fresh": 0, "yielded": 0, "budget": 0, "failed": 0}
+        with tracer.start_as_current_span("prefetch.cycle") as span:
+            candidates = self.hottest()
+            for artist in candidates:
+                label = artist["name"] or artist["mbid"]
+                if artist["age"] < self.refresh_age:
+                    decisions["fresh"] += 1
+                    continue
+                reason = self._yield_reason()
+                if reason is not None:
+                    decisions[reason] += 1
+                    logger.debug("Prefetch of %s deferred (%s)", label, reason)
+                    break
+                self.budget.try_acquire()
+                with tracer.start_as_current_span("prefetch.refresh") as refresh_span:
+                    refresh_span.set_attribute("setlistify.artist_mbid", artist["mbid"])
+                    refresh_span.set_attribute("setlistify.prefetch.score", artist["score"])
+                    try:
+                        self._refresh(artist["mbid"])
+                    except QuotaExceeded:
+                        decisions["budget"] += 1
+                        logger.warning("Prefetch stopped: the setlist.fm daily quota is spent")
+                        break
+                    except Exception as e:
+                        decisions["failed"] += 1
+                        refresh_span.record_exception(e)
+                        logger.warning("Prefetch of %s failed: %s", label, e)
+                    else:
+                        decisions["refreshed"] += 1
+                        logger.info("Prefetched %s (score %.1f, loaded %.0fs ago)", label, artist["score"], artist["age"])
+                # A failed refresh is not retried until the artist is due again.
+                with self._lock:
+                    if artist["mbid"] in self._artists:
+                        self._artists[artist["mbid"]]["loaded"] = self._clock()
+
+            for decision, count in decisions.items():
+                if count:
+                    PREFETCH_DECISIONS.labels(decision).inc(count)
+                span.set_attribute(f"setlistify.prefetch.{decision}", count)
+            span.set_attribute("setlistify.prefetch.candidates", len(candidates))
+            span.set_attribute("setlistify.prefetch.budget_remaining", int(self.budget.available))
+            span.set_attribute("setlistify.setlistfm.quota_remaining", self.limiter.remaining_today)
+        if decisions["refreshed"] or decisions["failed"]:
+            logger.info(
+                "Prefetch cycle: %d refreshed, %d failed, %d fresh; %d of the prefetch budget and %d of the quota left",
+                decisions["refreshed"], decisions["failed"], decisions["fresh"],
+                int(self.budget.available), self.limiter.remaining_today,
+            )
+        return decisions
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._work, name="prefetcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _work(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Prefetch cycle failed")
+
+    def stats(self) -> dict:
+        with self._lock:
+            tracked = len(self._artists)
+        return {"tracked": tracked, "budget_remaining": int(self.budget.available)}
+
+
+@lru_cache(maxsize=1)
+def get_prefetcher() -> Prefetcher | None:
+    """The process-wide prefetcher, or None when it is disabled (PREFETCH=0)."""
+    if not PREFETCH:
+        return None
+    from .clients.setlistfm import get_limiter
+    from .tools.setlist_tools import refresh_setlists_page
+
+    return Prefetcher(refresh_setlists_page, get_limiter())
+
+
+@REGISTRY.collector
+def _collect_prefetch():
+    prefetcher = get_prefetcher()
+    if prefetcher is None:
+        return []
+    stats = prefetcher.stats()
+    budget = Gauge("setlistify_prefetch_budget_remaining", "setlist.fm requests left in the prefetcher's share.")
+    tracked = Gauge("setlistify_prefetch_artists_tracked", "Artists whose popularity the prefetcher tracks.")
+    budget.set(stats["budget_remaining"])
+    tracked.set(stats["tracked"])
+    return [budget, tracked]
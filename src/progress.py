@@ -0,0 +1,121 @@
+import time
+from typing import Iterator
+
+from smolagents import ActionStep, FinalAnswerStep, PlanningStep, ToolCall, ToolOutput
+
+from .metrics import AGENT_STEPS, LLM_TOKENS
+
+
+def tool_error(output) -> str | None:
+    """The error a tool returned (tools report failures as `{"error": ...}`, alone or first in a list), if any."""
+    if isinstance(output, dict) and "error" in output:
+        return str(output["error"])
+    if isinstance(output, list) and output and isinstance(output[0], dict) and "error" in output[0]:
+        return str(output[0]["error"])
+    return None
+
+
+def summarize_tool_output(tool_name: str, output) -> str:
+    """A one-line, user-facing summary of what a tool call produced."""
+    error = tool_error(output)
+    if error is not None:
+        return f"{tool_name} failed: {error}"
+
+    # Inside an agent run, large results arrive as a handle plus a summary (src/handles.py).
+    compact = isinstance(output, dict) and "handle" in output
+
+    if tool_name == "get_latest_show" and (compact or isinstance(output, list)):
+        shows = output["shows"] if compact else output
+        if not shows:
+            return "No shows found."
+        show = shows[0]
+        songs = show["songs"] if compact else len(show.get("setlist", []))
+        return (
+            f"Found {len(shows)} show(s); latest at {show.get('venue')} on {show.get('event_date')} "
+            f"with {songs} songs."
+        )
+    if tool_name == "extract_setlist" and (compact or isinstance(output, list)):
+        return f"Compiled a setlist of {output['song_count'] if compact else len(output)} songs."
+    if tool_name.startswith("create_playlist") and isinstance(output, dict):
+        return f"Added {output.get('songs_added', 0)} songs to '{output.get('playlist_name')}'."
+    if tool_name == "final_answer":
+        return "Finished."
+    return f"{tool_name} returned."
+
+
+def _record_run(agent, steps: int) -> None:
+    AGENT_STEPS.observe(steps)
+    monitor = getattr(agent, "monitor", None)
+    if monitor is not None:
+        usage = monitor.get_total_token_counts()
+        LLM_TOKENS.labels("input").observe(usage.input_tokens)
+        LLM_TOKENS.labels("output").observe(usage.output_tokens)
+
+
+def agent_events(agent, task: str, trajectory: list | None = None) -> Iterator[dict]:
+    """
+    Run `agent` on `task` and yield a progress event for each real step:
+    tool calls starting and finishing (with durations and result summaries),
+    each completed agent step, and finally a `complete` event with the answer.
+
+    If `trajectory` is given, each tool call is appended to it as
+    `{"tool", "arguments", "output"}` and each failed step as `{"error"}`.
+    """
+    total = agent.max_steps
+    started: dict[str, float] = {}
+    step = 1
+
+    try:
+        for event in agent.run(task, stream=True):
+            if isinstance(event, ToolCall):
+                started[event.id] = time.perf_counter()
+                if event.name == "final_answer":
+                    continue
+                yield {
+                    "type": "progress",
+                    "kind": "tool_start",
+                    "tool": event.name,
+                    "arguments": event.arguments,
+                    "message": f"Calling {event.name}...",
+                    "step": step,
+                    "total": total,
+                }
+            elif isinstance(event, ToolOutput):
+                name = event.tool_call.name
+                start = started.pop(event.id, None)
+                if trajectory is not None:
+                    trajectory.append({"tool": name, "arguments": event.tool_call.arguments, "output": event.output})
+                if name == "final_answer":
+                    continue
+                progress = {
+                    "type": "progress",
+                    "kind": "tool_end",
+                    "tool": name,
+                    "duration": None if start is None else round(time.perf_counter() - start, 3),
+                    "message": summarize_tool_output(name, event.output),
+                    "step": step,
+                    "total": total,
+                }
+                error = tool_error(event.output)
+                if error is not None:
+                    progress["error"] = error
+                yield progress
+            elif isinstance(event, (ActionStep, PlanningStep)):
+                duration = event.timing.duration if event.timing else None
+                error = getattr(event, "error", None)
+                if error and trajectory is not None:
+                    trajectory.append({"error": str(error)})
+                yield {
+                    "type": "progress",
+                    "kind": "step",
+                    "message": f"Step {step} failed: {error}" if error else f"Step {step} finished.",
+                    "duration": None if duration is None else round(duration, 3),
+                    "step": step,
+                    "total": total,
+                }
+                if isinstance(event, ActionStep):
+                    step += 1
+            elif isinstance(event, FinalAnswerStep):
+                yield {"type": "complete", "data": event.output}
+    finally:
+        _record_run(agent, step - 1)
@@ -1,32 +1,79 @@
+import asyncio
 import json
-import secrets
+import logging
 import toml
+import uuid
 from contextlib import asynccontextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Literal
 
 from fastapi import FastAPI, Depends, Request, Response, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 from opentelemetry import trace
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from spotipy import Spotify
-from spotipy.cache_handler import CacheHandler
 from spotipy.oauth2 import SpotifyOAuth
 
-from .agent import build_agent_for_spotify_client, trace_provider
+from .agent import agent_pool
+from .agent_results import agent_task, latest_show_key_async
+from .auth.sessions import get_session_store
+from .auth.spotify_sessions import NullCacheHandler, SpotifySessionManager
+from .clients.setlistfm import close_async_client
+from .clients.spotify import AsyncSpotify, ProfileCachingSpotify, close_pool, get_requests_session
+from .config import CONFIG_PATH, DATA_DIR, JOB_POLL_INTERVAL, LINEUP_MAX_ARTISTS
+from .jobs import FINISHED, RUNNERS, JobQueue, JobStore, QueueFull
+from .lineup import lineup_events
+from .log import configure_logging, log_context, register_secret
+from .metrics import SSE_STREAMS, render as render_metrics
+from .pipeline import create_playlist_for_artist_async, preview_setlist_async
+from .prefetch import get_prefetcher
+from .telemetry import init_telemetry, shutdown_telemetry
 
-# Load configuration from toml file
-config = toml.load("./config.toml")
+@lru_cache(maxsize=1)
+def get_config() -> dict:
+    """Load configuration from the toml file on first use."""
+    config = toml.load(CONFIG_PATH)
+    register_secret(config.get("spotipy", {}).get("client_secret"))
+    return config
 
-# Set up OpenTelemetry
+@lru_cache(maxsize=1)
+def get_auth_manager() -> SpotifyOAuth:
+    """One OAuth manager for the whole app; tokens live in the session store, not in it."""
+    return SpotifyOAuth(**get_config()["spotipy"], cache_handler=NullCacheHandler())
+
+@lru_cache(maxsize=1)
+def get_session_manager() -> SpotifySessionManager:
+    return SpotifySessionManager(get_session_store(), get_auth_manager())
+
+@lru_cache(maxsize=1)
+def get_job_queue() -> JobQueue:
+    return JobQueue(JobStore(Path(DATA_DIR) / "jobs.sqlite3"), RUNNERS, spotify_client_for_session)
+
+# Heavy subsystems (telemetry, the LLM client, the first agent) start here rather than at import.
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    configure_logging()
+    init_telemetry()
+    try:
+        await run_in_threadpool(agent_pool.warm, 1)
+    except Exception as e:
+        logger.warning("Agent warm-up skipped: %s", e)
+    get_job_queue().start()
+    prefetcher = get_prefetcher()
+    if prefetcher is not None:
+        prefetcher.start()
     yield
-    print("\nFlushing and shutting down OpenTelemetry tracer provider...")
-    trace_provider.force_flush()
-    trace_provider.shutdown()
-    print("Tracer provider shut down.")
+    if prefetcher is not None:
+        await run_in_threadpool(prefetcher.stop)
+    await run_in_threadpool(get_job_queue().stop)
+    await close_async_client()
+    await close_pool()
+    shutdown_telemetry()
 
 app = FastAPI(title="Setlistify", lifespan=lifespan)
 
@@ -38,45 +85,66 @@ app.add_middleware(
     allow_methods=["*"],  # Allow all methods
     allow_headers=["*"],  # Allow all headers
 )
-tracer = trace.get_tracer("setlistify.server")
-FastAPIInstrumentor.instrument_app(app, tracer_provider=trace_provider)
 
-# --- Spotify OAuth2 and Session Management ---
-
-# A simple dictionary to act as a server-side session store.
-# In a production app, you would use a more robust solution like Redis.
-sessions = dict()
-
-class FastAPICacheHandler(CacheHandler):
+class RequestIdMiddleware:
     """
-    A cache handler that stores tokens in our server-side session dictionary
-    and applies a session cookie to the response.
+    Tag each request's log records with a request id (the caller's
+    `X-Request-ID`, or a new one) and echo it in the response headers.
     """
-    def __init__(self, request: Request, response: Response = None):
-        self.request = request
-        self.response = response
 
-    def get_cached_token(self):
-        return sessions.get(self.request.cookies.get("session"))
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex[:16]
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
 
-    def save_token_to_cache(self, token_info):
-        session_id = secrets.token_urlsafe(64)
-        sessions[session_id] = token_info
-        # The SessionMiddleware is not working reliably across ports.
-        # We will set the cookie manually to ensure it has the correct domain.
-        # self.request.session["token_info"] = token_info
+        with log_context(request_id=request_id):
+            await self.app(scope, receive, send_with_id)
 
-        # Manually set the cookie on the response object passed to the handler
-        if self.response:
-            self.response.set_cookie(
-                key="session", 
-                value=session_id, 
-                domain="127.0.0.1",
-                httponly=True,
-                samesite='lax' # Use 'lax' for cross-origin redirects
-            )
+app.add_middleware(RequestIdMiddleware)
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer("setlistify.server")
+# Uses the global tracer provider, which `init_telemetry` installs (or leaves as a no-op).
+FastAPIInstrumentor.instrument_app(app)
+
+async def _tracked_stream(route: str, events):
+    """Count `events` in the active-SSE gauge while the client is reading it."""
+    active = SSE_STREAMS.labels(route)
+    active.inc()
+    try:
+        async for chunk in events:
+            yield chunk
+    finally:
+        active.dec()
+
+# --- Spotify OAuth2 and Session Management ---
+
+def _unauthorized() -> HTTPException:
+    return HTTPException(status_code=401, detail=get_auth_manager().get_authorize_url())
+
+def spotify_client_for_session(session_id: str | None) -> Spotify | None:
+    """A Spotipy client for a stored session, refreshing its token if needed; None if there is no such session."""
+    session = get_session_manager().load(session_id)
+    return None if session is None else _session_spotify_client(session_id, session)
+
+def _session_spotify_client(session_id: str, session: dict) -> Spotify:
+    manager = get_session_manager()
+    return ProfileCachingSpotify(
+        auth=session["token_info"]["access_token"],
+        requests_session=get_requests_session(),
+        profile=session.get("profile"),
+        on_profile=lambda profile: manager.save_profile(session_id, profile),
+    )
 
-def get_spotify_client(cache_handler=Depends(FastAPICacheHandler)) -> Spotify:
+def get_spotify_client(request: Request) -> Spotify:
     """
     FastAPI dependency to get a Spotipy client. It handles the auth flow.
 
@@ -84,35 +152,62 @@ def get_spotify_client(cache_handler=Depends(FastAPICacheHandler)) -> Spotify:
     Spotify authorization URL. The frontend should handle this by redirecting
     the user to this URL.
     """
-    auth_manager = SpotifyOAuth(**config["spotipy"], cache_handler=cache_handler)
-    if not auth_manager.validate_token(cache_handler.get_cached_token()):
-        auth_url = auth_manager.get_authorize_url()
-        raise HTTPException(status_code=401, detail=auth_url)
-    return Spotify(auth_manager=auth_manager)
+    spotify_client = spotify_client_for_session(request.cookies.get("session"))
+    if spotify_client is None:
+        raise _unauthorized()
+    return spotify_client
+
+async def _fresh_session(request: Request) -> tuple[str, dict]:
+    """
+    The request's session with a usable token, or a 401. Only an
+    already-expired token costs a (threaded) refresh round trip; otherwise no
+    blocking work is done.
+    """
+    session_id = request.cookies.get("session")
+    manager = get_session_manager()
+    session = manager.peek(session_id)
+    if session is not None:
+        if manager.is_expired(session):
+            session = await run_in_threadpool(manager.ensure_fresh, session_id, session)
+        else:
+            session = manager.ensure_fresh(session_id, session)
+    if session is None:
+        raise _unauthorized()
+    return session_id, session
+
+async def get_agent_spotify_client(request: Request) -> Spotify:
+    """
+    A Spotipy client for the agent's (synchronous) tools, resolved like
+    `get_async_spotify_client` so async routes never load a session on the loop.
+    """
+    return _session_spotify_client(*await _fresh_session(request))
+
+async def get_async_spotify_client(request: Request) -> AsyncSpotify:
+    """Async counterpart of `get_spotify_client`, over the shared httpx pool."""
+    session_id, session = await _fresh_session(request)
+    manager = get_session_manager()
+    return AsyncSpotify(
+        session["token_info"]["access_token"],
+        profile=session.get("profile"),
+        on_profile=lambda profile: manager.save_profile(session_id, profile),
+    )
 
 @app.get("/auth")
-def spotify_auth(cache_handler=Depends(FastAPICacheHandler)):
+def spotify_auth():
     """
     Initiate Spotify OAuth flow by redirecting to Spotify's authorization URL.
     """
-    auth_manager = SpotifyOAuth(**config["spotipy"], cache_handler=cache_handler)
-    auth_url = auth_manager.get_authorize_url()
-    return RedirectResponse(url=auth_url)
+    return RedirectResponse(url=get_auth_manager().get_authorize_url())
 
 @app.get("/auth/status")
-def auth_status(cache_handler=Depends(FastAPICacheHandler)):
+async def auth_status(request: Request):
     """
     Check if user is authenticated and return profile info if logged in.
+    The profile is cached in the session, so this is normally a local lookup.
     """
-    auth_manager = SpotifyOAuth(**config["spotipy"], cache_handler=cache_handler)
-    token_info = cache_handler.get_cached_token()
-    
-    if not auth_manager.validate_token(token_info):
-        return {"authenticated": False}
-    
     try:
-        spotify = Spotify(auth_manager=auth_manager)
-        user_info = spotify.current_user()
+        spotify = await get_async_spotify_client(request)
+        user_info = await spotify.current_user()
         return {
             "authenticated": True,
             "user": {
@@ -125,18 +220,22 @@ def auth_status(cache_handler=Depends(FastAPICacheHandler)):
         return {"authenticated": False}
 
 @app.get("/callback")
-def spotify_callback(code: str, response: Response, cache_handler=Depends(FastAPICacheHandler)):
+def spotify_callback(code: str, response: Response):
     """
     Callback endpoint for Spotify to redirect to after user authorization.
     """
-    # The cache handler needs access to the response object to set the session cookie
-    cache_handler.response = response
-
-    # The auth_manager will get the token and use the cache handler to save it
-    auth_manager = SpotifyOAuth(**config["spotipy"], cache_handler=cache_handler)
-    auth_manager.get_access_token(code, as_dict=False)
+    token_info = get_auth_manager().get_access_token(code, as_dict=True, check_cache=False)
+    session_id = get_session_manager().create(token_info)
 
-    # The cookie is now set on the response object. Now, configure the redirect.
+    # The SessionMiddleware is not working reliably across ports.
+    # We set the cookie manually to ensure it has the correct domain.
+    response.set_cookie(
+        key="session",
+        value=session_id,
+        domain="127.0.0.1",
+        httponly=True,
+        samesite='lax' # Use 'lax' for cross-origin redirects
+    )
     response.status_code = 307  # Temporary Redirect
     response.headers["Location"] = "http://127.0.0.1:3000/"
     return response
@@ -144,9 +243,7 @@ def spotify_callback(code: str, response: Response, cache_handler=Depends(FastAP
 @app.get("/logout")
 def logout(request: Request):
     """Clear the server-side session."""
-    session_id = request.cookies.get("session")
-    if session_id in sessions:
-        del sessions[session_id]
+    get_session_store().delete(request.cookies.get("session"))
     return {"detail": "Logged out successfully."}
 
 
@@ -155,50 +252,122 @@ def logout(request: Request):
 class SetlistRequest(BaseModel):
     artistName: str
 
+class PlaylistRequest(BaseModel):
+    artist_name: str
+    songs: list[str] | None = None
+    event_date: str | None = None
+    venue_name: str | None = None
+    count: int | None = None
+    mode: Literal["latest", "predicted"] = "latest"
+
+@app.get("/api/setlist")
+async def get_setlist(artistName: str, count: int | None = None, mode: Literal["latest", "predicted"] = "latest"):
+    """
+    Return the combined setlist of an artist's latest `count` shows, or with
+    `mode=predicted` a ranked prediction for their next show.
+    Runs the setlist.fm tools directly, without the agent.
+    """
+    with tracer.start_as_current_span("pipeline.setlist") as span:
+        span.set_attribute("setlist.artist", artistName)
+        span.set_attribute("setlist.mode", mode)
+        result = await preview_setlist_async(artistName, count=count, mode=mode)
+    if "error" in result:
+        raise HTTPException(status_code=404, detail=result["error"])
+    return result
+
+@app.post("/api/playlist")
+async def post_playlist(body: PlaylistRequest, spotify_client=Depends(get_async_spotify_client)):
+    """
+    Create a Spotify playlist for an artist without the agent. Songs, date and
+    venue are looked up from the latest show(s) when not supplied.
+    """
+    with tracer.start_as_current_span("pipeline.playlist") as span:
+        span.set_attribute("setlist.artist", body.artist_name)
+        result = await create_playlist_for_artist_async(
+            spotify_client,
+            artist_name=body.artist_name,
+            songs=body.songs,
+            event_date=body.event_date,
+            venue_name=body.venue_name,
+            count=body.count,
+            mode=body.mode,
+        )
+    if "error" in result:
+        raise HTTPException(status_code=502, detail=result["error"])
+    return result
+
+class LineupRequest(BaseModel):
+    artists: list[str] = Field(min_length=1, max_length=LINEUP_MAX_ARTISTS)
+    combined: bool = False
+    playlist_name: str | None = None
+    count: int | None = None
+    mode: Literal["latest", "predicted"] = "latest"
+
+@app.post("/api/lineup")
+async def post_lineup(body: LineupRequest, spotify_client=Depends(get_async_spotify_client)):
+    """
+    Create playlists for a whole lineup (artist names or MusicBrainz ids)
+    without the agent: one per artist, or a single `combined` playlist.
+    Streams an SSE event per artist as it finishes, then a summary.
+    """
+    async def generate_events():
+        with tracer.start_as_current_span("pipeline.lineup") as span:
+            span.set_attribute("lineup.artists", len(body.artists))
+            span.set_attribute("lineup.combined", body.combined)
+            try:
+                async for event in lineup_events(
+                    spotify_client,
+                    body.artists,
+                    combined=body.combined,
+                    playlist_name=body.playlist_name,
+                    count=body.count,
+                    mode=body.mode,
+                ):
+                    yield f"data: {json.dumps(event, default=str)}\n\n"
+            except Exception as e:
+                yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+
+    return StreamingResponse(
+        _tracked_stream("lineup", generate_events()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
+    )
+
 @app.get("/api/agent/setlist")
-def get_setlist_stream(artistName: str, spotify_client=Depends(get_spotify_client)):
-    """Stream agent progress updates while generating setlist"""
+async def get_setlist_stream(artistName: str, prompt: str | None = None, spotify_client=Depends(get_agent_spotify_client)):
+    """
+    Stream agent progress updates while generating setlist.
+    Use `/api/setlist` and `/api/playlist` for the fixed pipeline; this route is
+    for free-form requests (pass `prompt` to override the default instruction).
+    """
     artist_name = artistName
+    task = prompt or f"create a playlist for {artist_name}"
     
-    def generate_progress():
-        import time
-        import json
-        
+    async def generate_progress():
+        # The agent and its tools are synchronous; step through them on a worker
+        # thread so the event loop stays free while the stream is open.
         try:
-            # Send initial progress
-            yield f"data: {json.dumps({'type': 'progress', 'message': f'🎵 Searching for {artist_name} setlists...', 'step': 1, 'total': 5})}\n\n"
-            time.sleep(1)
-            
-            yield f"data: {json.dumps({'type': 'progress', 'message': '🔍 Analyzing recent concerts and tours...', 'step': 2, 'total': 5})}\n\n"
-            time.sleep(2)
-            
-            yield f"data: {json.dumps({'type': 'progress', 'message': '🎸 Compiling the ultimate setlist...', 'step': 3, 'total': 5})}\n\n"
-            time.sleep(1)
-            
-            yield f"data: {json.dumps({'type': 'progress', 'message': '🎧 Matching songs to Spotify tracks...', 'step': 4, 'total': 5})}\n\n"
-            
-            # Actually run the agent
+            yield f"data: {json.dumps({'type': 'progress', 'kind': 'start', 'message': f'🎵 Starting on {artist_name}...', 'step': 0})}\n\n"
+
             with tracer.start_as_current_span("agent.setlist") as span:
                 span.set_attribute("langfuse.tags", ["agent", "setlist"])
-                user_id = spotify_client.me()["id"]
+                user_id = (await run_in_threadpool(spotify_client.me))["id"]
                 span.set_attribute("langfuse.user_id", user_id)
-                
-                agent = build_agent_for_spotify_client(spotify_client=spotify_client)
-                response = agent(f"create a playlist for {artist_name}")
-                
-                span.set_attribute("llm.output", json.dumps(response))
-            
-            yield f"data: {json.dumps({'type': 'progress', 'message': '✨ Finalizing your playlist...', 'step': 5, 'total': 5})}\n\n"
-            time.sleep(1)
-            
-            # Send final result
-            yield f"data: {json.dumps({'type': 'complete', 'data': response})}\n\n"
-            
+
+                # The default task always targets the latest show, so a previous run for
+                # that show can be replayed; only the write to this user's account remains.
+                result_key = None if prompt else await latest_show_key_async(artist_name)
+                with agent_task(spotify_client, task, result_key) as events:
+                    async for event in iterate_in_threadpool(events):
+                        if event["type"] == "complete":
+                            span.set_attribute("llm.output", json.dumps(event["data"], default=str))
+                        yield f"data: {json.dumps(event, default=str)}\n\n"
+
         except Exception as e:
             yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
     
     return StreamingResponse(
-        generate_progress(),
+        _tracked_stream("agent", generate_progress()),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -207,3 +376,90 @@ def get_setlist_stream(artistName: str, spotify_client=Depends(get_spotify_clien
             "Access-Control-Allow-Credentials": "true"
         }
     )
+
+
+class JobRequest(BaseModel):
+    kind: Literal["agent", "playlist"] = "agent"
+    artist_name: str
+    prompt: str | None = None
+    songs: list[str] | None = None
+    event_date: str | None = None
+    venue_name: str | None = None
+    count: int | None = None
+    mode: Literal["latest", "predicted"] = "latest"
+    # Bounded, so no client can jump ahead of every other user's jobs.
+    priority: int = Field(default=0, ge=0, le=10)
+
+def _job_payload(body: JobRequest) -> dict:
+    if body.kind == "agent":
+        return {"artist_name": body.artist_name, "prompt": body.prompt}
+    return body.model_dump(include={"artist_name", "songs", "event_date", "venue_name", "count", "mode"})
+
+def _public_job(job: dict) -> dict:
+    return {key: job[key] for key in ("id", "kind", "priority", "status", "result", "error", "created_at", "started_at", "finished_at")}
+
+def _owned_job(request: Request, job_id: str) -> dict:
+    job = get_job_queue().store.get(job_id)
+    if job is None or job["owner"] != request.cookies.get("session"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/api/jobs", status_code=202)
+def submit_job(request: Request, body: JobRequest):
+    """
+    Queue a playlist generation (`kind="agent"` or the direct `"playlist"`
+    pipeline) to run in the background. Higher `priority` runs first.
+    Follow it with `GET /api/jobs/{id}` or `GET /api/jobs/{id}/events`.
+    """
+    session_id = request.cookies.get("session")
+    if get_session_manager().peek(session_id) is None:
+        raise _unauthorized()
+    try:
+        job_id = get_job_queue().submit(body.kind, _job_payload(body), owner=session_id, priority=body.priority)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/api/jobs/{job_id}")
+def get_job(request: Request, job_id: str):
+    """Status, result and the latest progress event of a job."""
+    job = _owned_job(request, job_id)
+    events = get_job_queue().store.events(job_id)
+    return {**_public_job(job), "progress": events[-1][1] if events else None}
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job(request: Request, job_id: str):
+    """
+    Stream a job's progress events over SSE, from the start or after the
+    `Last-Event-ID` the client reconnects with, until it finishes.
+    """
+    await run_in_threadpool(_owned_job, request, job_id)
+    store = get_job_queue().store
+    try:
+        last_seq = max(0, int(request.headers.get("last-event-id") or 0))
+    except ValueError:
+        last_seq = 0
+
+    async def generate_events():
+        nonlocal last_seq
+        while True:
+            job = await run_in_threadpool(store.get, job_id)
+            # A job purged mid-stream has nothing more to send.
+            finished = job is None or job["status"] in FINISHED
+            for seq, event in await run_in_threadpool(store.events, job_id, last_seq):
+                last_seq = seq
+                yield f"id: {seq}\ndata: {json.dumps(event, default=str)}\n\n"
+            if finished:
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    return StreamingResponse(
+        _tracked_stream("job_events", generate_events()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Process metrics in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,349 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+from .config import DATA_DIR, SETLIST_STORE, SETLIST_STORE_MAX_AGE, SETLIST_STORE_SEARCH_MAX_AGE
+from .metrics import REGISTRY
+from .normalize import normalize_key
+
+SETLIST_STORE_READS = REGISTRY.counter(
+    "setlistify_setlist_store_reads_total", "Local setlist.fm dataset lookups by outcome.", ("kind", "result")
+)
+
+
+def _search_key(artist_name: str) -> str:
+    return " ".join(artist_name.casefold().split())
+
+
+def _iso_date(event_date: str | None) -> str | None:
+    try:
+        return datetime.strptime(event_date or "", "%d-%m-%Y").date().isoformat()
+    except ValueError:
+        return None
+
+
+def _songs(show: dict) -> list[str]:
+    return [
+        song["name"]
+        for set_block in show.get("sets", {}).get("set", [])
+        for song in set_block.get("song", [])
+        if song.get("name")
+    ]
+
+
+class SetlistStore:
+    """
+    A local copy of the setlist.fm data we have seen: bulk-ingested exports
+    and every page the tools fetched. Shows are indexed by artist and date,
+    venue and song, so "latest N shows for an mbid" is one index range scan.
+
+    An artist counts as synced when their newest page (page 1) was ingested;
+    reads within `max_age` of that are served locally. Stored artist searches
+    are reused for `search_max_age`.
+    """
+
+    def __init__(self, path: str | Path, max_age: float = SETLIST_STORE_MAX_AGE,
+                 search_max_age: float = SETLIST_STORE_SEARCH_MAX_AGE, clock=time.time):
+        self.max_age = max_age
+        self.search_max_age = search_max_age
+        self._clock = clock
+        self._lock = threading.Lock()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS artists (
+                mbid TEXT PRIMARY KEY,
+                name TEXT,
+                name_key TEXT,
+                disambiguation TEXT NOT NULL DEFAULT '',
+                synced_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS artists_name ON artists (name_key);
+            CREATE TABLE IF NOT EXISTS artist_searches (
+                query TEXT PRIMARY KEY,
+                mbids TEXT NOT NULL,
+                searched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS shows (
+                id TEXT PRIMARY KEY,
+                mbid TEXT NOT NULL,
+                event_date TEXT,
+                venue TEXT,
+                venue_key TEXT,
+                city TEXT,
+                country TEXT,
+                url TEXT,
+                last_updated TEXT
+            );
+            CREATE INDEX IF NOT EXISTS shows_artist_date ON shows (mbid, event_date DESC);
+            CREATE INDEX IF NOT EXISTS shows_venue ON shows (venue_key, event_date DESC);
+            CREATE TABLE IF NOT EXISTS songs (
+                show_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                name_key TEXT NOT NULL,
+                PRIMARY KEY (show_id, position)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS songs_name ON songs (name_key);
+            """
+        )
+
+    # ---- Ingest --------------------------------
+
+    def _upsert_artist(self, artist: dict, synced_at: float | None = None) -> None:
+        # Caller holds self._lock.
+        self._conn.execute(
+            """
+            INSERT INTO artists (mbid, name, name_key, disambiguation, synced_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (mbid) DO UPDATE SET
+                name = COALESCE(excluded.name, name),
+                name_key = COALESCE(excluded.name_key, name_key),
+                disambiguation = CASE WHEN excluded.disambiguation != '' THEN excluded.disambiguation ELSE disambiguation END,
+                synced_at = COALESCE(excluded.synced_at, synced_at)
+            """,
+            (
+                artist["mbid"],
+                artist.get("name"),
+                normalize_key(artist["name"]) if artist.get("name") else None,
+                artist.get("disambiguation") or "",
+                synced_at,
+            ),
+        )
+
+    def _upsert_show(self, show: dict, mbid: str) -> bool:
+        # Caller holds self._lock. Returns whether the show was new or changed.
+        row = self._conn.execute("SELECT last_updated FROM shows WHERE id = ?", (show["id"],)).fetchone()
+        if row is not None and row[0] is not None and row[0] == show.get("lastUpdated"):
+            return False
+        venue = show.get("venue", {})
+        city = venue.get("city", {})
+        self._conn.execute(
+            "INSERT OR REPLACE INTO shows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                show["id"],
+                mbid,
+                _iso_date(show.get("eventDate")),
+                venue.get("name"),
+                normalize_key(venue["name"]) if venue.get("name") else None,
+                city.get("name"),
+                city.get("country", {}).get("name"),
+                show.get("url"),
+                show.get("lastUpdated"),
+            ),
+        )
+        self._conn.execute("DELETE FROM songs WHERE show_id = ?", (show["id"],))
+        self._conn.executemany(
+            "INSERT INTO songs (show_id, position, name, name_key) VALUES (?, ?, ?, ?)",
+            [(show["id"], position, name, normalize_key(name)) for position, name in enumerate(_songs(show))],
+        )
+        return True
+
+    def ingest_page(self, data: dict, synced: bool = False) -> int:
+        """
+        Store the shows on a setlist.fm setlists page (`/artist/{mbid}/setlists`
+        or `/search/setlists`) and return how many were new or changed. With
+        `synced`, page 1 of one artist's setlists marks them as synced now.
+        """
+        shows = [show for show in data.get("setlist", []) if show.get("id") and show.get("artist", {}).get("mbid")]
+        artists = {show["artist"]["mbid"]: show["artist"] for show in shows}
+        synced_at = self._clock() if synced and data.get("page", 1) == 1 and len(artists) == 1 else None
+        changed = 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for show in shows:
+                    changed += self._upsert_show(show, show["artist"]["mbid"])
+                for artist in artists.values():
+                    self._upsert_artist(artist, synced_at=synced_at)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return changed
+
+    def ingest_artist_search(self, artist_name: str, artists: list) -> None:
+        """Store the artists a `/search/artists` call returned for `artist_name`, in relevance order."""
+        artists = [artist for artist in artists if artist.get("mbid")]
+        with self._lock:
+            for artist in artists:
+                self._upsert_artist(artist)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artist_searches (query, mbids, searched_at) VALUES (?, ?, ?)",
+                (_search_key(artist_name), json.dumps([artist["mbid"] for artist in artists]), self._clock()),
+            )
+
+    def ingest_file(self, path: str | Path, synced: bool = False) -> int:
+        """
+        Bulk-ingest an export: a JSON file holding one setlists page, a list of
+        pages or a list of shows, or a JSON Lines file with one page or show
+        per line. Returns the number of new or changed shows. Pass `synced` if
+        the export is known to hold each artist's newest shows.
+        """
+        text = Path(path).read_text()
+        try:
+            items = json.loads(text)
+        except json.JSONDecodeError:
+            items = [json.loads(line) for line in text.splitlines() if line.strip()]
+        if isinstance(items, dict):
+            items = [items]
+        pages = [item for item in items if "setlist" in item]
+        shows = [item for item in items if "setlist" not in item and "id" in item]
+        if shows:
+            pages.append({"setlist": shows, "page": 0})
+        return sum(self.ingest_page(page, synced=synced) for page in pages)
+
+    # ---- Queries --------------------------------
+
+    def search_artists(self, artist_name: str) -> list | None:
+        """
+        The artists for `artist_name`, as `search_artist` returns them: the
+        stored result of the same search made within `search_max_age`. None if
+        there is none, so the caller asks setlist.fm (many artists share a name).
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mbids FROM artist_searches WHERE query = ? AND searched_at >= ?",
+                (_search_key(artist_name), self._clock() - self.search_max_age),
+            ).fetchone()
+            artists = None
+            if row is not None:
+                mbids = json.loads(row[0])
+                found = {
+                    artist[0]: artist
+                    for artist in self._conn.execute(
+                        f"SELECT mbid, name, disambiguation FROM artists WHERE mbid IN ({','.join('?' * len(mbids))})",
+                        mbids,
+                    )
+                }
+                artists = [found[mbid] for mbid in mbids if mbid in found]
+        SETLIST_STORE_READS.labels("artists", "miss" if artists is None else "hit").inc()
+        if artists is None:
+            return None
+        return [{"name": name, "mbid": mbid, "disambiguation": disambiguation} for mbid, name, disambiguation in artists]
+
+    def is_synced(self, mbid: str) -> bool:
+        """Whether the artist's newest shows were stored within `max_age`."""
+        with self._lock:
+            row = self._conn.execute("SELECT synced_at FROM artists WHERE mbid = ?", (mbid,)).fetchone()
+        return row is not None and row[0] is not None and self._clock() - row[0] < self.max_age
+
+    def find_shows(self, mbid: str | None = None, venue: str | None = None, song: str | None = None,
+                   since: str | None = None, limit: int = 20) -> list:
+        """
+        Shows newest first, in the form `get_latest_show` returns them,
+        filtered by artist, venue name, a song played, and/or an ISO date
+        (`since`, inclusive).
+        """
+        where, params = [], []
+        if mbid:
+            where.append("shows.mbid = ?")
+            params.append(mbid)
+        if venue:
+            where.append("shows.venue_key = ?")
+            params.append(normalize_key(venue))
+        if song:
+            where.append("shows.id IN (SELECT show_id FROM songs WHERE name_key = ?)")
+            params.append(normalize_key(song))
+        if since:
+            where.append("shows.event_date >= ?")
+            params.append(since)
+        query = (
+            "SELECT shows.id, artists.name, shows.event_date, shows.venue, shows.city, shows.country, shows.url "
+            "FROM shows LEFT JOIN artists ON artists.mbid = shows.mbid"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + " ORDER BY shows.event_date DESC, shows.id LIMIT ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(query, (*params, limit)).fetchall()
+            setlists: dict[str, list] = {row[0]: [] for row in rows}
+            if rows:
+                for show_id, name in self._conn.execute(
+                    f"SELECT show_id, name FROM songs WHERE show_id IN ({','.join('?' * len(rows))}) "
+                    "ORDER BY show_id, position",
+                    list(setlists),
+                ):
+                    setlists[show_id].append(name)
+        return [
+            {
+                "artist": artist,
+                "event_date": datetime.fromisoformat(event_date).strftime("%d-%m-%Y") if event_date else None,
+                "venue": venue,
+                "city": city,
+                "country": country,
+                "url": url,
+                "setlist": setlists[show_id],
+            }
+            for show_id, artist, event_date, venue, city, country, url in rows
+        ]
+
+    def latest_shows(self, mbid: str, count: int = 1) -> list | None:
+        """The artist's latest `count` shows, or None unless they were synced within `max_age`."""
+        shows = self.find_shows(mbid=mbid, limit=count) if self.is_synced(mbid) else None
+        SETLIST_STORE_READS.labels("shows", "hit" if shows else "miss").inc()
+        return shows or None
+
+    def latest_show_id(self, mbid: str) -> str | None:
+        """The id of the show `latest_shows` would list first, or None unless the artist was synced within `max_age`."""
+        if not self.is_synced(mbid):
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM shows WHERE mbid = ? ORDER BY event_date DESC, id LIMIT 1", (mbid,)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("artists", "shows", "songs")
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+@lru_cache(maxsize=1)
+def get_setlist_store() -> SetlistStore | None:
+    """The local dataset in `DATA_DIR/setlists.sqlite3`, or None if `SETLIST_STORE` is off."""
+    return SetlistStore(Path(DATA_DIR) / "setlists.sqlite3") if SETLIST_STORE else None
+
+
+def main(argv: list[str] | None = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the local setlist.fm dataset.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="Bulk-ingest exported setlist.fm JSON or JSON Lines files.")
+    ingest.add_argument("files", nargs="+")
+    ingest.add_argument("--current", action="store_true",
+                        help="The files hold each artist's newest shows, so serve them locally from now on.")
+    sync = commands.add_parser("sync", help="Fetch artists' newest setlists until nothing new turns up.")
+    sync.add_argument("artists", nargs="+", help="Artist names or MusicBrainz ids")
+    sync.add_argument("--max-pages", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    store = get_setlist_store() or SetlistStore(Path(DATA_DIR) / "setlists.sqlite3")
+    if args.command == "ingest":
+        for path in args.files:
+            changed = store.ingest_file(path, synced=args.current)
+            print(f"{path}: {changed} new or changed shows")
+    else:
+        from .tools.setlist_tools import sync_artist
+
+        for artist in args.artists:
+            print(f"{artist}: {sync_artist(artist, max_pages=args.max_pages, store=store)}")
+    print(store.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import weakref
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the
+    function and everyone who arrives while it is in flight waits for, and
+    receives, the same result or exception. Nothing is remembered once the call
+    finishes; caching is left to the caller.
+
+    `do` is for threads and `ado` for coroutines. Async calls are coalesced per
+    event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, Future] = {}
+        self._tasks: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Task]] = weakref.WeakKeyDictionary()
+        self.coalesced = 0
+
+    def do(self, key: str, fn):
+        """Return `fn()`, sharing one call among concurrent callers with the same `key`."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def ado(self, key: str, fn):
+        """Async `do`, where `fn` is a coroutine function."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            tasks = self._tasks.setdefault(loop, {})
+            task = tasks.get(key)
+            if task is None:
+                task = tasks[key] = loop.create_task(fn())
+                task.add_done_callback(lambda done: self._finish(tasks, key, done))
+            else:
+                self.coalesced += 1
+        # Shielded so a cancelled caller doesn't cancel the call for the others.
+        return await asyncio.shield(task)
+
+    def _finish(self, tasks: dict, key: str, task: asyncio.Task) -> None:
+        with self._lock:
+            if tasks.get(key) is task:
+                del tasks[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every waiter was cancelled.
+            task.exception()
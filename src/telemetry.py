@@ -0,0 +1,62 @@
+import base64
+import logging
+import threading
+
+from opentelemetry import trace
+
+from .config import LANGFUSE_PUBLIC_KEY, LANGFUSE_SECRET_KEY
+
+logger = logging.getLogger(__name__)
+
+_provider = None
+_lock = threading.Lock()
+
+
+def telemetry_enabled() -> bool:
+    return bool(LANGFUSE_PUBLIC_KEY and LANGFUSE_SECRET_KEY)
+
+
+def init_telemetry():
+    """
+    Configure OpenTelemetry to send traces to LangFuse and instrument
+    smolagents. Does nothing (and returns None) when the LangFuse keys are not
+    set; spans are then no-ops. Safe to call more than once.
+    """
+    global _provider
+    if not telemetry_enabled():
+        return None
+    with _lock:
+        if _provider is not None:
+            return _provider
+
+        # The exporter and instrumentation are slow to import, so only pay for them when tracing is on.
+        from openinference.instrumentation.smolagents import SmolagentsInstrumentor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        provider = TracerProvider()
+        # Base64 encode credentials
+        credentials = f"{LANGFUSE_PUBLIC_KEY}:{LANGFUSE_SECRET_KEY}"
+        encoded_credentials = base64.b64encode(credentials.encode()).decode()
+        otlp_exporter = OTLPSpanExporter(headers={"Authorization": f"Basic {encoded_credentials}"})
+        provider.add_span_processor(BatchSpanProcessor(otlp_exporter))
+
+        # Set the global tracer provider
+        trace.set_tracer_provider(provider)
+
+        # Instrument smolagents
+        SmolagentsInstrumentor().instrument(tracer_provider=provider)
+        _provider = provider
+        return provider
+
+
+def shutdown_telemetry() -> None:
+    """Flush and shut down the tracer provider, if telemetry was started."""
+    global _provider
+    with _lock:
+        provider, _provider = _provider, None
+    if provider is not None:
+        logger.info("Flushing and shutting down the tracer provider")
+        provider.force_flush()
+        provider.shutdown()
@@ -1,11 +1,312 @@
+import logging
+import re
+import sqlite3
+from contextlib import nullcontext
+
 from smolagents import tool
 
-import os
 import requests
-import time
 
-SETLISTFM_API_KEY = os.getenv("SETLISTFM_API_KEY")
-SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
+from ..cache import get_cache
+from ..clients.setlistfm import get_async_client, get_client
+from ..handles import UnknownHandle, compact, compacting, resolve
+from ..metrics import timed, timed_tool
+from ..prefetch import get_prefetcher
+from ..prediction import parse_event_date, predicted_setlist, rank_songs
+from ..setlist_store import get_setlist_store
+from ..config import (
+    PREDICTION_HALF_LIFE_DAYS,
+    PREDICTION_MAX_PAGES,
+    PREDICTION_SHOWS,
+    PREDICTION_WINDOW_DAYS,
+    SETLISTFM_ARTIST_STALE_TTL,
+    SETLISTFM_ARTIST_TTL,
+    SETLISTFM_CACHE_MAX_ENTRIES,
+    SETLISTFM_SETLIST_STALE_TTL,
+    SETLISTFM_SETLIST_TTL,
+)
+
+logger = logging.getLogger(__name__)
+
+_MBID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.IGNORECASE)
+
+
+def _cache():
+    return get_cache("setlistfm", max_entries=SETLISTFM_CACHE_MAX_ENTRIES)
+
+
+def is_mbid(value: str) -> bool:
+    """Whether `value` is a MusicBrainz id rather than an artist name."""
+    return bool(_MBID.match(value.strip()))
+
+
+def _artist_key(artist_name: str) -> str:
+    return f"artist:{' '.join(artist_name.casefold().split())}"
+
+
+def _search_params(artist_name: str) -> dict:
+    return {"artistName": artist_name, "p": 1, "sort": "relevance"}
+
+
+def _parse_artists(data: dict) -> list:
+    return [
+        {
+            "name": artist.get("name"),
+            "mbid": artist.get("mbid"),
+            "disambiguation": artist.get("disambiguation", ""),
+        }
+        for artist in data.get("artist", [])
+    ]
+
+
+def _parse_show(artist: dict, show: dict) -> dict:
+    return {
+        "artist": artist.get("name") or show.get("artist", {}).get("name"),
+        "event_date": show.get("eventDate"),
+        "venue": show.get("venue", {}).get("name"),
+        "city": show.get("venue", {}).get("city", {}).get("name"),
+        "country": show.get("venue", {}).get("city", {}).get("country", {}).get("name"),
+        "url": show.get("url"),
+        # Collect all song names from all sets (main set, encores, etc), skipping None values
+        "setlist": [
+            song.get("name")
+            for set_block in show.get("sets", {}).get("set", [])
+            for song in set_block.get("song", [])
+            if song.get("name")
+        ],
+    }
+
+
+def _summarize_shows(shows: list) -> dict:
+    return {
+        "shows": [
+            {
+                "artist": show["artist"],
+                "event_date": show["event_date"],
+                "venue": show["venue"],
+                "city": show["city"],
+                "songs": len(show["setlist"]),
+            }
+            for show in shows
+        ]
+    }
+
+
+def _summarize_songs(songs: list) -> dict:
+    return {"song_count": len(songs), "first_songs": songs[:5]}
+
+
+def _summarize_prediction(prediction: dict) -> dict:
+    summary = {key: prediction[key] for key in ("artist", "shows_used", "first_date", "last_date")}
+    return {**summary, **_summarize_songs(prediction["songs"])}
+
+
+# ---- Local dataset (src/setlist_store.py) --------------------------------
+# Every page and artist search fetched from setlist.fm is also stored locally,
+# and the tools read the store before the cache and the network.
+
+
+def _stored_artists(artist_name: str) -> list | None:
+    store = get_setlist_store()
+    try:
+        return store.search_artists(artist_name) if store is not None else None
+    except sqlite3.Error as e:
+        logger.warning("Local artist lookup for %s failed: %s", artist_name, e)
+        return None
+
+
+def _stored_shows(artist: dict, count: int) -> list | None:
+    store = get_setlist_store()
+    try:
+        return store.latest_shows(artist["mbid"], count) if store is not None else None
+    except sqlite3.Error as e:
+        logger.warning("Local show lookup for %s failed: %s", artist["mbid"], e)
+        return None
+
+
+def _stored_show_id(mbid: str) -> str | None:
+    store = get_setlist_store()
+    try:
+        return store.latest_show_id(mbid) if store is not None else None
+    except sqlite3.Error as e:
+        logger.warning("Local show lookup for %s failed: %s", mbid, e)
+        return None
+
+
+def _capture_artists(artist_name: str, artists: list) -> list:
+    store = get_setlist_store()
+    if store is not None:
+        try:
+            store.ingest_artist_search(artist_name, artists)
+        except sqlite3.Error as e:
+            logger.warning("Storing the artist search for %s failed: %s", artist_name, e)
+    return artists
+
+
+def _capture_page(data: dict) -> dict:
+    store = get_setlist_store()
+    if store is not None:
+        try:
+            store.ingest_page(data, synced=True)
+        except sqlite3.Error as e:
+            logger.warning("Storing a setlists page failed: %s", e)
+    return data
+
+
+# ---- Prefetching (src/prefetch.py) ---------------------------------------
+# Interactive lookups count towards an artist's popularity, and background
+# refreshes wait while any of them is running.
+
+
+def _interactive():
+    prefetcher = get_prefetcher()
+    return prefetcher.interactive() if prefetcher is not None else nullcontext()
+
+
+def _record_lookup(artist: dict) -> None:
+    prefetcher = get_prefetcher()
+    if prefetcher is not None:
+        prefetcher.record(artist)
+
+
+def _fetch_artists(artist_name: str) -> list:
+    return _capture_artists(
+        artist_name, _parse_artists(get_client().get("/search/artists", params=_search_params(artist_name)))
+    )
+
+
+def _fetch_setlists_page(mbid: str, page: int) -> dict:
+    return _capture_page(get_client().get(f"/artist/{mbid}/setlists", params={"p": page}))
+
+
+def fetch_setlists_page(mbid: str, page: int = 1) -> dict:
+    """Return the raw `/artist/{mbid}/setlists` page, served from the on-disk cache when possible."""
+    return _cache().get_or_fetch(
+        f"setlists:{mbid}:{page}",
+        lambda: _fetch_setlists_page(mbid, page),
+        ttl=SETLISTFM_SETLIST_TTL,
+        stale_ttl=SETLISTFM_SETLIST_STALE_TTL,
+    )
+
+
+def refresh_setlists_page(mbid: str, page: int = 1) -> dict:
+    """Fetch the `/artist/{mbid}/setlists` page from the API and replace the cached copy with it."""
+    data = _fetch_setlists_page(mbid, page)
+    _cache().set(f"setlists:{mbid}:{page}", data, ttl=SETLISTFM_SETLIST_TTL, stale_ttl=SETLISTFM_SETLIST_STALE_TTL)
+    return data
+
+
+def _first_show_id(data: dict) -> str | None:
+    shows = data.get("setlist") or []
+    return shows[0].get("id") if shows else None
+
+
+def latest_show_id(mbid: str) -> str | None:
+    """
+    The id of the artist's latest show, read from the same source as
+    `get_latest_show`: the local dataset while the artist is synced, else the
+    (cached) first setlists page.
+    """
+    return _stored_show_id(mbid) or _first_show_id(fetch_setlists_page(mbid, page=1))
+
+
+def _has_more_pages(data: dict, page: int) -> bool:
+    return bool(data.get("setlist")) and page * data.get("itemsPerPage", 20) < data.get("total", 0)
+
+
+def sync_artist(artist_name: str, max_pages: int = PREDICTION_MAX_PAGES, store=None) -> int:
+    """
+    Bring the local dataset up to date for an artist (a name or an mbid):
+    fetch their setlist pages from the API, newest first, until a page holds
+    nothing new or changed. Returns the number of new or changed shows.
+    """
+    store = store or get_setlist_store()
+    if store is None:
+        raise RuntimeError("The local setlist store is disabled (SETLIST_STORE=0).")
+    if is_mbid(artist_name):
+        mbid = artist_name.strip()
+    else:
+        artists = search_artist(artist_name)
+        if not artists or "error" in artists[0]:
+            raise ValueError(f"No artist found matching '{artist_name}'.")
+        mbid = artists[0]["mbid"]
+
+    changed = 0
+    for page in range(1, max_pages + 1):
+        data = get_client().get(f"/artist/{mbid}/setlists", params={"p": page})
+        _cache().set(f"setlists:{mbid}:{page}", data, ttl=SETLISTFM_SETLIST_TTL, stale_ttl=SETLISTFM_SETLIST_STALE_TTL)
+        new = store.ingest_page(data, synced=True)
+        changed += new
+        if not new or not _has_more_pages(data, page):
+            break
+    logger.info("Synced %s: %d new or changed shows", artist_name, changed)
+    return changed
+
+
+def iter_setlist_pages(mbid: str, max_pages: int = PREDICTION_MAX_PAGES):
+    """Yield the artist's setlist pages, newest first, fetching each only when it is needed."""
+    for page in range(1, max_pages + 1):
+        data = fetch_setlists_page(mbid, page=page)
+        yield data
+        if not _has_more_pages(data, page):
+            return
+
+
+class _RecentShows:
+    """
+    Collects up to `count` played shows within `window_days` of the newest one.
+    Shows without songs (upcoming or not yet reported) are skipped.
+    """
+
+    def __init__(self, artist: dict, count: int, window_days: int):
+        self.artist = artist
+        self.count = count
+        self.window_days = window_days
+        self.shows: list = []
+        self._newest = None
+
+    def add(self, raw_show: dict) -> bool:
+        """Add a show from a setlist page; returns False once no more are needed."""
+        show = _parse_show(self.artist, raw_show)
+        played_on = parse_event_date(show["event_date"])
+        if not show["setlist"] or played_on is None:
+            return True
+        if self._newest is None:
+            self._newest = played_on
+        elif (self._newest - played_on).days > self.window_days:
+            return False
+        self.shows.append(show)
+        return len(self.shows) < self.count
+
+    def prediction(self) -> dict:
+        if not self.shows:
+            name = self.artist.get("name") or self.artist.get("mbid")
+            return {"error": f"No recent setlists found for artist '{name}'."}
+        ranking = rank_songs(self.shows, half_life_days=PREDICTION_HALF_LIFE_DAYS)
+        return {
+            "artist": self.shows[0]["artist"],
+            "shows_used": len(self.shows),
+            "first_date": self.shows[-1]["event_date"],
+            "last_date": self.shows[0]["event_date"],
+            "songs": predicted_setlist(self.shows, ranking),
+            "ranking": ranking,
+            "shows": [
+                {key: show[key] for key in ("event_date", "venue", "city", "country", "url")}
+                for show in self.shows
+            ],
+        }
+
+
+def _prediction_key(mbid: str, count: int, window_days: int) -> str:
+    return f"prediction:{mbid}:{count}:{window_days}"
+
+
+def _predict(artist: dict, count: int, window_days: int) -> dict:
+    recent = _RecentShows(artist, count, window_days)
+    for data in iter_setlist_pages(artist["mbid"]):
+        if not all(recent.add(show) for show in data.get("setlist", [])):
+            break
+    return recent.prediction()
 
 
 @tool
@@ -19,50 +320,30 @@ def search_artist(artist_name: str) -> list:
     Returns:
         list: A list of artist dictionaries, each containing name, mbid, and disambiguation.
     """
-    print("--- Initiating new artist search ---")
-    print(f"Searching for artist: {artist_name}")
-    print(f"Using API Key: {SETLISTFM_API_KEY[:4]}...****")
-
-    search_url = f"https://api.setlist.fm/rest/1.0/search/artists?artistName={artist_name}&p=1&sort=relevance"
-    print(f"Requesting URL: {search_url}")
-    headers = {
-        "x-api-key": SETLISTFM_API_KEY,
-        "Accept": "application/json",
-    }
-    print(f"With headers: {headers}")
+    logger.debug("Searching for artist %s", artist_name)
+    stored = _stored_artists(artist_name)
+    if stored is not None:
+        return stored
 
     try:
-        time.sleep(0.6)  # Respect rate limits
-        print("Sending request to Setlist.fm API...")
-        resp = requests.get(search_url, headers=headers)
-        print(f"Received response with status code: {resp.status_code}")
-        resp.raise_for_status()  # This will raise an exception for 4xx or 5xx status codes
-
-        print("Request successful, parsing JSON response...")
-        results = resp.json().get("artist", [])
-        print(f"Found {len(results)} artists.")
-
-        artists = [
-            {
-                "name": artist.get("name"),
-                "mbid": artist.get("mbid"),
-                "disambiguation": artist.get("disambiguation", ""),
-            }
-            for artist in results
-        ]
-        print("Successfully processed artists.")
+        artists = _cache().get_or_fetch(
+            _artist_key(artist_name),
+            lambda: _fetch_artists(artist_name),
+            ttl=SETLISTFM_ARTIST_TTL,
+            stale_ttl=SETLISTFM_ARTIST_STALE_TTL,
+        )
+        logger.debug("Found %d artists for %s", len(artists), artist_name)
         return artists
     except requests.exceptions.HTTPError as http_err:
-        print(f"!!! HTTP error occurred: {http_err}") 
-        print(f"Response content: {resp.text}")
+        logger.warning("Artist search for %s failed: %s", artist_name, http_err)
         return []
-    except Exception as err:
-        print(f"!!! Other error occurred: {err}") 
+    except Exception:
+        logger.exception("Artist search for %s failed", artist_name)
         return []
 
 
 @tool
-def get_latest_show(artist_name: str, count: int = 1) -> list:
+def get_latest_show(artist_name: str, count: int = 1) -> list | dict:
     """
     Fetches the latest `count` shows for the given artist name using setlist.fm API.
 
@@ -71,76 +352,207 @@ def get_latest_show(artist_name: str, count: int = 1) -> list:
         count (int, optional): How many of the latest shows to retrieve. Defaults to 1.
 
     Returns:
-        list: A list of dicts, each containing show info, including the setlist.
+        list | dict: A list of dicts, each containing show info, including the setlist. During an agent run,
+        a dict with a `handle` for that list (pass it to `extract_setlist`) and a summary of each show.
     """
-    # Step 1: Find artist MBID
-    artists = search_artist(artist_name)
-    if not artists or "error" in artists[0]:
-        return artists  # Return error from search_artist
-    artist = artists[0]
-    mbid = artist["mbid"]
-    
-    # Step 2: Get latest shows
-    shows_url = f"https://api.setlist.fm/rest/1.0/artist/{mbid}/setlists?p=1"
-    resp = None
-    headers = {
-        "x-api-key": SETLISTFM_API_KEY,
-        "Accept": "application/json",
-    }
-    for attempt in range(3):
+    with _interactive():
+        # Step 1: Find artist MBID
+        artists = search_artist(artist_name)
+        if not artists or "error" in artists[0]:
+            return artists  # Return error from search_artist
+        artist = artists[0]
+        mbid = artist["mbid"]
+        _record_lookup(artist)
+
+        # Step 2: Get latest shows, from the local dataset if the artist was synced recently
+        stored = _stored_shows(artist, count)
+        if stored is not None:
+            return compact("shows", stored, _summarize_shows)
         try:
-            time.sleep(0.6)  # Keep original sleep to respect rate limits
-            resp = requests.get(shows_url, headers=headers)
-            resp.raise_for_status()
-            break  # Break the loop if the request is successful
-        except requests.exceptions.RequestException as e:
-            print(f"Attempt {attempt + 1} failed for show search: {e}")
-            if attempt < 2:
-                time.sleep(1)  # Wait for 1 second before retrying
-            else:
-                return [{"error": f"Failed to fetch shows after 3 attempts: {e}"}]
-    if resp is None: # Should not happen, but as a safeguard
-        return [{"error": "Failed to get a response from show search."}]
-    shows = resp.json().get("setlist", [])
-    # print("Raw shows JSON:", shows)
+            data = fetch_setlists_page(mbid, page=1)
+        except Exception as e:
+            logger.warning("Show search for %s failed: %s", artist_name, e)
+            return [{"error": f"Failed to fetch shows: {e}"}]
+    shows = data.get("setlist", [])
     if not shows:
         return [{"error": f"No shows found for artist '{artist_name}'."}]
     # Limit to the requested count
-    shows = shows[:count]
-    result = []
-    for show in shows:
-        info = {
-            "artist": artist.get("name"),
-            "event_date": show.get("eventDate"),
-            "venue": show.get("venue", {}).get("name"),
-            "city": show.get("venue", {}).get("city", {}).get("name"),
-            "country": show.get("venue", {}).get("city", {}).get("country", {}).get("name"),
-            "url": show.get("url"),
-            # Collect all song names from all sets (main set, encores, etc), skipping None values
-            "setlist": [
-                song.get("name")
-                for set_block in show.get("sets", {}).get("set", [])
-                for song in set_block.get("song", [])
-                if song.get("name")
-            ],
-        }
-        result.append(info)
-    return result
+    return compact("shows", [_parse_show(artist, show) for show in shows[:count]], _summarize_shows)
 
 
 @tool
-def extract_setlist(shows: list) -> list:
+def extract_setlist(shows: list | str) -> list | dict:
     """
     Extracts a de-duplicated list of songs from a list of shows.
 
     Args:
-        shows (list): A list of show dicts, from `get_latest_show`.
+        shows (list | str): A list of show dicts from `get_latest_show`, or the `handle` it returned.
 
     Returns:
-        list: A de-duplicated list of all songs from all shows.
+        list | dict: A de-duplicated list of all songs from all shows. During an agent run, a dict with a
+        `handle` for that list (pass it as `songs` to the playlist tool), the song count and the first songs.
     """
+    try:
+        shows = resolve(shows, "shows")
+    except UnknownHandle as e:
+        return {"error": str(e)}
     all_songs = []
     for show in shows:
         all_songs.extend(show.get("setlist", []))
     # De-duplicate while preserving order
-    return list(dict.fromkeys(all_songs))
+    return compact("setlist", list(dict.fromkeys(all_songs)), _summarize_songs)
+
+
+@tool
+def predict_setlist(artist_name: str, count: int = PREDICTION_SHOWS, window_days: int = PREDICTION_WINDOW_DAYS) -> dict:
+    """
+    Predicts the setlist of an artist's next show from their recent shows.
+
+    Songs are ranked by how often and how recently they were played and where
+    they sit in the set.
+
+    Args:
+        artist_name (str): The name of the artist.
+        count (int, optional): How many recent shows to base the prediction on.
+        window_days (int, optional): Only use shows within this many days of the most recent one.
+
+    Returns:
+        dict: The predicted `songs` in set order, the per-song `ranking`, and the `shows` used. During an
+        agent run, a dict with a `handle` for the songs (pass it to the playlist tool), the dates and show count.
+    """
+    artists = search_artist(artist_name)
+    if not artists or "error" in artists[0]:
+        return {"error": f"No artist found matching '{artist_name}'."}
+    artist = artists[0]
+
+    try:
+        prediction = _cache().get_or_fetch(
+            _prediction_key(artist["mbid"], count, window_days),
+            lambda: _predict(artist, count, window_days),
+            ttl=SETLISTFM_SETLIST_TTL,
+            stale_ttl=SETLISTFM_SETLIST_STALE_TTL,
+        )
+    except Exception as e:
+        logger.warning("Setlist prediction for %s failed: %s", artist_name, e)
+        return {"error": f"Failed to fetch shows: {e}"}
+    if "error" in prediction or not compacting():
+        return prediction
+    return compact("setlist", prediction["songs"], lambda songs: _summarize_prediction(prediction))
+
+
+timed_tool(search_artist, get_latest_show, extract_setlist, predict_setlist)
+
+
+# --- Async variants ----------------------------------------------------------
+# Same behaviour and return values as the tools above, for the async request
+# path. They share the on-disk cache and the setlist.fm rate limiter.
+
+
+async def _fetch_artists_async(artist_name: str) -> list:
+    data = await get_async_client().get("/search/artists", params=_search_params(artist_name))
+    return _capture_artists(artist_name, _parse_artists(data))
+
+
+@timed("search_artist_async")
+async def search_artist_async(artist_name: str) -> list:
+    """Async `search_artist`."""
+    stored = _stored_artists(artist_name)
+    if stored is not None:
+        return stored
+    try:
+        return await _cache().aget_or_fetch(
+            _artist_key(artist_name),
+            lambda: _fetch_artists_async(artist_name),
+            ttl=SETLISTFM_ARTIST_TTL,
+            stale_ttl=SETLISTFM_ARTIST_STALE_TTL,
+        )
+    except Exception as err:
+        logger.warning("Artist search for %s failed: %s", artist_name, err)
+        return []
+
+
+async def _fetch_setlists_page_async(mbid: str, page: int) -> dict:
+    return _capture_page(await get_async_client().get(f"/artist/{mbid}/setlists", params={"p": page}))
+
+
+async def fetch_setlists_page_async(mbid: str, page: int = 1) -> dict:
+    """Async `fetch_setlists_page`."""
+    return await _cache().aget_or_fetch(
+        f"setlists:{mbid}:{page}",
+        lambda: _fetch_setlists_page_async(mbid, page),
+        ttl=SETLISTFM_SETLIST_TTL,
+        stale_ttl=SETLISTFM_SETLIST_STALE_TTL,
+    )
+
+
+@timed("get_latest_show_async")
+async def get_latest_show_async(artist_name: str, count: int = 1) -> list:
+    """Async `get_latest_show`."""
+    with _interactive():
+        artists = await search_artist_async(artist_name)
+        if not artists or "error" in artists[0]:
+            return artists
+        return await latest_shows_for_artist_async(artists[0], count=count)
+
+
+async def latest_shows_for_artist_async(artist: dict, count: int = 1) -> list:
+    """`get_latest_show_async` for an artist already looked up (a dict with `mbid` and, optionally, `name`)."""
+    _record_lookup(artist)
+    stored = _stored_shows(artist, count)
+    if stored is not None:
+        return stored
+    try:
+        with _interactive():
+            data = await fetch_setlists_page_async(artist["mbid"], page=1)
+    except Exception as e:
+        logger.warning("Show search for %s failed: %s", artist.get("name", artist["mbid"]), e)
+        return [{"error": f"Failed to fetch shows: {e}"}]
+    shows = data.get("setlist", [])
+    if not shows:
+        return [{"error": f"No shows found for artist '{artist.get('name') or artist['mbid']}'."}]
+    return [_parse_show(artist, show) for show in shows[:count]]
+
+
+async def latest_show_id_async(mbid: str) -> str | None:
+    """Async `latest_show_id`."""
+    return _stored_show_id(mbid) or _first_show_id(await fetch_setlists_page_async(mbid, page=1))
+
+
+async def aiter_setlist_pages(mbid: str, max_pages: int = PREDICTION_MAX_PAGES):
+    """Async `iter_setlist_pages`."""
+    for page in range(1, max_pages + 1):
+        data = await fetch_setlists_page_async(mbid, page=page)
+        yield data
+        if not _has_more_pages(data, page):
+            return
+
+
+async def _predict_async(artist: dict, count: int, window_days: int) -> dict:
+    recent = _RecentShows(artist, count, window_days)
+    async for data in aiter_setlist_pages(artist["mbid"]):
+        if not all(recent.add(show) for show in data.get("setlist", [])):
+            break
+    return recent.prediction()
+
+
+@timed("predict_setlist_async")
+async def predict_setlist_async(artist_name: str, count: int = PREDICTION_SHOWS, window_days: int = PREDICTION_WINDOW_DAYS) -> dict:
+    """Async `predict_setlist`."""
+    artists = await search_artist_async(artist_name)
+    if not artists or "error" in artists[0]:
+        return {"error": f"No artist found matching '{artist_name}'."}
+    return await predict_for_artist_async(artists[0], count=count, window_days=window_days)
+
+
+async def predict_for_artist_async(artist: dict, count: int = PREDICTION_SHOWS, window_days: int = PREDICTION_WINDOW_DAYS) -> dict:
+    """`predict_setlist_async` for an artist already looked up."""
+    try:
+        return await _cache().aget_or_fetch(
+            _prediction_key(artist["mbid"], count, window_days),
+            lambda: _predict_async(artist, count, window_days),
+            ttl=SETLISTFM_SETLIST_TTL,
+            stale_ttl=SETLISTFM_SETLIST_STALE_TTL,
+        )
+    except Exception as e:
+        logger.warning("Setlist prediction for %s failed: %s", artist.get("name", artist["mbid"]), e)
+        return {"error": f"Failed to fetch shows: {e}"}
@@ -0,0 +1,225 @@
+import asyncio
+import difflib
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+import spotipy
+
+from ..cache import get_cache
+from ..clients.spotify import call_with_backoff
+from ..config import (
+    SPOTIFY_CATALOG_INDEX_MAX_ENTRIES,
+    SPOTIFY_CATALOG_INDEX_TTL,
+    SPOTIFY_CATALOG_STALE_TTL,
+    SPOTIFY_CATALOG_TTL,
+)
+from ..normalize import normalize_key, normalize_title
+
+# `albums` accepts at most 20 ids per call.
+ALBUMS_BATCH_SIZE = 20
+# Prefix matches on very short titles ("One" -> "One More Time") are too loose.
+MIN_PREFIX_LENGTH = 8
+FUZZY_CUTOFF = 0.88
+
+
+class CatalogIndex:
+    """
+    An in-memory index of an artist's tracks keyed by normalised title.
+
+    `match` tries an exact title match, then a prefix match in either
+    direction, then a fuzzy match. Where several recordings share a title the
+    one without a version suffix ("(Live)", "- Remastered") wins.
+    """
+
+    def __init__(self, tracks: list[dict]):
+        self._by_title: dict[str, dict] = {}
+        for track in tracks:
+            title = normalize_title(track["name"])
+            if not title:
+                continue
+            existing = self._by_title.get(title)
+            if existing is None or (self._is_plain(track) and not self._is_plain(existing)):
+                self._by_title[title] = track
+        self._titles = sorted(self._by_title)
+
+    @staticmethod
+    def _is_plain(track: dict) -> bool:
+        return normalize_title(track["name"]) == normalize_key(track["name"])
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def match(self, song: str) -> dict | None:
+        key = normalize_title(song)
+        if not key:
+            return None
+        if key in self._by_title:
+            return self._by_title[key]
+
+        if len(key) >= MIN_PREFIX_LENGTH:
+            # Catalog titles that extend the setlist title, e.g. "Stairway to Heaven Pt 1".
+            i = bisect_left(self._titles, key + " ")
+            if i < len(self._titles) and self._titles[i].startswith(key + " "):
+                return self._by_title[self._titles[i]]
+            # Setlist titles that extend a catalog title, e.g. "Bohemian Rhapsody Intro".
+            for title in self._titles:
+                if len(title) >= MIN_PREFIX_LENGTH and key.startswith(title + " "):
+                    return self._by_title[title]
+
+        close = difflib.get_close_matches(key, self._titles, n=1, cutoff=FUZZY_CUTOFF)
+        return self._by_title[close[0]] if close else None
+
+
+class _IndexCache:
+    """Built `CatalogIndex`es by catalog cache key: a per-process LRU whose entries expire after `ttl`."""
+
+    def __init__(self, max_entries: int, ttl: float, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._data: OrderedDict[str, tuple[float, CatalogIndex]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> CatalogIndex | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self._clock():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, index: CatalogIndex) -> None:
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, index)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_indexes = _IndexCache(SPOTIFY_CATALOG_INDEX_MAX_ENTRIES, SPOTIFY_CATALOG_INDEX_TTL)
+
+
+def _pick_artist_id(artists: list[dict], artist_name: str) -> str | None:
+    # Only an exact name match: another artist's catalog would match the wrong recordings.
+    wanted = normalize_key(artist_name)
+    for artist in artists:
+        if normalize_key(artist["name"]) == wanted:
+            return artist["id"]
+    return None
+
+
+def _find_artist_id(spotify_client: spotipy.Spotify, artist_name: str) -> str | None:
+    results = call_with_backoff(spotify_client.search, q=f"artist:{artist_name}", type="artist", limit=5)
+    return _pick_artist_id(results["artists"]["items"], artist_name)
+
+
+def _fetch_catalog(spotify_client: spotipy.Spotify, artist_name: str) -> dict:
+    artist_id = _find_artist_id(spotify_client, artist_name)
+    if artist_id is None:
+        return {}
+
+    album_ids = []
+    page = call_with_backoff(spotify_client.artist_albums, artist_id, include_groups="album,single", limit=50)
+    while page:
+        album_ids.extend(album["id"] for album in page["items"])
+        page = call_with_backoff(spotify_client.next, page) if page.get("next") else None
+
+    tracks = []
+    for start in range(0, len(album_ids), ALBUMS_BATCH_SIZE):
+        albums = call_with_backoff(spotify_client.albums, album_ids[start:start + ALBUMS_BATCH_SIZE])["albums"]
+        for album in albums:
+            if not album:
+                continue
+            track_page = album["tracks"]
+            while track_page:
+                tracks.extend({"uri": t["uri"], "name": t["name"]} for t in track_page["items"] if t)
+                track_page = call_with_backoff(spotify_client.next, track_page) if track_page.get("next") else None
+
+    return {"artist_id": artist_id, "tracks": tracks}
+
+
+def _catalog_key(artist_name: str) -> str:
+    return f"catalog:{normalize_key(artist_name)}"
+
+
+def get_catalog_index(spotify_client: spotipy.Spotify, artist_name: str) -> CatalogIndex | None:
+    """
+    Return a `CatalogIndex` of the artist's albums and singles, or `None` if
+    the artist isn't on Spotify. Catalogs are cached per artist for all users,
+    and the indexes built from them are kept in memory.
+    """
+    key = _catalog_key(artist_name)
+    index = _indexes.get(key)
+    if index is not None:
+        return index
+    catalog = get_cache("spotify_catalogs").get_or_fetch(
+        key,
+        lambda: _fetch_catalog(spotify_client, artist_name),
+        ttl=SPOTIFY_CATALOG_TTL,
+        stale_ttl=SPOTIFY_CATALOG_STALE_TTL,
+        negative_ttl=SPOTIFY_CATALOG_TTL,
+    )
+    return _build_index(key, catalog)
+
+
+def _build_index(key: str, catalog: dict) -> CatalogIndex | None:
+    if not catalog:
+        return None
+    index = CatalogIndex(catalog["tracks"])
+    _indexes.set(key, index)
+    return index
+
+
+async def _fetch_catalog_async(spotify_client, artist_name: str) -> dict:
+    results = await spotify_client.search(q=f"artist:{artist_name}", type="artist", limit=5)
+    artist_id = _pick_artist_id(results["artists"]["items"], artist_name)
+    if artist_id is None:
+        return {}
+
+    album_ids = []
+    page = await spotify_client.artist_albums(artist_id, include_groups="album,single", limit=50)
+    while page:
+        album_ids.extend(album["id"] for album in page["items"])
+        page = await spotify_client.next(page)
+
+    batches = await asyncio.gather(*(
+        spotify_client.albums(album_ids[start:start + ALBUMS_BATCH_SIZE])
+        for start in range(0, len(album_ids), ALBUMS_BATCH_SIZE)
+    ))
+    tracks = []
+    for batch in batches:
+        for album in batch["albums"]:
+            if not album:
+                continue
+            track_page = album["tracks"]
+            while track_page:
+                tracks.extend({"uri": t["uri"], "name": t["name"]} for t in track_page["items"] if t)
+                track_page = await spotify_client.next(track_page)
+
+    return {"artist_id": artist_id, "tracks": tracks}
+
+
+async def get_catalog_index_async(spotify_client, artist_name: str) -> CatalogIndex | None:
+    """Async `get_catalog_index`, for an `AsyncSpotify` client."""
+    key = _catalog_key(artist_name)
+    index = _indexes.get(key)
+    if index is not None:
+        return index
+    catalog = await get_cache("spotify_catalogs").aget_or_fetch(
+        key,
+        lambda: _fetch_catalog_async(spotify_client, artist_name),
+        ttl=SPOTIFY_CATALOG_TTL,
+        stale_ttl=SPOTIFY_CATALOG_STALE_TTL,
+        negative_ttl=SPOTIFY_CATALOG_TTL,
+    )
+    # Building the index of a large catalog takes tens of milliseconds; keep it off the event loop.
+    return await asyncio.to_thread(_build_index, key, catalog)
@@ -1,19 +1,312 @@
 import spotipy
 from smolagents import tool
-import os
+import asyncio
+import httpx
+import logging
+import requests
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from datetime import datetime
 
+from ..cache import get_cache
+from ..clients.spotify import call_with_backoff
+from ..config import (
+    SPOTIFY_PLAYLIST_CACHE_MAX_ENTRIES,
+    SPOTIFY_PLAYLIST_TTL,
+    SPOTIFY_RESOLVE_MODE,
+    SPOTIFY_SEARCH_CONCURRENCY,
+    SPOTIFY_TRACK_CACHE_MAX_ENTRIES,
+    SPOTIFY_TRACK_NEGATIVE_TTL,
+    SPOTIFY_TRACK_TTL,
+)
+from ..handles import UnknownHandle, resolve
+from ..metrics import timed, timed_tool
+from ..normalize import normalize_key
+from .spotify_catalog import get_catalog_index, get_catalog_index_async
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# A catalog that cannot be fetched (or comes back malformed) only costs the
+# fast path: resolving falls back to searching song by song.
+CATALOG_FAILURES = (spotipy.SpotifyException, requests.RequestException, KeyError, TypeError)
+ASYNC_CATALOG_FAILURES = (spotipy.SpotifyException, httpx.HTTPError, KeyError, TypeError)
+
+# Spotify rejects more than 100 items per playlist add, remove or replace call.
+PLAYLIST_ADD_BATCH_SIZE = 100
+
+
+def _search_track(spotify_client: spotipy.Spotify, query: str) -> dict | None:
+    """Return the top track for `query`, backing off and retrying on 429 responses."""
+    results = call_with_backoff(spotify_client.search, q=query, type="track", limit=1)
+    tracks = results["tracks"]["items"]
+    return tracks[0] if tracks else None
+
+
+def _track_cache():
+    return get_cache("spotify_tracks", max_entries=SPOTIFY_TRACK_CACHE_MAX_ENTRIES)
+
+
+def _search_key_and_query(song: str, artist_name: str | None) -> tuple[str, str]:
+    if artist_name:
+        return (
+            f"artist:{normalize_key(artist_name)}|track:{normalize_key(song)}",
+            f"artist:{artist_name} track:{song}",
+        )
+    return f"track:{normalize_key(song)}", f"track:{song}"
+
+
+def _compact_track(track: dict | None) -> dict:
+    # Only keep what we use; an empty dict records "not found".
+    return {"uri": track["uri"], "name": track["name"]} if track else {}
+
+
+def _cached_search(spotify_client: spotipy.Spotify, song: str, artist_name: str | None = None) -> dict | None:
+    """
+    Search for `song` (optionally scoped to `artist_name`) through the shared
+    resolution cache. Results are the same for every user, so hits skip
+    Spotify entirely; misses are cached too, for a shorter time.
+    """
+    key, query = _search_key_and_query(song, artist_name)
+
+    def fetch() -> dict:
+        return _compact_track(_search_track(spotify_client, query))
+
+    track = _track_cache().get_or_fetch(key, fetch, ttl=SPOTIFY_TRACK_TTL, negative_ttl=SPOTIFY_TRACK_NEGATIVE_TTL)
+    return track or None
+
+
+def _resolve_song(spotify_client: spotipy.Spotify, artist_name: str, song: str) -> dict | None:
+    # Search first with artist and song
+    track = _cached_search(spotify_client, song, artist_name)
+    if track is None:
+        # If no results, search just by song title (for covers, etc.)
+        track = _cached_search(spotify_client, song)
+    return track
+
+
+@timed("resolve_tracks")
+def resolve_tracks(
+    spotify_client: spotipy.Spotify, artist_name: str, songs: list[str], mode: str | None = None
+) -> list[dict | None]:
+    """
+    Resolve each song title to a Spotify track.
+
+    In "catalog" mode songs are first matched locally against the artist's
+    catalog; whatever is left (covers, mostly) is searched for concurrently.
+    The result is in the same order as `songs`, with `None` for songs that
+    could not be found.
+    """
+    if not songs:
+        return []
+    resolved: list[dict | None] = [None] * len(songs)
+    pending = list(range(len(songs)))
+
+    if (mode or SPOTIFY_RESOLVE_MODE) == "catalog":
+        try:
+            index = get_catalog_index(spotify_client, artist_name)
+        except CATALOG_FAILURES as e:
+            logger.warning("Catalog fetch failed for %s, falling back to search: %s", artist_name, e)
+            index = None
+        if index is not None:
+            for i in pending:
+                resolved[i] = index.match(songs[i])
+            pending = [i for i in pending if resolved[i] is None]
+
+    if pending:
+        workers = min(SPOTIFY_SEARCH_CONCURRENCY, len(pending))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="spotify-search") as executor:
+            found = executor.map(lambda i: _resolve_song(spotify_client, artist_name, songs[i]), pending)
+            for i, track in zip(pending, found):
+                resolved[i] = track
+    return resolved
+
+
+def add_tracks_in_batches(spotify_client: spotipy.Spotify, playlist_id: str, track_uris: list[str]) -> None:
+    for start in range(0, len(track_uris), PLAYLIST_ADD_BATCH_SIZE):
+        call_with_backoff(spotify_client.playlist_add_items, playlist_id, track_uris[start:start + PLAYLIST_ADD_BATCH_SIZE])
+
+
+def _batches(items: list) -> list[list]:
+    return [items[start:start + PLAYLIST_ADD_BATCH_SIZE] for start in range(0, len(items), PLAYLIST_ADD_BATCH_SIZE)]
+
+
+def _playlist_changes(current: list[str | None], desired: list[str]) -> tuple[list[str], list[str], list[tuple[int, int]]]:
+    """
+    How to turn a playlist holding `current` into `desired` (both track URIs,
+    in order; `None` is an item without one, such as a local file): the URIs
+    to remove (every occurrence), the URIs to append, then the
+    `(range_start, insert_before)` moves that restore the setlist order.
+    """
+    want = Counter(desired)
+    have = Counter(uri for uri in current if uri)
+    remove = [uri for uri in have if have[uri] > want[uri]]
+    kept = [uri for uri in current if uri not in remove]
+    missing = want - Counter(uri for uri in kept if uri)
+    add = []
+    for uri in desired:
+        if missing[uri] > 0:
+            add.append(uri)
+            missing[uri] -= 1
+
+    order = kept + add
+    moves = []
+    for position, uri in enumerate(desired):
+        if order[position] != uri:
+            found = order.index(uri, position)
+            moves.append((found, position))
+            order.insert(position, order.pop(found))
+    return remove, add, moves
+
+
+def _replace_is_cheaper(moves: list, desired: list) -> bool:
+    # Adds and removes are the difference itself; restoring the order costs
+    # a call per move, so past a full rewrite's worth of calls, rewrite.
+    return len(moves) > max(len(_batches(desired)), 1)
+
+
+def _playlist_diff_counts(current: list[str | None], desired: list[str]) -> tuple[int, int]:
+    have, want = Counter(uri for uri in current if uri), Counter(desired)
+    return sum((want - have).values()), sum((have - want).values())
+
+
+def _playlist_cache():
+    return get_cache("spotify_playlists", max_entries=SPOTIFY_PLAYLIST_CACHE_MAX_ENTRIES)
+
+
+def _playlist_key(user_id: str, playlist_name: str) -> str:
+    return f"{user_id}|{playlist_name}"
+
+
+def _existing_playlist(spotify_client, user_id: str, key: str) -> dict | None:
+    """The playlist stored under `key`, unless the user has since deleted (unfollowed) it."""
+    playlist = _playlist_cache().get(key)
+    if playlist is None:
+        return None
+    try:
+        if call_with_backoff(spotify_client.playlist_is_following, playlist["id"], [user_id])[0]:
+            return playlist
+    except spotipy.SpotifyException as e:
+        if e.http_status != 404:
+            raise
+    _playlist_cache().delete(key)
+    return None
+
+
+def _playlist_uris(spotify_client, playlist_id: str) -> list[str | None]:
+    uris, offset = [], 0
+    while True:
+        page = call_with_backoff(
+            spotify_client.playlist_items,
+            playlist_id, fields="items(track(uri)),next", limit=100, offset=offset, additional_types=("track",)
+        )
+        items = page.get("items") or []
+        uris.extend((item.get("track") or {}).get("uri") for item in items)
+        if not page.get("next") or not items:
+            return uris
+        offset += len(items)
+
+
+def _sync_tracks(spotify_client, playlist_id: str, current: list[str | None], track_uris: list[str]) -> None:
+    """Make the playlist hold exactly `track_uris`, touching only what differs."""
+    remove, add, moves = _playlist_changes(current, track_uris)
+    if _replace_is_cheaper(moves, track_uris):
+        batches = _batches(track_uris) or [[]]
+        call_with_backoff(spotify_client.playlist_replace_items, playlist_id, batches[0])
+        for batch in batches[1:]:
+            call_with_backoff(spotify_client.playlist_add_items, playlist_id, batch)
+        return
+    for batch in _batches(remove):
+        call_with_backoff(spotify_client.playlist_remove_all_occurrences_of_items, playlist_id, batch)
+    add_tracks_in_batches(spotify_client, playlist_id, add)
+    for range_start, insert_before in moves:
+        call_with_backoff(
+            spotify_client.playlist_reorder_items, playlist_id, range_start=range_start, insert_before=insert_before
+        )
+
+
+def _playlist_name(artist_name: str, venue_name: str, event_date: str) -> str:
+    try:
+        # Assuming event_date is in a format like 'YYYY-MM-DD'
+        formatted_date = datetime.strptime(event_date, "%Y-%m-%d").strftime("%b %d, %Y")
+        return f"{artist_name} at {venue_name} - {formatted_date}"
+    except ValueError:
+        # Fallback if date format is unexpected
+        return f"{artist_name} at {venue_name} on {event_date}"
+
+
+def _playlist_error(exc: Exception) -> dict:
+    if isinstance(exc, spotipy.SpotifyException):
+        # Catch specific Spotify API errors for better feedback
+        logger.warning("Spotify API error: %s", exc)
+        return {"error": f"Spotify API Error: {exc.reason}"}
+    # Catch any other unexpected errors
+    logger.error("Playlist creation failed", exc_info=exc)
+    return {"error": "An unexpected error occurred while creating the playlist."}
+
+
+def _write_playlist(spotify_client, artist_name: str, tracks: list, event_date: str, venue_name: str) -> dict:
+    """
+    Write the playlist idempotently: the first run creates it and remembers
+    its id per user and name; later runs (retries, corrected setlists) only
+    add, remove or move the tracks that differ.
+    """
+    user_id = call_with_backoff(spotify_client.current_user)["id"]
+    playlist_name = _playlist_name(artist_name, venue_name, event_date)
+
+    tracks = [track for track in tracks if track]
+    track_uris = [track["uri"] for track in tracks]
+
+    key = _playlist_key(user_id, playlist_name)
+    created = []
+
+    def create() -> dict:
+        playlist = call_with_backoff(spotify_client.user_playlist_create, user_id, playlist_name, public=True)
+        created.append(playlist["id"])
+        return {"id": playlist["id"], "url": playlist["external_urls"]["spotify"]}
+
+    # The id is stored before any tracks are added, so a retry after a partial write finds it.
+    playlist = _existing_playlist(spotify_client, user_id, key) or _playlist_cache().get_or_fetch(
+        key, create, ttl=SPOTIFY_PLAYLIST_TTL
+    )
+    current = [] if created else _playlist_uris(spotify_client, playlist["id"])
+    _sync_tracks(spotify_client, playlist["id"], current, track_uris)
+    added, removed = _playlist_diff_counts(current, track_uris)
+
+    return {
+        "playlist_url": playlist["url"],
+        "playlist_name": playlist_name,
+        "songs_added": len(track_uris),
+        "song_titles": [track["name"] for track in tracks],
+        "created": bool(created),
+        "tracks_added": added,
+        "tracks_removed": removed,
+    }
+
+
+@timed("write_playlist")
+def write_playlist(spotify_client, artist_name: str, tracks: list, event_date: str, venue_name: str) -> dict:
+    """Create a playlist from tracks already resolved by `resolve_tracks`.
+
+    Only touches the user's account (profile, playlist create, add items), so it
+    is the one step that has to run per user when the resolution is reused.
+    """
+    try:
+        return _write_playlist(spotify_client, artist_name, tracks, event_date, venue_name)
+    except Exception as e:
+        return _playlist_error(e)
+
+
 @tool
-def create_playlist(spotify_client: spotipy.Spotify, artist_name: str, songs: list[str], event_date: str, venue_name: str) -> dict:
+def create_playlist(spotify_client: spotipy.Spotify, artist_name: str, songs: list[str] | str, event_date: str, venue_name: str) -> dict:
     """Creates a Spotify playlist with a given list of songs.
 
     Args:
         spotify_client (spotipy.Spotify): An authenticated Spotify client.
         artist_name (str): The name of the artist.
-        songs (list[str]): A list of song titles to add to the playlist.
+        songs (list[str] | str): A list of song titles to add to the playlist, or a setlist `handle`.
         event_date (str): The date of the event (e.g., '2025-07-05').
         venue_name (str): The name of the venue.
 
@@ -21,51 +314,172 @@ def create_playlist(spotify_client: spotipy.Spotify, artist_name: str, songs: li
         dict: A dictionary containing the playlist URL, name, and number of songs added.
     """
     try:
-        user_id = spotify_client.current_user()["id"]
+        tracks = resolve_tracks(spotify_client, artist_name, resolve(songs, "setlist"))
+        return _write_playlist(spotify_client, artist_name, tracks, event_date, venue_name)
+    except UnknownHandle as e:
+        return {"error": str(e)}
+    except Exception as e:
+        return _playlist_error(e)
+
+
+timed_tool(create_playlist)
+
+
+# --- Async variants ----------------------------------------------------------
+# Same behaviour and return values as above, for an `AsyncSpotify` client. They
+# share the track and catalog caches with the sync path.
+
+
+async def _cached_search_async(spotify_client, song: str, artist_name: str | None = None) -> dict | None:
+    key, query = _search_key_and_query(song, artist_name)
+
+    async def fetch() -> dict:
+        results = await spotify_client.search(q=query, type="track", limit=1)
+        tracks = results["tracks"]["items"]
+        return _compact_track(tracks[0] if tracks else None)
+
+    track = await _track_cache().aget_or_fetch(
+        key, fetch, ttl=SPOTIFY_TRACK_TTL, negative_ttl=SPOTIFY_TRACK_NEGATIVE_TTL
+    )
+    return track or None
+
+
+async def _resolve_song_async(spotify_client, artist_name: str, song: str) -> dict | None:
+    track = await _cached_search_async(spotify_client, song, artist_name)
+    if track is None:
+        track = await _cached_search_async(spotify_client, song)
+    return track
+
 
-        # Format the playlist name
+@timed("resolve_tracks_async")
+async def resolve_tracks_async(spotify_client, artist_name: str, songs: list[str], mode: str | None = None) -> list[dict | None]:
+    """Async `resolve_tracks`; searches run concurrently up to `SPOTIFY_SEARCH_CONCURRENCY`."""
+    if not songs:
+        return []
+    resolved: list[dict | None] = [None] * len(songs)
+    pending = list(range(len(songs)))
+
+    if (mode or SPOTIFY_RESOLVE_MODE) == "catalog":
         try:
-            # Assuming event_date is in a format like 'YYYY-MM-DD'
-            formatted_date = datetime.strptime(event_date, "%Y-%m-%d").strftime("%b %d, %Y")
-            playlist_name = f"{artist_name} at {venue_name} - {formatted_date}"
-        except ValueError:
-            # Fallback if date format is unexpected
-            playlist_name = f"{artist_name} at {venue_name} on {event_date}"
-
-        playlist = spotify_client.user_playlist_create(user_id, playlist_name, public=True)
-        playlist_url = playlist["external_urls"]["spotify"]
-
-        track_uris = []
-        songs_added_titles = []
-        for song in songs:
-            # Search first with artist and song
-            results = spotify_client.search(q=f"artist:{artist_name} track:{song}", type="track", limit=1)
-            tracks = results["tracks"]["items"]
-            if tracks:
-                track_uris.append(tracks[0]["uri"])
-                songs_added_titles.append(tracks[0]["name"])
-            else:
-                # If no results, search just by song title (for covers, etc.)
-                results = spotify_client.search(q=f"track:{song}", type="track", limit=1)
-                tracks = results["tracks"]["items"]
-                if tracks:
-                    track_uris.append(tracks[0]["uri"])
-                    songs_added_titles.append(tracks[0]["name"])
-
-        if track_uris:
-            spotify_client.playlist_add_items(playlist["id"], track_uris)
-
-        return {
-            "playlist_url": playlist_url,
-            "playlist_name": playlist_name,
-            "songs_added": len(track_uris),
-            "song_titles": songs_added_titles
-        }
+            index = await get_catalog_index_async(spotify_client, artist_name)
+        except ASYNC_CATALOG_FAILURES as e:
+            logger.warning("Catalog fetch failed for %s, falling back to search: %s", artist_name, e)
+            index = None
+        if index is not None:
+            # Fuzzy matching scans the whole catalog, so it runs on a worker thread rather than the event loop.
+            matches = await asyncio.to_thread(lambda: [index.match(songs[i]) for i in pending])
+            for i, track in zip(pending, matches):
+                resolved[i] = track
+            pending = [i for i in pending if resolved[i] is None]
+
+    semaphore = asyncio.Semaphore(SPOTIFY_SEARCH_CONCURRENCY)
+
+    async def resolve(i: int) -> None:
+        async with semaphore:
+            resolved[i] = await _resolve_song_async(spotify_client, artist_name, songs[i])
+
+    await asyncio.gather(*(resolve(i) for i in pending))
+    return resolved
+
+
+async def _existing_playlist_async(spotify_client, user_id: str, key: str) -> dict | None:
+    playlist = _playlist_cache().get(key)
+    if playlist is None:
+        return None
+    try:
+        if (await spotify_client.playlist_is_following(playlist["id"], [user_id]))[0]:
+            return playlist
     except spotipy.SpotifyException as e:
-        # Catch specific Spotify API errors for better feedback
-        print(f"Spotify API Error: {e}")
-        return {"error": f"Spotify API Error: {e.reason}"}
+        if e.http_status != 404:
+            raise
+    _playlist_cache().delete(key)
+    return None
+
+
+async def _playlist_uris_async(spotify_client, playlist_id: str) -> list[str | None]:
+    uris, offset = [], 0
+    while True:
+        page = await spotify_client.playlist_items(
+            playlist_id, fields="items(track(uri)),next", limit=100, offset=offset, additional_types=("track",)
+        )
+        items = page.get("items") or []
+        uris.extend((item.get("track") or {}).get("uri") for item in items)
+        if not page.get("next") or not items:
+            return uris
+        offset += len(items)
+
+
+async def _sync_tracks_async(spotify_client, playlist_id: str, current: list[str | None], track_uris: list[str]) -> None:
+    remove, add, moves = _playlist_changes(current, track_uris)
+    if _replace_is_cheaper(moves, track_uris):
+        batches = _batches(track_uris) or [[]]
+        await spotify_client.playlist_replace_items(playlist_id, batches[0])
+        for batch in batches[1:]:
+            await spotify_client.playlist_add_items(playlist_id, batch)
+        return
+    for batch in _batches(remove):
+        await spotify_client.playlist_remove_all_occurrences_of_items(playlist_id, batch)
+    for batch in _batches(add):
+        await spotify_client.playlist_add_items(playlist_id, batch)
+    for range_start, insert_before in moves:
+        await spotify_client.playlist_reorder_items(playlist_id, range_start=range_start, insert_before=insert_before)
+
+
+async def _write_playlist_async(spotify_client, artist_name: str, tracks: list, event_date: str, venue_name: str,
+                               playlist_name: str | None = None, playlist_key: str | None = None) -> dict:
+    user = await spotify_client.current_user()
+    playlist_name = playlist_name or _playlist_name(artist_name, venue_name, event_date)
+
+    tracks = [track for track in tracks if track]
+    track_uris = [track["uri"] for track in tracks]
+
+    key = _playlist_key(user["id"], playlist_key or playlist_name)
+    created = []
+
+    async def create() -> dict:
+        playlist = await spotify_client.user_playlist_create(user["id"], playlist_name, public=True)
+        created.append(playlist["id"])
+        return {"id": playlist["id"], "url": playlist["external_urls"]["spotify"]}
+
+    playlist = await _existing_playlist_async(spotify_client, user["id"], key) or await _playlist_cache().aget_or_fetch(
+        key, create, ttl=SPOTIFY_PLAYLIST_TTL
+    )
+    current = [] if created else await _playlist_uris_async(spotify_client, playlist["id"])
+    await _sync_tracks_async(spotify_client, playlist["id"], current, track_uris)
+    added, removed = _playlist_diff_counts(current, track_uris)
+
+    return {
+        "playlist_url": playlist["url"],
+        "playlist_name": playlist_name,
+        "songs_added": len(track_uris),
+        "song_titles": [track["name"] for track in tracks],
+        "created": bool(created),
+        "tracks_added": added,
+        "tracks_removed": removed,
+    }
+
+
+@timed("write_playlist_async")
+async def write_playlist_async(spotify_client, artist_name: str, tracks: list, event_date: str, venue_name: str,
+                              playlist_name: str | None = None, playlist_key: str | None = None) -> dict:
+    """
+    Async `write_playlist`. `playlist_name` overrides the name built from the
+    artist, venue and date, and `playlist_key` identifies the playlist for
+    idempotent re-runs when its name does not (by default, the name does).
+    """
+    try:
+        return await _write_playlist_async(
+            spotify_client, artist_name, tracks, event_date, venue_name, playlist_name, playlist_key
+        )
+    except Exception as e:
+        return _playlist_error(e)
+
+
+@timed("create_playlist_async")
+async def create_playlist_async(spotify_client, artist_name: str, songs: list[str], event_date: str, venue_name: str) -> dict:
+    """Async `create_playlist`."""
+    try:
+        tracks = await resolve_tracks_async(spotify_client, artist_name, songs)
+        return await _write_playlist_async(spotify_client, artist_name, tracks, event_date, venue_name)
     except Exception as e:
-        # Catch any other unexpected errors
-        print(f"An unexpected error occurred: {e}")
-        return {"error": "An unexpected error occurred while creating the playlist."}
+        return _playlist_error(e)
@@ -1,10 +1,26 @@
+import os
+import tempfile
+
 import pytest
-from src.agent import trace_provider
+
+# Keep the on-disk caches and stores out of the working tree during tests.
+os.environ.setdefault("SETLISTIFY_CACHE_DIR", tempfile.mkdtemp(prefix="setlistify-test-cache-"))
+os.environ.setdefault("SETLISTIFY_DATA_DIR", tempfile.mkdtemp(prefix="setlistify-test-data-"))
+
+# Placeholder OAuth settings, so routes that need them work without a real config.toml.
+if "SETLISTIFY_CONFIG" not in os.environ:
+    _config_path = os.path.join(tempfile.mkdtemp(prefix="setlistify-test-config-"), "config.toml")
+    with open(_config_path, "w") as f:
+        f.write(
+            '[spotipy]\nclient_id = "test-client"\nclient_secret = "test-secret"\n'
+            'redirect_uri = "http://127.0.0.1:8000/callback"\nscope = "playlist-modify-public"\n'
+        )
+    os.environ["SETLISTIFY_CONFIG"] = _config_path
+
+from src.telemetry import shutdown_telemetry
 
 @pytest.fixture(scope="session", autouse=True)
 def shutdown_tracer_provider():
     """Ensure the tracer provider is shut down after the test session."""
     yield
-    print("\nShutting down OpenTelemetry tracer provider...")
-    trace_provider.shutdown()
-    print("Tracer provider shut down.")
+    shutdown_telemetry()
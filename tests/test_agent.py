@@ -0,0 +1,90 @@
+import src.agent as agent_module
+import src.agent_results as agent_results
+from src.agent import AgentPool, bind_spotify_client, create_playlist_for_user, record_run_result
+
+
+def _fake_spotify_tools(monkeypatch, calls):
+    tracks = [{"uri": "spotify:track:1", "name": "One"}]
+    monkeypatch.setattr(agent_module, "resolve_tracks", lambda client, artist, songs: tracks)
+    monkeypatch.setattr(
+        agent_module,
+        "write_playlist",
+        lambda *args: calls.append(args) or {"songs_added": len(args[2])},
+    )
+    return tracks
+
+
+def test_create_playlist_for_user_uses_bound_client(monkeypatch):
+    calls = []
+    _fake_spotify_tools(monkeypatch, calls)
+    client = object()
+
+    assert "error" in create_playlist_for_user("Band", ["One"], "2025-07-05", "Arena")
+    with bind_spotify_client(client):
+        assert create_playlist_for_user("Band", ["One"], "2025-07-05", "Arena") == {"songs_added": 1}
+
+    assert calls[0][0] is client
+
+
+def test_record_run_result_collects_the_resolved_show(monkeypatch):
+    tracks = _fake_spotify_tools(monkeypatch, [])
+
+    with bind_spotify_client(object()), record_run_result() as result:
+        create_playlist_for_user("Band", ["One"], "2025-07-05", "Arena")
+
+    assert result == {
+        "artist_name": "Band",
+        "event_date": "2025-07-05",
+        "venue_name": "Arena",
+        "songs": ["One"],
+        "tracks": tracks,
+    }
+
+
+def test_latest_show_key_follows_the_newest_setlist(monkeypatch):
+    from src.tools import setlist_tools
+
+    pages = iter([{"setlist": [{"id": "abc"}]}, {"setlist": [{"id": "def"}, {"id": "abc"}]}])
+    monkeypatch.setattr(agent_results, "search_artist", lambda name: [{"name": "Band", "mbid": "m1"}])
+    monkeypatch.setattr(setlist_tools, "get_setlist_store", lambda: None)
+    monkeypatch.setattr(setlist_tools, "fetch_setlists_page", lambda mbid, page=1: next(pages))
+
+    first = agent_results.latest_show_key("Band")
+    agent_results.store_run_result(first, {"tracks": []})
+
+    assert first == "latest:m1:abc"
+    assert agent_results.get_run_result(first) == {"tracks": []}
+    assert agent_results.get_run_result(agent_results.latest_show_key("Band")) is None
+
+
+class FakeMemory:
+    def __init__(self):
+        self.resets = 0
+
+    def reset(self):
+        self.resets += 1
+
+
+class FakeAgent:
+    def __init__(self):
+        self.memory = FakeMemory()
+        self.monitor = FakeMemory()
+
+
+def test_agent_pool_reuses_agents_and_never_shares_one_concurrently():
+    built = []
+
+    def factory():
+        built.append(FakeAgent())
+        return built[-1]
+
+    pool = AgentPool(factory, max_idle=1)
+
+    with pool.checkout() as first:
+        with pool.checkout() as second:
+            assert first is not second
+    with pool.checkout() as third:
+        assert third in (first, second)
+
+    assert len(built) == 2
+    assert third.memory.resets >= 1
@@ -0,0 +1,22 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+
+def test_agent_scenario_writes_playlists_to_the_fake():
+    # The benchmark configures the app through the environment before importing it, so it runs in its own process.
+    run = subprocess.run(
+        [sys.executable, "-m", "benchmarks.e2e", "--scenario", "agent", "--requests", "2", "--concurrency", "2",
+         "--artists", "1", "--setlistfm-rate", "50", "--setlistfm-latency", "1", "--spotify-latency", "1",
+         "--llm-latency", "1", "--json"],
+        cwd=Path(__file__).resolve().parents[1],
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+
+    assert run.returncode == 0, run.stdout + run.stderr
+    report = json.loads(run.stdout[run.stdout.index("{\n"):])["agent"]
+    assert report["errors"] == 0
+    assert report["outbound"]["spotify"]["by_route"].get("add_tracks", 0) >= 1
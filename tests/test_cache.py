@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+import src.cache as cache_module
+from src.cache import SQLiteCache, get_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_or_fetch_hits_after_miss(tmp_path):
+    cache = SQLiteCache(tmp_path / "c.sqlite3", clock=FakeClock())
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return {"mbid": "abc"}
+
+    assert cache.get_or_fetch("artist:metallica", fetch, ttl=60) == {"mbid": "abc"}
+    assert cache.get_or_fetch("artist:metallica", fetch, ttl=60) == {"mbid": "abc"}
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_entries_survive_reopen(tmp_path):
+    path = tmp_path / "c.sqlite3"
+    SQLiteCache(path).set("k", [1, 2, 3], ttl=60)
+    assert SQLiteCache(path).get("k") == [1, 2, 3]
+
+
+def test_expired_entries_are_refetched(tmp_path):
+    clock = FakeClock()
+    cache = SQLiteCache(tmp_path / "c.sqlite3", clock=clock)
+    cache.set("k", "old", ttl=10)
+    clock.now += 11
+    assert cache.get("k") is None
+    assert cache.get_or_fetch("k", lambda: "new", ttl=10) == "new"
+
+
+def test_stale_entries_are_served_while_revalidating(tmp_path):
+    clock = FakeClock()
+    cache = SQLiteCache(tmp_path / "c.sqlite3", clock=clock)
+    cache.set("k", "old", ttl=10, stale_ttl=100)
+    clock.now += 20
+    refreshed = threading.Event()
+
+    def fetch():
+        refreshed.set()
+        return "new"
+
+    assert cache.get_or_fetch("k", fetch, ttl=10, stale_ttl=100) == "old"
+    assert refreshed.wait(timeout=5)
+    cache.close()
+    assert SQLiteCache(tmp_path / "c.sqlite3", clock=clock).get("k") == "new"
+    assert cache.stale_hits == 1
+
+
+def test_negative_results_refreshed_in_the_background_use_the_negative_ttl(tmp_path):
+    clock = FakeClock()
+    cache = SQLiteCache(tmp_path / "c.sqlite3", clock=clock)
+    cache.set("k", ["old"], ttl=10, stale_ttl=100)
+    clock.now += 20
+
+    assert cache.get_or_fetch("k", lambda: [], ttl=10, stale_ttl=100, negative_ttl=1) == ["old"]
+    cache.close()
+    reopened = SQLiteCache(tmp_path / "c.sqlite3", clock=clock)
+    assert reopened.get("k") == []
+    clock.now += 2
+    # Not served stale for another `stale_ttl`: the empty result is simply gone.
+    assert reopened.get("k") is None
+
+
+def test_get_cache_rejects_a_different_bound(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(cache_module, "_caches", {})
+    monkeypatch.setattr(cache_module, "_sized", set())
+
+    cache = get_cache("bounded")
+    assert get_cache("bounded", max_entries=5) is cache
+    assert cache.max_entries == 5
+    assert get_cache("bounded") is cache
+    with pytest.raises(ValueError):
+        get_cache("bounded", max_entries=6)
+
+
+def test_lru_eviction(tmp_path):
+    clock = FakeClock()
+    cache = SQLiteCache(tmp_path / "c.sqlite3", max_entries=2, clock=clock)
+    cache.set("a", 1, ttl=60)
+    clock.now += 1
+    cache.set("b", 2, ttl=60)
+    clock.now += 1
+    cache.get("a")  # "b" is now least recently used
+    clock.now += 1
+    cache.set("c", 3, ttl=60)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
@@ -0,0 +1,66 @@
+import pytest
+
+import src.agent as agent_module
+from src.agent import bind_spotify_client, create_playlist_for_user, record_run_result
+from src.handles import HandleStore, UnknownHandle, handle_scope, resolve
+from src.progress import summarize_tool_output
+from src.tools import setlist_tools
+
+RAW_SHOW = {
+    "id": "s1",
+    "eventDate": "05-07-2025",
+    "url": "https://www.setlist.fm/setlist/band/2025/arena.html",
+    "venue": {"name": "Arena", "city": {"name": "Oslo", "country": {"name": "Norway"}}},
+    "sets": {"set": [{"song": [{"name": "One"}, {"name": "Two"}, {"name": "One"}]}]},
+}
+
+
+def test_store_issues_numbered_handles_and_checks_their_kind():
+    store = HandleStore()
+    shows = store.put("shows", [{"setlist": ["One"]}])
+    setlist = store.put("setlist", ["One"])
+
+    assert (shows, setlist, store.put("setlist", ["Two"])) == ("shows:1", "setlist:1", "setlist:2")
+    assert store.get(" setlist:1 ", "setlist") == ["One"]
+    with pytest.raises(UnknownHandle):
+        store.get(shows, "setlist")
+    with pytest.raises(UnknownHandle):
+        store.get("setlist:9", "setlist")
+
+
+def test_resolve_passes_values_through_and_rejects_handles_outside_a_run():
+    assert resolve(["One"], "setlist") == ["One"]
+    with pytest.raises(UnknownHandle):
+        resolve("setlist:1", "setlist")
+
+
+def test_agent_tools_pass_handles_instead_of_data(monkeypatch):
+    monkeypatch.setattr(setlist_tools, "search_artist", lambda name: [{"name": "Band", "mbid": "m1"}])
+    monkeypatch.setattr(setlist_tools, "fetch_setlists_page", lambda mbid, page=1: {"setlist": [RAW_SHOW]})
+    monkeypatch.setattr(agent_module, "resolve_tracks", lambda client, artist, songs: [{"uri": song} for song in songs])
+    monkeypatch.setattr(agent_module, "write_playlist", lambda client, artist, tracks, *rest: {"songs_added": len(tracks)})
+
+    # Outside a run the tools return full values, as the direct pipeline expects.
+    assert setlist_tools.get_latest_show("Band")[0]["setlist"] == ["One", "Two", "One"]
+
+    with bind_spotify_client(object()), record_run_result() as result, handle_scope():
+        shows = setlist_tools.get_latest_show("Band")
+        setlist = setlist_tools.extract_setlist(shows["handle"])
+        playlist = create_playlist_for_user("Band", setlist["handle"], "2025-07-05", "Arena")
+        stale = setlist_tools.extract_setlist("setlist:1")
+
+    assert shows == {
+        "handle": "shows:1",
+        "shows": [{"artist": "Band", "event_date": "05-07-2025", "venue": "Arena", "city": "Oslo", "songs": 3}],
+    }
+    assert setlist == {"handle": "setlist:1", "song_count": 2, "first_songs": ["One", "Two"]}
+    assert playlist == {"songs_added": 2}
+    assert result["songs"] == ["One", "Two"]
+    assert "error" in stale
+    assert summarize_tool_output("get_latest_show", shows) == "Found 1 show(s); latest at Arena on 05-07-2025 with 3 songs."
+    assert summarize_tool_output("extract_setlist", setlist) == "Compiled a setlist of 2 songs."
+
+
+def test_compaction_can_be_disabled():
+    with handle_scope(enabled=False):
+        assert setlist_tools.extract_setlist([{"setlist": ["One", "One"]}]) == ["One"]
@@ -0,0 +1,142 @@
+import threading
+
+import pytest
+
+from src.jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, JobStore, QueueFull
+
+
+def test_claim_runs_higher_priority_first(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    low = store.submit("playlist", {"artist_name": "Low"})
+    high = store.submit("playlist", {"artist_name": "High"}, priority=5)
+
+    assert store.claim()["id"] == high
+    assert store.claim()["id"] == low
+    assert store.claim() is None
+
+
+def test_submit_is_bounded(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    store.submit("playlist", {}, max_queued=1)
+    with pytest.raises(QueueFull):
+        store.submit("playlist", {}, max_queued=1)
+
+
+def test_jobs_survive_a_restart(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    now = [1000.0]
+    store = JobStore(path, clock=lambda: now[0])
+    waiting = store.submit("agent", {"artist_name": "Waiting"}, owner="session-1")
+    interrupted = store.submit("agent", {"artist_name": "Interrupted"}, priority=1)
+    store.claim()
+    store.close()
+
+    reopened = JobStore(path, clock=lambda: now[0])
+    # The lease of the interrupted job has to lapse first.
+    assert reopened.recover(max_attempts=3, lease_timeout=60) == 0
+    now[0] += 61
+    assert reopened.recover(max_attempts=3, lease_timeout=60) == 1
+    assert reopened.get(waiting)["payload"] == {"artist_name": "Waiting"}
+    assert reopened.get(waiting)["owner"] == "session-1"
+    assert reopened.get(interrupted)["status"] == QUEUED
+
+    # A job that keeps getting interrupted is eventually given up on.
+    assert reopened.claim()["id"] == interrupted
+    now[0] += 61
+    assert reopened.recover(max_attempts=2, lease_timeout=60) == 0
+    assert reopened.get(interrupted)["status"] == FAILED
+
+
+def test_recovery_leaves_jobs_of_live_workers_alone(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    now = [1000.0]
+    worker = JobStore(path, clock=lambda: now[0], worker_id="worker-1")
+    sibling = JobStore(path, clock=lambda: now[0], worker_id="worker-2")
+    job_id = worker.submit("agent", {"artist_name": "Band"})
+    assert worker.claim()["worker_id"] == "worker-1"
+
+    # The sibling restarting does not take over a job whose lease is being renewed.
+    now[0] += 50
+    assert worker.heartbeat() == 1
+    now[0] += 50
+    assert sibling.recover(lease_timeout=60) == 0
+    assert sibling.get(job_id)["status"] == RUNNING
+
+    now[0] += 61
+    assert sibling.recover(lease_timeout=60) == 1
+    assert sibling.claim()["worker_id"] == "worker-2"
+
+    # The first worker finishing late must not overwrite the sibling's run.
+    assert worker.finish(job_id, result={"stale": True}) is False
+    assert sibling.get(job_id)["status"] == RUNNING
+    assert sibling.finish(job_id, result={"ok": True}) is True
+    assert sibling.get(job_id)["result"] == {"ok": True}
+
+
+def test_an_agent_job_without_a_result_fails(tmp_path, monkeypatch):
+    from contextlib import contextmanager
+
+    import src.jobs as jobs
+
+    @contextmanager
+    def agent_task(spotify_client, task, result_key=None):
+        yield iter([{"type": "progress", "kind": "step", "message": "thinking", "step": 1}])
+
+    monkeypatch.setattr(jobs, "latest_show_key", lambda artist_name: None)
+    monkeypatch.setattr(jobs, "agent_task", agent_task)
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    queue = JobQueue(store, jobs.RUNNERS, client_factory=lambda owner: object())
+    job_id = store.submit("agent", {"artist_name": "Band"})
+
+    queue.run(store.claim())
+
+    assert store.get(job_id)["status"] == FAILED
+    assert store.events(job_id)[-1][1]["type"] == "error"
+
+
+def test_queue_runs_jobs_and_records_events(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    done = threading.Event()
+    clients = []
+
+    def runner(spotify_client, payload, emit):
+        clients.append(spotify_client)
+        emit({"type": "progress", "message": "working"})
+        emit({"type": "complete", "data": {"artist": payload["artist_name"]}})
+        done.set()
+        return {"artist": payload["artist_name"]}
+
+    queue = JobQueue(store, {"playlist": runner}, client_factory=lambda owner: f"client-for-{owner}", workers=1)
+    queue.start()
+    try:
+        job_id = queue.submit("playlist", {"artist_name": "Band"}, owner="session-1")
+        assert done.wait(5)
+    finally:
+        queue.stop()
+
+    job = store.get(job_id)
+    assert job["status"] == SUCCEEDED
+    assert job["result"] == {"artist": "Band"}
+    assert clients == ["client-for-session-1"]
+    assert [event["type"] for _, event in store.events(job_id)] == ["progress", "complete"]
+    assert store.events(job_id, after=1)[0][0] == 2
+
+
+def test_failed_jobs_report_the_error(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    queue = JobQueue(
+        store,
+        {"playlist": lambda client, payload, emit: {"error": "No shows found"}, "agent": None},
+        client_factory=lambda owner: None if owner == "expired" else object(),
+    )
+    failing = store.submit("playlist", {})
+    expired = store.submit("agent", {}, owner="expired")
+
+    queue.run(store.claim())
+    queue.run(store.claim())
+
+    assert store.get(failing)["status"] == FAILED
+    assert store.get(failing)["error"] == "No shows found"
+    assert store.get(expired)["status"] == FAILED
+    assert "log in again" in store.get(expired)["error"]
+    assert store.events(expired)[-1][1]["type"] == "error"
@@ -0,0 +1,90 @@
+import asyncio
+
+import src.lineup as lineup
+
+MBID = "65f4f0c5-ef9e-490c-aee3-909e7ae6b2ab"
+
+
+def install_fakes(monkeypatch, written):
+    in_flight = {"now": 0, "max": 0}
+
+    async def fake_search(name):
+        return [] if name == "Nobody" else [{"name": name, "mbid": f"mbid-{name}"}]
+
+    async def fake_preview(artist, count=None, mode="latest"):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01 if artist["mbid"] == "mbid-Slow" else 0)
+        in_flight["now"] -= 1
+        name = artist["name"] or "Metallica"
+        return {"artist": name, "event_date": "05-07-2025", "venue_name": "Park", "songs": [f"{name} hit", "Shared"]}
+
+    async def fake_resolve(client, artist_name, songs):
+        return [{"uri": f"uri:{song}", "name": song} for song in songs]
+
+    async def fake_write(client, artist_name, tracks, event_date, venue_name, playlist_name=None, playlist_key=None):
+        written.append({"name": playlist_name or artist_name, "key": playlist_key,
+                        "uris": [track["uri"] for track in tracks]})
+        return {"playlist_url": f"https://open.spotify.com/{len(written)}", "songs_added": len(tracks)}
+
+    monkeypatch.setattr(lineup, "search_artist_async", fake_search)
+    monkeypatch.setattr(lineup, "preview_artist_async", fake_preview)
+    monkeypatch.setattr(lineup, "resolve_tracks_async", fake_resolve)
+    monkeypatch.setattr(lineup, "write_playlist_async", fake_write)
+    return in_flight
+
+
+def collect(**kwargs):
+    async def run():
+        return [event async for event in lineup.lineup_events(object(), **kwargs)]
+
+    return asyncio.run(run())
+
+
+def test_lineup_streams_one_playlist_per_artist(monkeypatch):
+    written = []
+    in_flight = install_fakes(monkeypatch, written)
+
+    events = collect(artists=["Slow", "Fast", "Nobody", MBID], concurrency=2)
+
+    artist_events = [event for event in events if event["type"] == "artist"]
+    # Streamed as each artist finishes, not in lineup order.
+    assert artist_events[0]["artist"] == "Fast"
+    assert artist_events[-1]["index"] == 0
+    assert {event["artist"] for event in artist_events} == {"Slow", "Fast", "Nobody", "Metallica"}
+    assert "error" in next(event for event in artist_events if event["artist"] == "Nobody")
+    assert all("playlist_url" in event for event in artist_events if event["artist"] != "Nobody")
+    assert len(written) == 3
+    assert in_flight["max"] <= 2
+
+    summary = events[-1]["data"]
+    assert events[-1]["type"] == "complete"
+    assert summary["succeeded"] == 3
+    assert summary["failed"] == ["Nobody"]
+
+
+def test_lineup_can_write_one_combined_playlist(monkeypatch):
+    written = []
+    install_fakes(monkeypatch, written)
+
+    events = collect(artists=["Slow", "Fast"], combined=True)
+
+    assert len(written) == 1
+    assert written[0]["name"] == "Lineup: Slow, Fast"
+    # Lineup order, with songs shared between artists added once.
+    assert written[0]["uris"] == ["uri:Slow hit", "uri:Shared", "uri:Fast hit"]
+    assert events[-1]["data"]["playlist"]["songs_added"] == 3
+
+
+def test_combined_playlists_are_keyed_on_the_whole_lineup(monkeypatch):
+    written = []
+    install_fakes(monkeypatch, written)
+
+    collect(artists=["A", "B", "C", "D"], combined=True)
+    collect(artists=["A", "B", "C", "E"], combined=True)
+    collect(artists=["A", "B", "C", "D"], combined=True)
+
+    # Both lineups show as "A, B, C + 1 more", but only the same lineup reuses a playlist.
+    assert written[0]["name"] == written[1]["name"] == "Lineup: A, B, C + 1 more"
+    assert written[0]["key"] != written[1]["key"]
+    assert written[2]["key"] == written[0]["key"]
@@ -0,0 +1,70 @@
+import io
+import json
+import logging
+
+from src.log import BackgroundHandler, JsonFormatter, SamplingFilter, log_context, parse_levels, redact, register_secret
+
+
+def _record(msg: str, level: int = logging.INFO, name: str = "src.test") -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, 1, msg, (), None)
+
+
+def test_redact_masks_keys_tokens_and_registered_secrets():
+    register_secret("s3cr3t-client")
+    text = redact(
+        "headers {'x-api-key': 'abc123'} Authorization: Bearer tok.en "
+        "GET /callback?code=xyz&state=1 client_secret=s3cr3t-client status code: 429"
+    )
+
+    assert "abc123" not in text
+    assert "tok.en" not in text
+    assert "xyz" not in text
+    assert "s3cr3t-client" not in text
+    assert "state=1" in text
+    assert "status code: 429" in text
+
+
+def test_sampling_passes_a_burst_per_interval_and_counts_the_rest():
+    now = [0.0]
+    sampler = SamplingFilter(burst=2, interval=10, clock=lambda: now[0])
+
+    passed = [sampler.filter(_record("Searching for %s")) for _ in range(5)]
+    assert passed == [True, True, False, False, False]
+    assert sampler.filter(_record("Searching for %s", level=logging.WARNING))
+
+    now[0] = 10.0
+    record = _record("Searching for %s")
+    assert sampler.filter(record)
+    assert record.suppressed == 3
+
+
+def test_background_handler_writes_json_with_context_off_thread():
+    stream = io.StringIO()
+    handler = BackgroundHandler(logging.StreamHandler(stream))
+    handler.setFormatter(JsonFormatter())
+    logger = logging.getLogger("src.test_background")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    try:
+        with log_context(request_id="req-1"):
+            logger.info("Found %d artists", 3, extra={"artist": "Band"})
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logger.exception("Lookup failed with api_key=%s", "hunter22")
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert first["message"] == "Found 3 artists"
+    assert first["request_id"] == "req-1"
+    assert first["artist"] == "Band"
+    assert second["level"] == "ERROR"
+    assert "hunter22" not in second["message"]
+    assert "ValueError: boom" in second["exc"]
+
+
+def test_parse_levels():
+    assert parse_levels("src.tools=debug, httpx=WARNING,,bad") == {"src.tools": "DEBUG", "httpx": "WARNING"}
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from src.cache import get_cache
+from src.metrics import Registry, TOOL_DURATION, TOOL_ERRORS, render, timed
+
+
+def _sample(text: str, series: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(series + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{series} not in output")
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = registry.histogram("demo_seconds", "Demo latency.", ("tool",), buckets=(0.1, 1.0))
+    child = latency.labels("search")
+    for value in (0.05, 0.5, 0.5, 3.0):
+        child.observe(value)
+
+    text = registry.render()
+
+    assert "# TYPE demo_seconds histogram" in text
+    assert _sample(text, 'demo_seconds_bucket{tool="search",le="0.1"}') == 1
+    assert _sample(text, 'demo_seconds_bucket{tool="search",le="1"}') == 3
+    assert _sample(text, 'demo_seconds_bucket{tool="search",le="+Inf"}') == 4
+    assert _sample(text, 'demo_seconds_count{tool="search"}') == 4
+    assert _sample(text, 'demo_seconds_sum{tool="search"}') == pytest.approx(4.05)
+
+
+def test_counter_gauge_and_label_escaping():
+    registry = Registry()
+    calls = registry.counter("demo_total", "Demo calls.", ("artist",))
+    active = registry.gauge("demo_active", "Demo gauge.")
+    calls.labels('The "Band"').inc()
+    calls.labels('The "Band"').inc(2)
+    active.inc()
+    active.inc()
+    active.dec()
+
+    text = registry.render()
+
+    assert _sample(text, 'demo_total{artist="The \\"Band\\""}') == 3
+    assert _sample(text, "demo_active") == 1
+    with pytest.raises(ValueError):
+        calls.labels()
+    with pytest.raises(ValueError):
+        registry.counter("demo_total", "Again.")
+
+
+def test_timed_records_sync_and_async_calls_and_errors():
+    @timed("test_sync_tool")
+    def ok():
+        return {"error": "nope"}
+
+    @timed("test_list_tool")
+    def listed():
+        return [{"error": "nope"}]
+
+    @timed("test_async_tool")
+    async def boom():
+        raise RuntimeError("boom")
+
+    ok()
+    listed()
+    with pytest.raises(RuntimeError):
+        asyncio.run(boom())
+
+    assert TOOL_DURATION.labels("test_sync_tool").count == 1
+    assert TOOL_DURATION.labels("test_async_tool").count == 1
+    assert TOOL_ERRORS.labels("test_sync_tool").value == 1
+    assert TOOL_ERRORS.labels("test_list_tool").value == 1
+    assert TOOL_ERRORS.labels("test_async_tool").value == 1
+
+
+def test_tools_are_timed_through_the_agent_entry_point():
+    from src.tools import setlist_tools
+
+    before = TOOL_DURATION.labels("extract_setlist").count
+    assert setlist_tools.extract_setlist([{"setlist": ["A", "B"]}]) == ["A", "B"]
+    assert TOOL_DURATION.labels("extract_setlist").count == before + 1
+
+
+def test_render_includes_cache_and_quota_collectors():
+    cache = get_cache("metrics_test")
+    cache.get_or_fetch("a", lambda: 1, ttl=60)
+    cache.get_or_fetch("a", lambda: 1, ttl=60)
+
+    text = render()
+
+    assert _sample(text, 'setlistify_cache_requests_total{cache="metrics_test",result="hit"}') == 1
+    assert _sample(text, 'setlistify_cache_requests_total{cache="metrics_test",result="miss"}') == 1
+    assert _sample(text, 'setlistify_cache_hit_ratio{cache="metrics_test"}') == 0.5
+    assert _sample(text, "setlistify_setlistfm_quota_remaining") > 0
@@ -0,0 +1,64 @@
+import src.pipeline as pipeline
+
+SHOWS = [
+    {"artist": "Metallica", "event_date": "05-07-2025", "venue": "Villa Park", "city": "Birmingham",
+     "country": "UK", "url": "https://setlist.fm/a", "setlist": ["Creeping Death", "One"]},
+    {"artist": "Metallica", "event_date": "01-07-2025", "venue": "Wembley", "city": "London",
+     "country": "UK", "url": "https://setlist.fm/b", "setlist": ["One", "Enter Sandman"]},
+]
+
+
+def test_preview_setlist_combines_shows(monkeypatch):
+    monkeypatch.setattr(pipeline, "get_latest_show", lambda artist_name, count=1: SHOWS[:count])
+
+    result = pipeline.preview_setlist("Metallica", count=2)
+
+    assert result["songs"] == ["Creeping Death", "One", "Enter Sandman"]
+    assert result["event_date"] == "05-07-2025"
+    assert result["venue_name"] == "Villa Park"
+    assert [show["city"] for show in result["shows"]] == ["Birmingham", "London"]
+
+
+def test_preview_setlist_passes_through_errors(monkeypatch):
+    monkeypatch.setattr(pipeline, "get_latest_show", lambda artist_name, count=1: [{"error": "No shows found"}])
+    assert pipeline.preview_setlist("Nobody") == {"error": "No shows found"}
+
+
+def test_create_playlist_for_artist_fills_in_show_details(monkeypatch):
+    calls = {}
+    monkeypatch.setattr(pipeline, "get_latest_show", lambda artist_name, count=1: SHOWS[:count])
+    monkeypatch.setattr(pipeline, "create_playlist", lambda **kwargs: calls.update(kwargs) or {"songs_added": 1})
+
+    result = pipeline.create_playlist_for_artist(object(), "Metallica", songs=["One"])
+
+    assert result == {"songs_added": 1}
+    assert calls["songs"] == ["One"]
+    assert calls["event_date"] == "05-07-2025"
+    assert calls["venue_name"] == "Villa Park"
+
+
+def test_preview_setlist_async(monkeypatch):
+    import asyncio
+
+    async def fake_get_latest_show(artist_name, count=1):
+        return SHOWS[:count]
+
+    monkeypatch.setattr(pipeline, "get_latest_show_async", fake_get_latest_show)
+
+    result = asyncio.run(pipeline.preview_setlist_async("Metallica", count=2))
+
+    assert result["songs"] == ["Creeping Death", "One", "Enter Sandman"]
+
+
+def test_preview_setlist_predicted_mode(monkeypatch):
+    prediction = {
+        "artist": "Metallica", "shows_used": 2, "first_date": "01-07-2025", "last_date": "05-07-2025",
+        "songs": ["One", "Creeping Death"], "ranking": [], "shows": [],
+    }
+    monkeypatch.setattr(pipeline, "predict_setlist", lambda artist_name, count: prediction)
+
+    result = pipeline.preview_setlist("Metallica", mode="predicted")
+
+    assert result["songs"] == ["One", "Creeping Death"]
+    assert result["event_date"] == "05-07-2025"
+    assert result["venue_name"] == "Predicted Setlist (2 shows)"
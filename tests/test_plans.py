@@ -0,0 +1,160 @@
+from smolagents import ActionStep, FinalAnswerStep, ToolCall, ToolOutput
+from smolagents.monitoring import Timing
+
+from src.cache import SQLiteCache
+from src.plans import PlanStore, build_plan, plan_events
+
+INSTRUCTIONS = "Name predicted playlists 'Predicted Setlist'."
+
+
+def _shows(artist, venue="Arena"):
+    return {
+        "handle": "shows:1",
+        "shows": [{"artist": artist, "event_date": "05-07-2025", "venue": venue, "city": "Oslo", "songs": 3}],
+    }
+
+
+def _run(artist, venue="Arena"):
+    """The tool calls of a successful agent run: (name, arguments, output)."""
+    return [
+        ("get_latest_show", {"artist_name": artist}, _shows(artist, venue)),
+        ("extract_setlist", {"shows": "shows:1"}, {"handle": "setlist:1", "song_count": 2, "first_songs": ["One"]}),
+        (
+            "create_playlist_for_user",
+            {"artist_name": artist, "songs": "setlist:1", "event_date": "2025-07-05", "venue_name": venue},
+            {"playlist_name": f"{artist} - {venue}", "songs_added": 2},
+        ),
+        ("final_answer", {"answer": "Done! Enjoy the playlist."}, "Done! Enjoy the playlist."),
+    ]
+
+
+class FakeAgent:
+    max_steps = 5
+    instructions = INSTRUCTIONS
+
+    def __init__(self, calls, tools=None):
+        self.calls = calls
+        self.tools = tools or {}
+        self.runs = 0
+
+    def run(self, task, stream=False):
+        self.runs += 1
+        for index, (name, arguments, output) in enumerate(self.calls):
+            call = ToolCall(name=name, arguments=arguments, id=str(index))
+            yield call
+            yield ToolOutput(id=str(index), output=output, is_final_answer=name == "final_answer",
+                             observation=str(output), tool_call=call)
+            yield ActionStep(step_number=index + 1, timing=Timing(start_time=0.0, end_time=1.0))
+        yield FinalAnswerStep(output=self.calls[-1][2])
+
+
+def _tools(calls, shows):
+    def get_latest_show(artist_name):
+        calls.append(("get_latest_show", artist_name))
+        return shows(artist_name)
+
+    def extract_setlist(shows):
+        calls.append(("extract_setlist", shows))
+        return {"handle": "setlist:1", "song_count": 4, "first_songs": ["Four"]}
+
+    def create_playlist_for_user(artist_name, songs, event_date, venue_name):
+        calls.append(("create_playlist_for_user", artist_name, songs, event_date, venue_name))
+        return {"playlist_name": f"{artist_name} - {venue_name}", "songs_added": 4}
+
+    def final_answer(answer):
+        return answer
+
+    return {tool.__name__: tool for tool in (get_latest_show, extract_setlist, create_playlist_for_user, final_answer)}
+
+
+def test_build_plan_parameterises_the_task_and_earlier_outputs():
+    trajectory = [{"tool": name, "arguments": arguments, "output": output} for name, arguments, output in _run("Band")]
+
+    plan = build_plan("create a playlist  for Band", trajectory, INSTRUCTIONS)
+
+    assert plan["template"] == "create a playlist for {artist_name}"
+    assert [step["arguments"] for step in plan["steps"]] == [
+        {"artist_name": {"$task": "artist_name"}},
+        {"shows": {"$step": 0, "path": ["handle"]}},
+        {
+            "artist_name": {"$task": "artist_name"},
+            "songs": {"$step": 1, "path": ["handle"]},
+            "event_date": {"$step": 0, "path": ["shows", 0, "event_date"], "as": "iso_date"},
+            "venue_name": {"$step": 0, "path": ["shows", 0, "venue"]},
+        },
+        {"answer": {"$step": 2, "path": []}},
+    ]
+
+
+def test_build_plan_rejects_values_it_cannot_reproduce():
+    trajectory = [
+        {"tool": "create_playlist_for_user", "arguments": {"artist_name": "Band", "songs": ["One", "Two"]},
+         "output": {"songs_added": 2}},
+        {"tool": "final_answer", "arguments": {"answer": "ok"}, "output": "ok"},
+    ]
+    try:
+        build_plan("create a playlist for Band", trajectory, INSTRUCTIONS)
+    except ValueError as e:
+        assert "songs=" in str(e)
+    else:
+        raise AssertionError("expected a ValueError")
+
+
+def test_plans_are_recorded_then_replayed_without_the_llm(tmp_path):
+    store = PlanStore(cache=SQLiteCache(tmp_path / "plans.sqlite3"))
+    learner = FakeAgent(_run("Band"))
+    list(plan_events(learner, "create a playlist for Band", store))
+    assert learner.runs == 1
+
+    calls = []
+    agent = FakeAgent(_run("Band"), tools=_tools(calls, lambda artist: _shows(artist, "Stadium")))
+    events = list(plan_events(agent, "Create a playlist for The Other Band", store))
+
+    assert agent.runs == 0
+    assert calls == [
+        ("get_latest_show", "The Other Band"),
+        ("extract_setlist", "shows:1"),
+        ("create_playlist_for_user", "The Other Band", "setlist:1", "2025-07-05", "Stadium"),
+    ]
+    assert [event.get("kind", event["type"]) for event in events] == ["tool_start", "tool_end", "step"] * 3 + ["complete"]
+    assert events[-1]["data"] == {"playlist_name": "The Other Band - Stadium", "songs_added": 4}
+    assert store.match("create a playlist for Band")[0]["replays"] == 1
+
+
+def test_a_failed_replay_falls_back_to_the_agent(tmp_path):
+    store = PlanStore(cache=SQLiteCache(tmp_path / "plans.sqlite3"), max_failures=1)
+    list(plan_events(FakeAgent(_run("Band")), "create a playlist for Band", store))
+
+    calls = []
+    agent = FakeAgent(_run("Nobody"), tools=_tools(calls, lambda artist: [{"error": f"Artist {artist} not found"}]))
+    events = list(plan_events(agent, "create a playlist for Nobody", store))
+
+    assert calls == [("get_latest_show", "Nobody")]
+    assert agent.runs == 1
+    assert events[-1] == {"type": "complete", "data": "Done! Enjoy the playlist."}
+    # The agent's successful run replaced the plan that failed.
+    assert store.match("create a playlist for Someone")[0]["failures"] == 0
+
+
+def test_plans_are_stored_one_per_entry(tmp_path):
+    now = [0.0]
+    path = tmp_path / "plans.sqlite3"
+    # Two workers sharing the cache file.
+    first = PlanStore(cache=SQLiteCache(path), max_templates=2, clock=lambda: now[0])
+    second = PlanStore(cache=SQLiteCache(path), max_templates=2, clock=lambda: now[0])
+    for name in ("a", "b"):
+        now[0] += 1
+        first.save({"pattern": f"{name} (?P<artist_name>.+)", "template": f"{name} {{artist_name}}", "steps": []})
+
+    first.record_replay("a (?P<artist_name>.+)", ok=True)
+    second.record_replay("b (?P<artist_name>.+)", ok=True)
+    assert first.match("a x")[0]["replays"] == 1
+    assert first.match("b x")[0]["replays"] == 1
+
+    # "a" was replayed most recently, so "b" makes way for a new plan.
+    now[0] += 1
+    second.record_replay("a (?P<artist_name>.+)", ok=True)
+    second.save({"pattern": "c (?P<artist_name>.+)", "template": "c {artist_name}", "steps": []})
+    assert first.match("b x") is None
+    assert first.match("a x")[0]["replays"] == 2
+    assert first.match("c x") is not None
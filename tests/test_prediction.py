@@ -0,0 +1,89 @@
+import src.tools.setlist_tools as setlist_tools
+from src.prediction import predicted_setlist, rank_songs
+
+
+def show(event_date, songs):
+    return {"artist": "Band", "event_date": event_date, "setlist": songs}
+
+
+def raw_show(setlist_id, event_date, songs):
+    return {
+        "id": setlist_id,
+        "eventDate": event_date,
+        "venue": {"name": f"Venue {setlist_id}", "city": {"name": "City", "country": {"name": "UK"}}},
+        "sets": {"set": [{"song": [{"name": name} for name in songs]}]},
+    }
+
+
+def test_rank_songs_prefers_frequent_and_recent_songs():
+    shows = [
+        show("10-07-2025", ["Opener", "New Single", "Hit", "Closer"]),
+        show("05-07-2025", ["Opener", "Hit", "Deep Cut", "Closer"]),
+        show("01-01-2025", ["Opener", "Old Song", "Hit (Live)", "Closer"]),
+    ]
+
+    ranking = rank_songs(shows)
+    by_song = {entry["song"]: entry for entry in ranking}
+
+    assert {entry["song"] for entry in ranking[:3]} == {"Opener", "Hit", "Closer"}
+    assert by_song["Hit"]["frequency"] == 1.0
+    assert by_song["New Single"]["score"] > by_song["Old Song"]["score"]
+    assert by_song["Opener"]["position"] == 0.0
+    assert by_song["Closer"]["position"] == 1.0
+
+
+def test_predicted_setlist_has_typical_length_in_set_order():
+    shows = [
+        show("10-07-2025", ["Opener", "A", "Closer"]),
+        show("05-07-2025", ["Opener", "B", "Closer"]),
+        show("01-07-2025", ["Opener", "A", "B", "Closer"]),
+    ]
+
+    assert predicted_setlist(shows, rank_songs(shows)) == ["Opener", "A", "Closer"]
+
+
+def test_predict_setlist_streams_pages_and_stops_early(monkeypatch):
+    pages = {
+        1: {"itemsPerPage": 2, "total": 6, "setlist": [
+            raw_show("upcoming", "01-12-2025", []),
+            raw_show("a", "10-07-2025", ["One", "Two"]),
+        ]},
+        2: {"itemsPerPage": 2, "total": 6, "setlist": [
+            raw_show("b", "05-07-2025", ["One", "Three"]),
+            raw_show("c", "01-07-2025", ["One"]),
+        ]},
+        3: {"itemsPerPage": 2, "total": 6, "setlist": [raw_show("d", "01-06-2025", ["Four"])]},
+    }
+    fetched = []
+
+    def fake_fetch(mbid, page=1):
+        fetched.append(page)
+        return pages[page]
+
+    monkeypatch.setattr(setlist_tools, "search_artist", lambda name: [{"name": "Band", "mbid": "stream-test"}])
+    monkeypatch.setattr(setlist_tools, "fetch_setlists_page", fake_fetch)
+
+    result = setlist_tools.predict_setlist("Band", count=2, window_days=365)
+
+    assert fetched == [1, 2]
+    assert result["shows_used"] == 2
+    assert result["last_date"] == "10-07-2025"
+    assert result["songs"][0] == "One"
+
+    # The prediction itself is cached for later requests.
+    assert setlist_tools.predict_setlist("Band", count=2, window_days=365) == result
+    assert fetched == [1, 2]
+
+
+def test_predict_setlist_respects_the_date_window(monkeypatch):
+    data = {"itemsPerPage": 20, "total": 2, "setlist": [
+        raw_show("a", "10-07-2025", ["One"]),
+        raw_show("b", "10-07-2023", ["Two"]),
+    ]}
+    monkeypatch.setattr(setlist_tools, "search_artist", lambda name: [{"name": "Band", "mbid": "window-test"}])
+    monkeypatch.setattr(setlist_tools, "fetch_setlists_page", lambda mbid, page=1: data)
+
+    result = setlist_tools.predict_setlist("Band", count=10, window_days=365)
+
+    assert result["shows_used"] == 1
+    assert result["songs"] == ["One"]
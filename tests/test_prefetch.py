@@ -0,0 +1,83 @@
+import src.tools.setlist_tools as setlist_tools
+from src.clients.ratelimit import RateLimiter
+from src.prefetch import Prefetcher
+
+
+def _prefetcher(now, refreshed, **kwargs):
+    limiter = RateLimiter(10, 1440, clock=lambda: now[0])
+    options = {"daily_quota": 1440, "budget_share": 0.25, "refresh_age": 60, "top": 3, "half_life": 3600}
+    return Prefetcher(refreshed.append, limiter, clock=lambda: now[0], **{**options, **kwargs})
+
+
+def test_hottest_stale_artists_are_refreshed_first():
+    now, refreshed = [0.0], []
+    prefetcher = _prefetcher(now, refreshed)
+    for mbid, lookups in (("a", 1), ("b", 3), ("c", 2), ("d", 1)):
+        for _ in range(lookups):
+            prefetcher.record({"mbid": mbid, "name": mbid.upper()})
+
+    # Every artist was just looked up, so its page is already fresh.
+    assert prefetcher.run_once()["fresh"] == 3
+    assert refreshed == []
+
+    now[0] += 61
+    decisions = prefetcher.run_once()
+    assert refreshed == ["b", "c", "a"]
+    assert decisions["refreshed"] == 3
+    assert prefetcher.run_once()["fresh"] == 3
+
+    # Popularity decays: two recent lookups outrank three from two half-lives ago.
+    now[0] += 7200
+    prefetcher.record({"mbid": "d"})
+    prefetcher.record({"mbid": "d"})
+    assert [artist["mbid"] for artist in prefetcher.hottest()][:2] == ["d", "b"]
+
+
+def test_refreshes_stay_within_their_share_of_the_quota():
+    now, refreshed = [0.0], []
+    prefetcher = _prefetcher(now, refreshed, daily_quota=8, top=5)
+    for mbid in "abcde":
+        prefetcher.record({"mbid": mbid})
+    now[0] += 61
+
+    assert prefetcher.run_once() == {"refreshed": 2, "fresh": 0, "yielded": 0, "budget": 1, "failed": 0}
+    assert len(refreshed) == 2
+
+
+def test_refreshes_yield_to_interactive_lookups():
+    now, refreshed = [0.0], []
+    prefetcher = _prefetcher(now, refreshed)
+    prefetcher.record({"mbid": "a"})
+    now[0] += 61
+
+    with prefetcher.interactive():
+        assert prefetcher.run_once()["yielded"] == 1
+    while prefetcher.limiter.per_second.try_acquire():
+        pass
+    assert prefetcher.run_once()["yielded"] == 1
+    assert refreshed == []
+
+    now[0] += 1
+    assert prefetcher.run_once()["refreshed"] == 1
+
+
+def test_get_latest_show_counts_towards_popularity(monkeypatch):
+    now, refreshed = [0.0], []
+    prefetcher = _prefetcher(now, refreshed)
+    monkeypatch.setattr(setlist_tools, "get_prefetcher", lambda: prefetcher)
+    monkeypatch.setattr(setlist_tools, "get_setlist_store", lambda: None)
+    monkeypatch.setattr(setlist_tools, "search_artist", lambda name: [{"name": name, "mbid": "m1"}])
+    running = []
+
+    def fetch(mbid, page=1):
+        running.append(prefetcher.run_once()["yielded"])
+        return {"setlist": []}
+
+    monkeypatch.setattr(setlist_tools, "fetch_setlists_page", fetch)
+    setlist_tools.get_latest_show("Band")
+    now[0] += 61
+    setlist_tools.get_latest_show("Band")
+
+    assert running == [0, 1]
+    assert prefetcher.hottest()[0]["mbid"] == "m1"
+    assert prefetcher.hottest()[0]["score"] > 1.9
@@ -0,0 +1,52 @@
+from smolagents import ActionStep, FinalAnswerStep, ToolCall, ToolOutput
+from smolagents.monitoring import Timing
+
+from src.progress import agent_events
+
+
+class FakeAgent:
+    max_steps = 5
+
+    def __init__(self, events):
+        self.events = events
+
+    def run(self, task, stream=False):
+        assert stream
+        yield from self.events
+
+
+def _call_and_output(call_id, name, output):
+    call = ToolCall(name=name, arguments={}, id=call_id)
+    return [call, ToolOutput(id=call_id, output=output, is_final_answer=name == "final_answer",
+                             observation=str(output), tool_call=call)]
+
+
+def test_agent_events_report_tool_calls_steps_and_answer():
+    shows = [{"venue": "Wembley", "event_date": "05-07-2025", "setlist": ["One", "Battery"]}]
+    events = [
+        *_call_and_output("1", "get_latest_show", shows),
+        ActionStep(step_number=1, timing=Timing(start_time=0.0, end_time=1.5)),
+        *_call_and_output("2", "final_answer", {"songs": ["One", "Battery"]}),
+        ActionStep(step_number=2, timing=Timing(start_time=1.5, end_time=2.0)),
+        FinalAnswerStep(output={"songs": ["One", "Battery"]}),
+    ]
+
+    result = list(agent_events(FakeAgent(events), "create a playlist for Metallica"))
+
+    kinds = [event.get("kind", event["type"]) for event in result]
+    assert kinds == ["tool_start", "tool_end", "step", "step", "complete"]
+    assert result[1]["message"] == "Found 1 show(s); latest at Wembley on 05-07-2025 with 2 songs."
+    assert result[1]["duration"] >= 0
+    assert result[2]["duration"] == 1.5
+    assert result[3]["step"] == 2
+    assert result[-1]["data"] == {"songs": ["One", "Battery"]}
+    assert "error" not in result[1]
+
+
+def test_failed_tool_calls_carry_the_error():
+    events = [*_call_and_output("1", "create_playlist_for_user", {"error": "Spotify said no"})]
+
+    result = list(agent_events(FakeAgent(events), "create a playlist for Metallica"))
+
+    assert result[1]["error"] == "Spotify said no"
+    assert result[1]["message"] == "create_playlist_for_user failed: Spotify said no"
@@ -3,53 +3,68 @@ from fastapi.testclient import TestClient
 
 import os
 import json
+import time
 
 # We need to import the app from the server file
-from src.server import app
+from src.server import app, get_session_manager
 
 # Create a test client
 client = TestClient(app)
 
-# Get the token from an environment variable for integration testing
-spotify_token = os.environ.get("SPOTIFY_CLIENT_SECRET")
+# A session cookie from a real login (see `/callback`) for integration testing
+spotify_session = os.environ.get("SETLISTIFY_TEST_SESSION")
 
-@pytest.mark.skipif(not spotify_token, reason="SPOTIFY_CLIENT_SECRET environment variable not set")
+@pytest.mark.skipif(not spotify_session, reason="SETLISTIFY_TEST_SESSION environment variable not set")
 def test_agent_get_setlist_success():
     """
     Tests the /api/agent/setlist endpoint for a successful scenario.
     """
-    response = client.post(
+    with client.stream(
+        "GET",
         "/api/agent/setlist",
-        headers={"Authorization": f"Bearer {spotify_token}"},
-        json={"artistName": "Radiohead"}  # Using a real artist
-    )
+        params={"artistName": "Radiohead"},  # Using a real artist
+        headers={"Cookie": f"session={spotify_session}"},
+    ) as response:
+        # Assertions for a real API call
+        assert response.status_code == 200
+        events = [json.loads(line[len("data: "):]) for line in response.iter_lines() if line.startswith("data: ")]
 
-    # Assertions for a real API call
-    assert response.status_code == 200
-    response_data = response.json()
-    assert "songs" in response_data
-    assert isinstance(response_data["songs"], list)
+    assert events[-1]["type"] == "complete"
 
 
 def test_agent_get_setlist_no_auth():
     """
-    Tests that the endpoint returns a 401 Unauthorized if the token is missing.
+    Tests that the endpoint returns a 401 Unauthorized, with the Spotify
+    login URL, if there is no session.
     """
-    response = client.post(
+    response = client.get(
         "/api/agent/setlist",
-        json={"artistName": "Test Band"}
+        params={"artistName": "Test Band"}
     )
     assert response.status_code == 401
-    assert response.json()["detail"] == "Authorization header missing"
+    assert response.json()["detail"].startswith("https://accounts.spotify.com/authorize")
 
 def test_agent_get_setlist_no_artist():
     """
-    Tests that the endpoint returns a 400 Bad Request if artistName is missing.
+    Tests that the endpoint rejects a request without artistName.
     """
-    response = client.post(
-        "/api/agent/setlist",
-        headers={"Authorization": "Bearer fake-token"},
-        json={} # Missing artistName
+    session_id = get_session_manager().create(
+        {"access_token": "fake-token", "refresh_token": "fake-refresh", "expires_at": int(time.time()) + 3600}
     )
-    assert response.status_code == 400
-    assert response.json()["detail"] == "Missing artistName in request body"
\ No newline at end of file
+    response = client.get("/api/agent/setlist", headers={"Cookie": f"session={session_id}"})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["query", "artistName"]
+
+
+def test_metrics_are_exposed_in_prometheus_text_format():
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE setlistify_tool_duration_seconds histogram" in response.text
+    assert "setlistify_setlistfm_quota_remaining" in response.text
+
+
+def test_request_id_is_echoed_or_generated():
+    assert client.get("/metrics", headers={"X-Request-ID": "abc-123"}).headers["x-request-id"] == "abc-123"
+    assert client.get("/metrics").headers["x-request-id"]
@@ -0,0 +1,123 @@
+import pytest
+
+from src.auth.sessions import MemorySessionStore, SQLiteSessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return MemorySessionStore(**kwargs)
+        return SQLiteSessionStore(tmp_path / "sessions.sqlite3", **kwargs)
+    return make
+
+
+def test_set_get_delete(make_store):
+    store = make_store()
+    store.set("abc", {"access_token": "t"})
+    assert store.get("abc") == {"access_token": "t"}
+    assert "abc" in store
+    store.delete("abc")
+    assert store.get("abc") is None
+    assert store.get(None) is None
+
+
+def test_sessions_expire_after_ttl_without_use(make_store):
+    clock = FakeClock()
+    store = make_store(ttl=100, clock=clock)
+    store.set("abc", {"access_token": "t"})
+    clock.now += 60
+    assert store.get("abc") is not None  # use extends the expiry
+    clock.now += 90
+    assert store.get("abc") is not None
+    clock.now += 101
+    assert store.get("abc") is None
+
+
+def test_memory_store_is_bounded():
+    store = MemorySessionStore(max_entries=2)
+    for session_id in ("a", "b", "c"):
+        store.set(session_id, {})
+    assert len(store) == 2
+    assert store.get("a") is None
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = tmp_path / "sessions.sqlite3"
+    SQLiteSessionStore(path).set("abc", {"access_token": "t"})
+    assert SQLiteSessionStore(path).get("abc") == {"access_token": "t"}
+
+
+class FakeAuthManager:
+    def __init__(self):
+        self.refreshes = 0
+
+    def refresh_access_token(self, refresh_token):
+        self.refreshes += 1
+        return {"access_token": f"new-{self.refreshes}", "refresh_token": refresh_token, "expires_at": 10_000.0}
+
+
+def test_session_manager_refreshes_expired_tokens_inline():
+    from src.auth.spotify_sessions import SpotifySessionManager
+
+    clock = FakeClock()
+    auth = FakeAuthManager()
+    manager = SpotifySessionManager(MemorySessionStore(clock=clock), auth, refresh_margin=300, clock=clock)
+    session_id = manager.create({"access_token": "old", "refresh_token": "r", "expires_at": clock.now - 1})
+
+    session = manager.load(session_id)
+
+    assert session["token_info"]["access_token"] == "new-1"
+    assert manager.peek(session_id)["token_info"]["access_token"] == "new-1"
+
+
+def test_session_manager_refreshes_expiring_tokens_in_background():
+    from src.auth.spotify_sessions import SpotifySessionManager
+
+    clock = FakeClock()
+    auth = FakeAuthManager()
+    manager = SpotifySessionManager(MemorySessionStore(clock=clock), auth, refresh_margin=300, clock=clock)
+    session_id = manager.create({"access_token": "old", "refresh_token": "r", "expires_at": clock.now + 60})
+    manager.save_profile(session_id, {"id": "user-1"})
+
+    session = manager.load(session_id)
+    manager._executor.shutdown(wait=True)
+
+    # The request used the still-valid token; the refresh happened off the request path.
+    assert session["token_info"]["access_token"] == "old"
+    assert auth.refreshes == 1
+    stored = manager.peek(session_id)
+    assert stored["token_info"]["access_token"] == "new-1"
+    assert stored["profile"] == {"id": "user-1"}
+
+
+def test_async_spotify_uses_cached_profile():
+    import asyncio
+    import httpx
+    from src.clients.spotify import AsyncSpotify
+
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(request)
+        return httpx.Response(200, json={"id": "user-1"})
+
+    async def run():
+        http = httpx.AsyncClient(base_url="https://api.spotify.com/v1", transport=httpx.MockTransport(handler))
+        saved = []
+        fresh = AsyncSpotify("token", http=http, on_profile=saved.append)
+        await fresh.current_user()
+        await fresh.current_user()
+        cached = AsyncSpotify("token", http=http, profile=saved[0])
+        return await cached.current_user()
+
+    assert asyncio.run(run()) == {"id": "user-1"}
+    assert len(requests_seen) == 1
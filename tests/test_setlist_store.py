@@ -0,0 +1,119 @@
+import json
+
+import src.tools.setlist_tools as setlist_tools
+from src.setlist_store import SetlistStore
+
+MBID = "65f4f0c5-ef9e-490c-aee3-909e7ae6b2ab"
+
+
+def _show(show_id, date, venue, songs, updated="2025-07-06T10:00:00.000+0000"):
+    return {
+        "id": show_id,
+        "eventDate": date,
+        "lastUpdated": updated,
+        "artist": {"mbid": MBID, "name": "Metallica"},
+        "venue": {"name": venue, "city": {"name": "Oslo", "country": {"name": "Norway"}}},
+        "url": f"https://www.setlist.fm/setlist/{show_id}.html",
+        "sets": {"set": [{"song": [{"name": name} for name in songs]}]},
+    }
+
+
+PAGE = {
+    "page": 1,
+    "itemsPerPage": 20,
+    "total": 3,
+    "setlist": [
+        _show("s3", "05-07-2025", "Ullevaal", ["One", "Battery"]),
+        _show("s2", "01-07-2025", "Parken", ["Battery"]),
+        _show("s1", "20-12-2024", "Ullevaal", ["Enter Sandman"]),
+    ],
+}
+
+
+def test_ingest_and_query(tmp_path):
+    store = SetlistStore(tmp_path / "setlists.sqlite3")
+
+    assert store.ingest_page(PAGE, synced=True) == 3
+    assert store.ingest_page(PAGE, synced=True) == 0  # unchanged shows are skipped
+
+    latest = store.latest_shows(MBID, count=2)
+    assert [show["event_date"] for show in latest] == ["05-07-2025", "01-07-2025"]
+    assert latest[0] == {
+        "artist": "Metallica",
+        "event_date": "05-07-2025",
+        "venue": "Ullevaal",
+        "city": "Oslo",
+        "country": "Norway",
+        "url": "https://www.setlist.fm/setlist/s3.html",
+        "setlist": ["One", "Battery"],
+    }
+    assert [show["url"][-7:] for show in store.find_shows(song="battery")] == ["s3.html", "s2.html"]
+    assert [show["event_date"] for show in store.find_shows(venue="ullevaal", since="2025-01-01")] == ["05-07-2025"]
+    # Artists are only looked up by name through a stored search for that name: names are ambiguous.
+    assert store.search_artists("metallica") is None
+    store.ingest_artist_search("Metallica", [{"name": "Metallica", "mbid": MBID}])
+    assert store.search_artists("metallica") == [{"name": "Metallica", "mbid": MBID, "disambiguation": ""}]
+
+
+def test_exports_are_served_only_once_synced(tmp_path):
+    now = [1000.0]
+    store = SetlistStore(tmp_path / "setlists.sqlite3", max_age=60, clock=lambda: now[0])
+    export = tmp_path / "export.jsonl"
+    export.write_text("\n".join(json.dumps(show) for show in PAGE["setlist"]))
+
+    assert store.ingest_file(export) == 3
+    assert store.latest_shows(MBID) is None
+    assert store.find_shows(mbid=MBID, limit=1)[0]["venue"] == "Ullevaal"
+
+    corrected = {**PAGE, "setlist": [_show("s3", "05-07-2025", "Ullevaal", ["One"], updated="2025-07-07")]}
+    assert store.ingest_page(corrected, synced=True) == 1
+    assert store.latest_shows(MBID)[0]["setlist"] == ["One"]
+
+    now[0] += 61
+    assert store.latest_shows(MBID) is None
+
+
+def test_tools_read_the_store_before_the_network(tmp_path, monkeypatch):
+    store = SetlistStore(tmp_path / "setlists.sqlite3")
+    monkeypatch.setattr(setlist_tools, "get_setlist_store", lambda: store)
+    requests = []
+
+    class FakeClient:
+        def get(self, path, params=None):
+            requests.append(path)
+            if path == "/search/artists":
+                return {"artist": [{"name": "Metallica", "mbid": MBID}]}
+            return PAGE
+
+    monkeypatch.setattr(setlist_tools, "get_client", lambda: FakeClient())
+
+    assert setlist_tools.sync_artist("Metallica", max_pages=3) == 3
+    assert requests == ["/search/artists", f"/artist/{MBID}/setlists"]
+
+    requests.clear()
+    setlist_tools._cache().clear()
+    shows = setlist_tools.get_latest_show("Metallica", count=1)
+
+    assert requests == []
+    assert shows[0]["venue"] == "Ullevaal"
+
+
+def test_searches_expire_and_the_result_key_names_the_stored_show(tmp_path, monkeypatch):
+    import src.agent_results as agent_results
+
+    now = [1000.0]
+    store = SetlistStore(tmp_path / "setlists.sqlite3", max_age=60, search_max_age=600, clock=lambda: now[0])
+    monkeypatch.setattr(setlist_tools, "get_setlist_store", lambda: store)
+    monkeypatch.setattr(setlist_tools, "fetch_setlists_page", lambda mbid, page=1: {"setlist": [{"id": "newer"}]})
+    store.ingest_artist_search("Metallica", [{"name": "Metallica", "mbid": MBID}])
+    store.ingest_page(PAGE, synced=True)
+
+    # While the artist is synced, the key names the show get_latest_show serves.
+    assert agent_results.latest_show_key("Metallica") == f"latest:{MBID}:s3"
+    now[0] += 61
+    assert agent_results.latest_show_key("Metallica") == f"latest:{MBID}:newer"
+
+    store.ingest_artist_search("Metallica", [{"name": "Metallica", "mbid": MBID}, {"name": "Metallica", "mbid": "m2"}])
+    assert len(store.search_artists("Metallica")) == 2
+    now[0] += 601
+    assert store.search_artists("Metallica") is None
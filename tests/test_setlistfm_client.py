@@ -0,0 +1,140 @@
+import pytest
+import requests
+
+from src.clients.ratelimit import QuotaExceeded, RateLimiter, TokenBucket, backoff_delay, parse_retry_after
+from src.clients.setlistfm import SetlistFMClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+        self.headers = headers or {}
+        self.text = ""
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error", response=self)
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.headers = {}
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append((url, params))
+        return self.responses.pop(0)
+
+
+def test_token_bucket_reserves_in_order():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, capacity=2.0, clock=clock)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    # Third and fourth callers queue up behind each other.
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+    clock.now += 1.0
+    assert bucket.available == 0.0
+
+
+def test_rate_limiter_enforces_daily_quota():
+    clock = FakeClock()
+    limiter = RateLimiter(per_second=2.0, per_day=3, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        limiter.acquire()
+    assert limiter.remaining_today == 0
+    with pytest.raises(QuotaExceeded):
+        limiter.acquire()
+
+
+def test_backoff_honours_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert backoff_delay(0, retry_after=3.0) >= 3.0
+    assert 0 <= backoff_delay(10, cap=2.0) <= 2.0
+
+
+def test_client_retries_on_429():
+    clock = FakeClock()
+    limiter = RateLimiter(per_second=2.0, per_day=100, clock=clock, sleep=clock.sleep)
+    session = FakeSession([
+        FakeResponse(429, headers={"Retry-After": "2"}),
+        FakeResponse(200, {"artist": [{"name": "Metallica"}]}),
+    ])
+    client = SetlistFMClient("key", limiter, session=session, sleep=clock.sleep)
+
+    data = client.get("/search/artists", params={"artistName": "Metallica"})
+
+    assert data == {"artist": [{"name": "Metallica"}]}
+    assert len(session.calls) == 2
+    assert clock.now >= 2.0
+    assert session.headers["x-api-key"] == "key"
+
+
+def test_client_raises_after_retries_exhausted():
+    clock = FakeClock()
+    limiter = RateLimiter(per_second=2.0, per_day=100, clock=clock, sleep=clock.sleep)
+    session = FakeSession([FakeResponse(503)] * 3)
+    client = SetlistFMClient("key", limiter, session=session, max_retries=2, sleep=clock.sleep)
+
+    with pytest.raises(requests.HTTPError):
+        client.get("/artist/abc/setlists")
+    assert len(session.calls) == 3
+
+
+def test_async_client_retries_and_shares_limiter():
+    import asyncio
+    import httpx
+    from src.clients.setlistfm import AsyncSetlistFMClient
+
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(200, json={"setlist": []}),
+    ]
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return responses.pop(0)
+
+    limiter = RateLimiter(per_second=100.0, per_day=10)
+    http = httpx.AsyncClient(base_url="https://api.setlist.fm/rest/1.0", transport=httpx.MockTransport(handler))
+    client = AsyncSetlistFMClient("key", limiter, http=http)
+
+    data = asyncio.run(client.get("/artist/abc/setlists", params={"p": 1}))
+
+    assert data == {"setlist": []}
+    assert len(seen) == 2
+    assert seen[0].headers["x-api-key"] == "key"
+    assert limiter.remaining_today == 8
+
+
+def test_async_client_raises_requests_http_error():
+    import asyncio
+    import httpx
+    from src.clients.setlistfm import AsyncSetlistFMClient
+
+    http = httpx.AsyncClient(base_url="https://api.setlist.fm/rest/1.0",
+                             transport=httpx.MockTransport(lambda request: httpx.Response(404)))
+    client = AsyncSetlistFMClient("key", RateLimiter(per_second=100.0, per_day=10), http=http)
+
+    with pytest.raises(requests.HTTPError) as excinfo:
+        asyncio.run(client.get("/search/artists"))
+    assert excinfo.value.response.status_code == 404
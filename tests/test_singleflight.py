@@ -0,0 +1,116 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.cache import SQLiteCache
+from src.singleflight import SingleFlight
+
+
+def test_concurrent_threads_share_one_call():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"mbid": "abc"}
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        leader = pool.submit(flight.do, "artist:band", fetch)
+        started.wait(5)
+        followers = [pool.submit(flight.do, "artist:band", fetch) for _ in range(4)]
+        while flight.coalesced < 4:
+            pass
+        release.set()
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert calls == [1]
+    assert all(result == {"mbid": "abc"} for result in results)
+
+
+def test_threaded_waiters_receive_the_error_and_the_key_is_released():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ConnectionError("down")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, "k", failing)
+        started.wait(5)
+        follower = pool.submit(flight.do, "k", failing)
+        while flight.coalesced < 1:
+            pass
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(ConnectionError):
+                future.result()
+
+    assert flight.do("k", lambda: "recovered") == "recovered"
+
+
+def test_async_callers_share_one_call_and_its_error():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ConnectionError("down")
+
+    async def main():
+        results = await asyncio.gather(*(flight.ado("k", fetch) for _ in range(5)))
+        errors = await asyncio.gather(*(flight.ado("e", failing) for _ in range(3)), return_exceptions=True)
+        return results, errors
+
+    results, errors = asyncio.run(main())
+
+    assert results == ["value"] * 5
+    assert calls == [1]
+    assert all(isinstance(error, ConnectionError) for error in errors)
+
+
+def test_cancelled_async_caller_does_not_cancel_the_call_for_others():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "value"
+
+    async def main():
+        first = asyncio.ensure_future(flight.ado("k", fetch))
+        second = asyncio.ensure_future(flight.ado("k", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "value"
+
+
+def test_cache_misses_for_the_same_key_fetch_once(tmp_path):
+    cache = SQLiteCache(tmp_path / "c.sqlite3")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ["track"]
+
+    async def main():
+        return await asyncio.gather(*(cache.aget_or_fetch("search:band:song", fetch, ttl=60) for _ in range(10)))
+
+    assert asyncio.run(main()) == [["track"]] * 10
+    assert calls == [1]
+    assert cache.stats()["coalesced"] == 9
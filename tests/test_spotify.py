@@ -1,6 +1,17 @@
 import pytest
+from src.cache import get_cache
+from src.normalize import normalize_key
+from src.tools import spotify_catalog
 from src.tools.spotify_tools import create_playlist
 
+
+@pytest.fixture(autouse=True)
+def empty_track_cache():
+    get_cache("spotify_tracks").clear()
+    get_cache("spotify_catalogs").clear()
+    get_cache("spotify_playlists").clear()
+    spotify_catalog._indexes.clear()
+
 @pytest.mark.skip(reason="Skipping until a mock or real access token is available")
 def test_create_spotify_playlist():
     # This test requires a valid Spotify OAuth access token.
@@ -14,3 +25,354 @@ def test_create_spotify_playlist():
 
     assert isinstance(playlist_url, str)
     assert "spotify.com/playlist/" in playlist_url
+
+
+class FakeSpotify:
+    """Minimal stand-in for spotipy.Spotify that knows a fixed catalog."""
+
+    def __init__(self, catalog, fail_first_with_429=False, albums=None):
+        self.catalog = catalog
+        self.albums_by_id = albums or {}
+        self.searches = []
+        self.added = []
+        self.writes = []
+        self.playlists = {}
+        self._fail_next = fail_first_with_429
+
+    def current_user(self):
+        return {"id": "user-1"}
+
+    def search(self, q, type, limit):
+        import spotipy
+        if self._fail_next:
+            self._fail_next = False
+            raise spotipy.SpotifyException(429, -1, "rate limited", headers={"Retry-After": "0"})
+        if type == "artist":
+            items = [{"id": "artist-1", "name": q.split("artist:")[-1]}] if self.albums_by_id else []
+            return {"artists": {"items": items}}
+        self.searches.append(q)
+        title = q.split("track:")[-1]
+        items = [{"uri": f"spotify:track:{title}", "name": title}] if title in self.catalog else []
+        return {"tracks": {"items": items}}
+
+    def artist_albums(self, artist_id, include_groups, limit):
+        return {"items": [{"id": album_id} for album_id in self.albums_by_id], "next": None}
+
+    def albums(self, album_ids):
+        return {"albums": [
+            {"tracks": {"items": [{"uri": f"spotify:track:{name}", "name": name} for name in self.albums_by_id[album_id]],
+                        "next": None}}
+            for album_id in album_ids
+        ]}
+
+    def user_playlist_create(self, user_id, name, public=True):
+        playlist_id = f"pl-{self.writes.count('create') + 1}"
+        self.playlists[playlist_id] = []
+        self.writes.append("create")
+        return {"id": playlist_id, "external_urls": {"spotify": f"https://open.spotify.com/playlist/{playlist_id}"}}
+
+    def playlist_add_items(self, playlist_id, uris):
+        self.added.append(list(uris))
+        self.playlists[playlist_id].extend(uris)
+        self.writes.append(("add", len(uris)))
+
+    def playlist_is_following(self, playlist_id, user_ids):
+        return [playlist_id in self.playlists]
+
+    def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, additional_types=("track",)):
+        uris = self.playlists[playlist_id]
+        page = uris[offset:offset + limit]
+        return {"items": [{"track": {"uri": uri}} for uri in page], "next": "more" if offset + limit < len(uris) else None}
+
+    def playlist_remove_all_occurrences_of_items(self, playlist_id, items):
+        self.playlists[playlist_id] = [uri for uri in self.playlists[playlist_id] if uri not in items]
+        self.writes.append(("remove", len(items)))
+
+    def playlist_reorder_items(self, playlist_id, range_start, insert_before):
+        uris = self.playlists[playlist_id]
+        uris.insert(insert_before, uris.pop(range_start))
+        self.writes.append(("move", range_start, insert_before))
+
+    def playlist_replace_items(self, playlist_id, items):
+        self.playlists[playlist_id] = list(items)
+        self.writes.append(("replace", len(items)))
+
+
+def test_create_playlist_keeps_setlist_order_and_batches_adds():
+    songs = [f"Song {i}" for i in range(150)]
+    client = FakeSpotify(catalog=set(songs) - {"Song 3"})
+
+    result = create_playlist(client, "Band", songs, "2025-07-05", "Arena")
+
+    assert result["songs_added"] == 149
+    assert result["song_titles"][:3] == ["Song 0", "Song 1", "Song 2"]
+    assert result["song_titles"][3] == "Song 4"
+    assert [len(batch) for batch in client.added] == [100, 49]
+    assert result["playlist_name"] == "Band at Arena - Jul 05, 2025"
+
+
+def test_rerunning_create_playlist_reuses_the_playlist_and_writes_only_the_difference():
+    client = FakeSpotify(catalog={"One", "Two", "Three", "Four"})
+    first = create_playlist(client, "Band", ["One", "Two", "Three"], "2025-07-05", "Arena")
+
+    client.writes.clear()
+    again = create_playlist(client, "Band", ["One", "Two", "Three"], "2025-07-05", "Arena")
+    assert client.writes == []
+    assert again["playlist_url"] == first["playlist_url"]
+    assert (again["created"], again["tracks_added"], again["tracks_removed"]) == (False, 0, 0)
+
+    # setlist.fm corrected the show: "Two" was really "Four", played first.
+    corrected = create_playlist(client, "Band", ["Four", "One", "Three"], "2025-07-05", "Arena")
+    assert client.writes == [("remove", 1), ("add", 1), ("move", 2, 0)]
+    assert client.playlists["pl-1"] == ["spotify:track:Four", "spotify:track:One", "spotify:track:Three"]
+    assert (corrected["tracks_added"], corrected["tracks_removed"]) == (1, 1)
+
+
+def test_a_deleted_playlist_is_created_again():
+    client = FakeSpotify(catalog={"One"})
+    create_playlist(client, "Band", ["One"], "2025-07-05", "Arena")
+    del client.playlists["pl-1"]  # unfollowed by the user
+
+    result = create_playlist(client, "Band", ["One"], "2025-07-05", "Arena")
+
+    assert result["created"] is True
+    assert result["playlist_url"].endswith("/pl-2")
+
+
+def test_playlist_changes_fall_back_to_replacing_when_cheaper():
+    from src.tools.spotify_tools import _playlist_changes, _replace_is_cheaper
+
+    current = ["a", "b", "c", "d"]
+    desired = ["d", "c", "b", "a"]
+    remove, add, moves = _playlist_changes(current, desired)
+
+    assert (remove, add) == ([], [])
+    assert len(moves) == 3
+    assert _replace_is_cheaper(moves, desired)
+    assert _playlist_changes(["a", "a", None, "b"], ["b", "a"]) == (["a"], ["a"], [(1, 0), (2, 1)])
+
+
+def test_create_playlist_retries_after_429():
+    client = FakeSpotify(catalog={"One"}, fail_first_with_429=True)
+
+    result = create_playlist(client, "Metallica", ["One"], "2025-07-05", "Arena")
+
+    assert result["songs_added"] == 1
+
+
+def test_shared_session_retries_only_what_is_safe_to_repeat():
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    import spotipy
+    from src.clients.spotify import call_with_backoff, get_requests_session
+
+    statuses = {"POST": [429, 201, 500], "PUT": [503, 200]}
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            requests.append(self.command)
+            status = statuses[self.command].pop(0)
+            payload = json.dumps({"snapshot_id": "s1"} if status < 400 else {"error": {"status": status}}).encode()
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", "0")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_POST = do_PUT = _reply
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = spotipy.Spotify(auth="token", requests_session=get_requests_session(), retries=0)
+        client.prefix = f"http://127.0.0.1:{server.server_port}/"
+        # A 429 was not applied, so call_with_backoff sends the append again.
+        assert call_with_backoff(client.playlist_add_items, "p1", ["spotify:track:1"]) == {"snapshot_id": "s1"}
+        # A 5xx to an append may have been applied; it is not repeated.
+        with pytest.raises(spotipy.SpotifyException):
+            client.playlist_add_items("p1", ["spotify:track:1"])
+        # Replacing the tracks is idempotent, so the session retries it.
+        assert client.playlist_replace_items("p1", ["spotify:track:1"]) == {"snapshot_id": "s1"}
+    finally:
+        server.shutdown()
+
+    assert requests == ["POST", "POST", "POST", "PUT", "PUT"]
+
+
+def test_resolutions_are_shared_across_runs():
+    first = FakeSpotify(catalog={"One"})
+    create_playlist(first, "Metallica", ["One", "Unknown Cover"], "2025-07-05", "Arena")
+    assert len(first.searches) == 3  # artist-scoped hit, then artist-scoped and title-only misses
+
+    second = FakeSpotify(catalog={"One"})
+    result = create_playlist(second, "metallica", ["one", "Unknown  Cover!"], "2025-07-05", "Arena")
+
+    assert second.searches == []
+    assert result["songs_added"] == 1
+
+
+def test_normalize_key():
+    assert normalize_key("Don't Stop Me Now") == normalize_key("  dont stop  me now ")
+    assert normalize_key("Motörhead") == "motorhead"
+
+
+def test_catalog_mode_matches_locally_and_searches_leftovers():
+    albums = {
+        "album-1": ["Enter Sandman (Remastered 2021)", "Sad but True"],
+        "album-2": ["Master of Puppets", "Master of Puppets - Live at Wembley"],
+    }
+    client = FakeSpotify(catalog={"Whiskey in the Jar"}, albums=albums)
+    songs = ["Enter Sandman", "Sad But True", "Master of Puppets", "Whiskey in the Jar"]
+
+    result = create_playlist(client, "Metallica", songs, "2025-07-05", "Arena")
+
+    assert result["song_titles"] == [
+        "Enter Sandman (Remastered 2021)", "Sad but True", "Master of Puppets", "Whiskey in the Jar",
+    ]
+    assert client.searches == ["artist:Metallica track:Whiskey in the Jar"]
+
+
+def test_catalog_failures_fall_back_to_search(monkeypatch):
+    import asyncio
+    import httpx
+    import requests
+    from src.tools import spotify_tools
+
+    class Unreachable(FakeSpotify):
+        def albums(self, album_ids):
+            raise requests.ConnectionError("connection reset")
+
+    class Malformed(FakeSpotify):
+        def albums(self, album_ids):
+            return {"albums": [{"name": "no tracks here"}]}
+
+    for client_class in (Unreachable, Malformed):
+        get_cache("spotify_tracks").clear()
+        spotify_catalog._indexes.clear()
+        client = client_class(catalog={"One"}, albums={"album-1": ["One"]})
+        assert spotify_tools.resolve_tracks(client, "Band", ["One"], mode="catalog")[0]["name"] == "One"
+        assert client.searches == ["artist:Band track:One"]
+
+    async def unreachable(spotify_client, artist_name):
+        raise httpx.ConnectError("connection reset")
+
+    async def search(spotify_client, artist_name, song):
+        return {"uri": f"spotify:track:{song}", "name": song}
+
+    monkeypatch.setattr(spotify_tools, "get_catalog_index_async", unreachable)
+    monkeypatch.setattr(spotify_tools, "_resolve_song_async", search)
+    resolved = asyncio.run(spotify_tools.resolve_tracks_async(None, "Band", ["One"], mode="catalog"))
+    assert resolved[0]["name"] == "One"
+
+
+def test_catalog_index_prefix_and_fuzzy_matching():
+    from src.tools.spotify_catalog import CatalogIndex
+
+    index = CatalogIndex([
+        {"uri": "a", "name": "Stairway to Heaven - Remaster"},
+        {"uri": "b", "name": "Whole Lotta Love"},
+        {"uri": "c", "name": "One More Time"},
+    ])
+
+    assert index.match("Stairway To Heaven")["uri"] == "a"
+    assert index.match("Whole Lotta Love Medley")["uri"] == "b"
+    assert index.match("Whole Lota Love")["uri"] == "b"
+    assert index.match("One") is None
+
+
+def test_catalog_indexes_are_built_once_per_artist(monkeypatch):
+    built = []
+    monkeypatch.setattr(spotify_catalog, "CatalogIndex", lambda tracks: built.append(tracks) or object())
+    get_cache("spotify_catalogs").set("catalog:metallica", {"artist_id": "a1", "tracks": []}, ttl=60)
+
+    first = spotify_catalog.get_catalog_index(None, "Metallica")
+    assert spotify_catalog.get_catalog_index(None, "metallica") is first
+    assert len(built) == 1
+
+
+def test_catalogs_of_other_artists_are_never_picked():
+    artists = [{"id": "x", "name": "Metallica Tribute Band"}, {"id": "m", "name": "Metallica"}]
+
+    assert spotify_catalog._pick_artist_id(artists, "Metallica") == "m"
+    assert spotify_catalog._pick_artist_id(artists[:1], "Metallica") is None
+
+
+def test_create_playlist_async_over_http():
+    import asyncio
+    import json
+    import httpx
+    from src.clients.spotify import AsyncSpotify
+    from src.tools.spotify_tools import create_playlist_async
+
+    added = []
+
+    def handler(request):
+        if request.url.path == "/v1/me":
+            return httpx.Response(200, json={"id": "user-1"})
+        if request.url.path == "/v1/search":
+            q = request.url.params["q"]
+            if request.url.params["type"] == "artist":
+                return httpx.Response(200, json={"artists": {"items": []}})
+            title = q.split("track:")[-1]
+            items = [] if title == "Missing" else [{"uri": f"spotify:track:{title}", "name": title}]
+            return httpx.Response(200, json={"tracks": {"items": items}})
+        if request.url.path == "/v1/playlists/pl-1/followers/contains":
+            return httpx.Response(200, json=[True])
+        if request.url.path == "/v1/playlists/pl-1/tracks" and request.method == "GET":
+            uris = [uri for batch in added for uri in batch]
+            return httpx.Response(200, json={"items": [{"track": {"uri": uri}} for uri in uris], "next": None})
+        if request.url.path == "/v1/users/user-1/playlists":
+            return httpx.Response(201, json={"id": "pl-1", "external_urls": {"spotify": "https://open.spotify.com/playlist/pl-1"}})
+        if request.url.path == "/v1/playlists/pl-1/tracks":
+            added.append(json.loads(request.content)["uris"])
+            return httpx.Response(201, json={"snapshot_id": "s"})
+        return httpx.Response(404)
+
+    async def run():
+        http = httpx.AsyncClient(base_url="https://api.spotify.com/v1", transport=httpx.MockTransport(handler))
+        client = AsyncSpotify("token", http=http)
+        first = await create_playlist_async(client, "Band", ["A", "Missing", "B"], "2025-07-05", "Arena")
+        again = await create_playlist_async(client, "Band", ["A", "B"], "2025-07-05", "Arena")
+        return first, again
+
+    result, again = asyncio.run(run())
+
+    assert result["song_titles"] == ["A", "B"]
+    assert added == [["spotify:track:A", "spotify:track:B"]]
+    assert (again["created"], again["tracks_added"]) == (False, 0)
+
+
+def test_async_client_retries_server_errors_only_for_idempotent_methods(monkeypatch):
+    import asyncio
+    import httpx
+    import spotipy
+    import src.clients.spotify as spotify_client
+    from src.clients.spotify import AsyncSpotify
+
+    monkeypatch.setattr(spotify_client, "backoff_delay", lambda attempt, retry_after=None: 0)
+    statuses = {"GET": [503, 200], "POST": [500]}
+    seen = []
+
+    def handler(request):
+        seen.append(request.method)
+        status = statuses[request.method].pop(0)
+        return httpx.Response(status, json={"id": "me"} if status == 200 else {"error": {"message": "boom"}})
+
+    async def run():
+        async with httpx.AsyncClient(base_url="https://api.test", transport=httpx.MockTransport(handler)) as http:
+            client = AsyncSpotify("token", http=http)
+            assert await client.current_user() == {"id": "me"}
+            with pytest.raises(spotipy.SpotifyException):
+                await client.user_playlist_create("me", "Playlist")
+
+    asyncio.run(run())
+    assert seen == ["GET", "GET", "POST"]